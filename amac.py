@@ -4,37 +4,28 @@
 搜索框爬虫 - 在中国证券投资基金业协会网站搜索并获取结果URL，然后截图保存
 """
 
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-import time
 import sys
 import os
 import json
 from urllib.parse import quote
 from datetime import datetime
 
-from storage_utils import load_records, upsert_record, write_records
+from driver_pool import create_driver, mark_broken, register_site
+from screenshot_utils import save_screenshot_artifact, screenshot_extension
+from storage_utils import save_record
+from wait_utils import (
+    pause,
+    polite_pause,
+    wait_for_network_idle,
+    wait_for_page,
+)
 
-def search_and_screenshot(search_query, save_to_desktop=True):
-    """
-    直接访问搜索URL，获取结果链接，访问并截图保存
-    
-    Args:
-        search_query: 要搜索的内容
-        save_to_desktop: 是否保存到桌面，默认True
-    """
-    # 清除代理环境变量（避免使用无效的代理）
-    proxy_vars = ['http_proxy', 'https_proxy', 'all_proxy', 'HTTP_PROXY', 'HTTPS_PROXY', 'ALL_PROXY']
-    for var in proxy_vars:
-        if var in os.environ:
-            del os.environ[var]
-            # print(f"已清除环境变量: {var}")
-    
+def _build_chrome_options() -> Options:
     # 配置Chrome选项
     chrome_options = Options()
     chrome_options.add_argument('--no-sandbox')
@@ -53,27 +44,43 @@ def search_and_screenshot(search_query, save_to_desktop=True):
     
     # 设置窗口大小（确保截图完整）
     chrome_options.add_argument('--window-size=1920,1080')
+    return chrome_options
+
+
+register_site("amac", _build_chrome_options)
+
+
+def search_and_screenshot(search_query, save_to_desktop=True, driver=None):
+    """
+    直接访问搜索URL，获取结果链接，访问并截图保存
+    
+    Args:
+        search_query: 要搜索的内容
+        save_to_desktop: 是否保存到桌面，默认True
+        driver: 可选，外部（如 DriverPool）提供的浏览器；传入时不在此处创建或关闭
+    """
+    # 清除代理环境变量（避免使用无效的代理）
+    proxy_vars = ['http_proxy', 'https_proxy', 'all_proxy', 'HTTP_PROXY', 'HTTPS_PROXY', 'ALL_PROXY']
+    for var in proxy_vars:
+        if var in os.environ:
+            del os.environ[var]
+            # print(f"已清除环境变量: {var}")
     
-    driver = None
+    owns_driver = driver is None
     try:
         # 初始化浏览器
-        print("正在初始化浏览器...")
-        driver = webdriver.Chrome(options=chrome_options)
-        driver.maximize_window()
+        if owns_driver:
+            print("正在初始化浏览器...")
+            driver = create_driver("amac")
         
         # 构建搜索URL
         search_url = f"https://www.amac.org.cn/index/qzss/?key={quote(search_query)}"
         print(f"正在访问搜索页面: {search_url}")
+        polite_pause("amac")
         driver.get(search_url)
         
-        # 等待搜索结果加载
-        print("等待搜索结果加载...")
-        time.sleep(3)
-        
         # 查找搜索结果链接
         # 根据图片描述，结果在"机构、产品搜索结果"部分，链接在h3 > a中
-        wait = WebDriverWait(driver, 10)
-        
         result_link = None
         result_selectors = [
             (By.CSS_SELECTOR, '#count.textList h3 a'),  # 根据图片中的结构
@@ -83,6 +90,10 @@ def search_and_screenshot(search_query, save_to_desktop=True):
             (By.CSS_SELECTOR, 'a[href*="name="][href*="code="]'),  # 包含name和code参数的链接
         ]
         
+        # 等待搜索结果加载：出现结果链接，或网络空闲（无结果）即可继续
+        print("等待搜索结果加载...")
+        wait_for_page(driver, "amac", selectors=[selector for _, selector in result_selectors], timeout=10)
+        
         print("正在查找搜索结果链接...")
         for selector_type, selector in result_selectors:
             try:
@@ -108,14 +119,15 @@ def search_and_screenshot(search_query, save_to_desktop=True):
         else:
             # 访问结果链接
             print(f"\n正在访问结果页面: {result_link}")
+            polite_pause("amac")
             driver.get(result_link)
-            time.sleep(3)  # 等待页面加载
+            # 等待页面加载：详情信息块出现
+            wait_for_page(driver, "amac", selectors=['div.countBox span.tit', '.countBox span.tit'], timeout=10)
         
-        # 滚动页面确保内容加载完整
+        # 滚动页面确保内容加载完整（触发懒加载后等待网络空闲）
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(1)
+        wait_for_network_idle(driver, idle_time=0.5, timeout=3, site="amac")
         driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(1)
         
         # 提取企业信息（只有在访问了详情页时才尝试提取）
         print("\n正在提取企业信息...")
@@ -123,9 +135,6 @@ def search_and_screenshot(search_query, save_to_desktop=True):
         # 只有在访问了详情页（result_link 不是搜索页URL）时才尝试提取企业信息
         if result_link and result_link != search_url:
             try:
-                # 等待页面加载
-                time.sleep(2)
-                
                 # 根据HTML结构，信息可能在以下位置：
                 # 1. div.countBox div.text（div结构，包含 span.tit 和 span）
                 # 2. div.countBox li.text 或 li.text.w25（列表项结构）
@@ -295,42 +304,13 @@ def search_and_screenshot(search_query, save_to_desktop=True):
                     "queried_at": datetime.now().strftime("%Y%m%d_%H%M%S")
                 }
                 
-                existing_records = load_records(json_filepath)
-                updated_records = upsert_record(existing_records, record)
-                write_records(json_filepath, updated_records)
+                save_record(json_filepath, record)
                 
                 print(f"\n查询记录已写入/更新: {json_filepath}")
                 
             except Exception as e:
                 print(f"保存JSON文件时出错: {str(e)}")
         
-        # 获取页面完整尺寸（全页截图）
-        print("正在获取页面完整尺寸...")
-        # 获取页面的总宽度和高度（使用多种方法确保获取到完整尺寸）
-        total_width = driver.execute_script("return Math.max(document.body.scrollWidth, document.body.offsetWidth, document.documentElement.clientWidth, document.documentElement.scrollWidth, document.documentElement.offsetWidth);")
-        total_height = driver.execute_script("return Math.max(document.body.scrollHeight, document.body.offsetHeight, document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight);")
-        
-        # 获取当前窗口大小
-        viewport_width = driver.execute_script("return window.innerWidth")
-        viewport_height = driver.execute_script("return window.innerHeight")
-        
-        print(f"页面完整尺寸: {total_width} x {total_height}")
-        print(f"当前视窗尺寸: {viewport_width} x {viewport_height}")
-        
-        # 设置窗口大小为页面完整尺寸（加上一些边距以确保完整显示）
-        # 限制最大尺寸以避免超出屏幕
-        max_width = min(total_width + 100, 3840)  # 最大宽度限制为3840
-        max_height = min(total_height + 200, 21600)  # 最大高度限制为21600（足够大）
-        
-        if total_width > viewport_width or total_height > viewport_height:
-            print(f"调整窗口大小至: {max_width} x {max_height}")
-            driver.set_window_size(max_width, max_height)
-            time.sleep(2)  # 等待窗口调整和页面重新渲染
-            
-            # 再次滚动确保所有内容加载
-            driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(0.5)
-        
         # 截图保存
         if save_to_desktop:
             desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
@@ -346,12 +326,12 @@ def search_and_screenshot(search_query, save_to_desktop=True):
         # 生成文件名（使用搜索关键词和时间戳）
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_query = "".join(c for c in search_query if c.isalnum() or c in (' ', '-', '_')).strip()[:30]
-        filename = f"证监会_{safe_query}_{timestamp}.png"
+        filename = f"证监会_{safe_query}_{timestamp}{screenshot_extension()}"
         filepath = os.path.join(company_folder, filename)  # 保存到公司文件夹中
         
         print(f"正在截图全页内容并保存到: {filepath}")
-        # 使用 save_screenshot 截图（此时窗口大小已调整为页面完整尺寸）
-        driver.save_screenshot(filepath)
+        # CDP 整页截图，无需调整窗口大小
+        filepath, screenshot_sha256 = save_screenshot_artifact(driver, filepath)
         
         print("\n" + "="*60)
         print("操作完成！")
@@ -364,19 +344,21 @@ def search_and_screenshot(search_query, save_to_desktop=True):
         return {
             'search_url': search_url,
             'result_url': result_link,
-            'screenshot_path': filepath
+            'screenshot_path': filepath,
+            'screenshot_sha256': screenshot_sha256
         }
         
     except Exception as e:
         print(f"发生错误: {str(e)}")
         import traceback
         traceback.print_exc()
+        mark_broken(driver)
         return None
     
     finally:
-        if driver:
+        if driver and owns_driver:
             print("\n正在关闭浏览器...")
-            time.sleep(2)  # 等待一下以便查看结果
+            pause(2, site="amac")  # 等待一下以便查看结果
             driver.quit()
 
 
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+按内容寻址的截图存储：文件以 sha256 命名存放在 ~/.founders/artifacts/<前两位>/<sha256><后缀>，
+公司文件夹里的截图只是指向它的硬链接，同一份截图无论出现多少次都只占一份磁盘空间。
+
+- 记录中以 screenshot_sha256 引用截图内容，screenshot 仍是公司文件夹下的可读路径；
+  screenshot_sha256 是截取时原始字节的哈希，而存储文件总是按实际写入内容的哈希命名。开启缩小/重新压缩时
+  两者不同，此时另登记「原始哈希 → 存储文件」的别名（aliases/ 下的小文件），lookup() 两种哈希都能找到；
+- 每个公司文件夹的 artifacts.json 是该文件夹的截图清单（文件名 → sha256、存储路径）；
+  跨文件系统等无法建立硬链接时只写清单，按清单中的存储路径查看；
+- 存储目录可用环境变量 FOUNDERS_ARTIFACT_STORE 指定，与桌面放在同一磁盘上才能建立硬链接。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Union
+
+from storage_utils import file_lock, load_records, upsert_record, write_records
+
+DEFAULT_STORE_ROOT = Path(os.environ.get("FOUNDERS_ARTIFACT_STORE", Path.home() / ".founders" / "artifacts"))
+MANIFEST_NAME = "artifacts.json"
+
+LINK_EXISTS = "exists"
+LINK_HARDLINK = "hardlink"
+LINK_MANIFEST = "manifest"
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def digest_file(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, root: Union[str, Path] = DEFAULT_STORE_ROOT):
+        self.root = Path(root).expanduser()
+
+    def path_for(self, digest: str, suffix: str) -> Path:
+        return self.root / digest[:2] / f"{digest}{suffix.lower()}"
+
+    def alias_path(self, digest: str, suffix: str) -> Path:
+        return self.root / "aliases" / digest[:2] / f"{digest}{suffix.lower()}"
+
+    def add_alias(self, digest: str, stored: Path) -> None:
+        """登记 digest（如后处理前的原始截图哈希）指向存储中的 stored。"""
+        alias = self.alias_path(digest, stored.suffix)
+        alias.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = alias.with_name(f".{alias.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_text(stored.stem, encoding="utf-8")
+            os.replace(tmp_path, alias)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def lookup(self, digest: str, suffix: str) -> Optional[Path]:
+        """按内容哈希或别名查找存储中的文件，不存在时返回 None。"""
+        stored = self.path_for(digest, suffix)
+        if stored.exists():
+            return stored
+        try:
+            target = self.alias_path(digest, suffix).read_text(encoding="utf-8").strip()
+        except OSError:
+            return None
+        stored = self.path_for(target, suffix) if target else None
+        return stored if stored is not None and stored.exists() else None
+
+    def put(self, data: bytes, suffix: str, digest: Optional[str] = None) -> Path:
+        """写入存储（已存在则不重复写），返回存储路径。"""
+        stored = self.path_for(digest or digest_bytes(data), suffix)
+        if stored.exists():
+            return stored
+        stored.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = stored.with_name(f".{stored.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, stored)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return stored
+
+    def put_file(self, src: Union[str, Path]) -> Path:
+        """把已有文件收进存储：优先硬链接，避免再读一遍写一遍。"""
+        src = Path(src)
+        stored = self.path_for(digest_file(src), src.suffix)
+        if stored.exists():
+            return stored
+        stored.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(src, stored)
+        except FileExistsError:
+            pass
+        except OSError:
+            return self.put(src.read_bytes(), src.suffix, digest=stored.stem)
+        return stored
+
+    def materialize(self, stored: Path, dest: Union[str, Path]) -> str:
+        """在 dest 处呈现存储中的文件（硬链接），并登记到 dest 所在文件夹的清单。返回呈现方式。"""
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if dest.exists() and os.path.samefile(dest, stored):
+            mode = LINK_EXISTS
+        else:
+            tmp_path = dest.with_name(f".{dest.name}.{os.getpid()}.{threading.get_ident()}.link")
+            try:
+                os.link(stored, tmp_path)
+                os.replace(tmp_path, dest)
+                mode = LINK_HARDLINK
+            except OSError as exc:
+                print(f"无法建立硬链接，仅记录到清单：{dest.name}（{exc}）")
+                mode = LINK_MANIFEST
+            finally:
+                tmp_path.unlink(missing_ok=True)
+        self._register(dest, stored, mode)
+        return mode
+
+    def link_file(self, src: Union[str, Path], dest: Union[str, Path]) -> str:
+        """代替复制：把 src 收进存储后在 dest 呈现，只增加一个目录项。"""
+        return self.materialize(self.put_file(src), dest)
+
+    def _register(self, dest: Path, stored: Path, mode: str) -> None:
+        manifest = dest.parent / MANIFEST_NAME
+        entry = {
+            "file": dest.name,
+            "sha256": stored.stem,
+            "store_path": str(stored),
+            "linked": mode != LINK_MANIFEST,
+            "registered_at": datetime.now().strftime("%Y%m%d_%H%M%S"),
+        }
+        with file_lock(manifest):
+            write_records(manifest, upsert_record(load_records(manifest), entry, key_fields=("file",)))
+
+
+_STORE_LOCK = threading.Lock()
+_STORE: Optional[ArtifactStore] = None
+
+
+def get_artifact_store() -> ArtifactStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = ArtifactStore()
+        return _STORE
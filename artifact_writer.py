@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+截图等产物的后台写入：爬虫线程只负责从浏览器取回截图数据，解码、可选的重新压缩/缩小、
+写盘都交给后台线程池完成，调用方立即拿到目标路径（或 Future）继续爬取。
+
+- 写入目标直接是最终的公司文件夹，写入时先写临时文件再 os.replace，不会留下半截图片；
+- 传入 digest（原始截图的 sha256）时内容写进 artifact_store，公司文件夹中只建立硬链接；
+  digest 只用于去重查找（已存在则跳过写入与后处理），存储文件按后处理之后的字节重新计算哈希命名，
+  两者不同时登记别名；
+- 安装 Pillow 后可以按最大宽度缩小、按质量重新压缩（FOUNDERS_SCREENSHOT_MAX_WIDTH、
+  FOUNDERS_SCREENSHOT_RECOMPRESS=1）；未安装时原样写入；
+- 进程退出前（atexit）以及 flush_artifacts() 会等待所有写入完成；flush_artifacts(under=路径)
+  只等待写往该文件或该目录下的产物，批量流程中一家公司不必等其他公司的截图。
+"""
+
+from __future__ import annotations
+
+import atexit
+import base64
+import io
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+from artifact_store import get_artifact_store
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 为可选依赖
+    Image = None
+
+DEFAULT_WORKERS = int(os.environ.get("FOUNDERS_ARTIFACT_WORKERS", "2"))
+DEFAULT_MAX_WIDTH = int(os.environ.get("FOUNDERS_SCREENSHOT_MAX_WIDTH", "0")) or None
+DEFAULT_RECOMPRESS = os.environ.get("FOUNDERS_SCREENSHOT_RECOMPRESS", "") == "1"
+
+_PIL_FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP"}
+
+
+def _postprocess(data: bytes, path: Path, max_width: Optional[int], quality: Optional[int], recompress: bool) -> bytes:
+    if Image is None or not (max_width or recompress):
+        return data
+    pil_format = _PIL_FORMATS.get(path.suffix.lower())
+    if pil_format is None:
+        return data
+    with Image.open(io.BytesIO(data)) as image:
+        if max_width and image.width > max_width:
+            height = max(1, round(image.height * max_width / image.width))
+            image = image.resize((max_width, height), Image.LANCZOS)
+        elif not recompress:
+            return data
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        options = {"optimize": True}
+        if pil_format in ("JPEG", "WEBP") and quality is not None:
+            options["quality"] = int(quality)
+        buffer = io.BytesIO()
+        image.save(buffer, format=pil_format, **options)
+        return buffer.getvalue()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+class ArtifactWriter:
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_WORKERS,
+        max_width: Optional[int] = DEFAULT_MAX_WIDTH,
+        recompress: bool = DEFAULT_RECOMPRESS,
+    ):
+        self.max_width = max_width
+        self.recompress = recompress
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="artifact")
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[Path, Future]] = []
+        if (max_width or recompress) and Image is None:
+            print("未安装 Pillow，截图将按原样写入（不缩小、不重新压缩）")
+
+    def submit(
+        self,
+        data: Union[bytes, str],
+        path: Union[str, Path],
+        quality: Optional[int] = None,
+        digest: Optional[str] = None,
+    ) -> Future:
+        """
+        data 可以是原始字节或 base64 字符串（CDP 返回值）；digest 为原始截图字节的 sha256，
+        给出时按内容存储并硬链接到 path。Future 的结果为 path 字符串。
+        """
+        path = Path(path)
+        future = self._executor.submit(self._process, data, path, quality, digest)
+        with self._lock:
+            self._pending = [(target, f) for target, f in self._pending if not f.done()]
+            self._pending.append((path.absolute(), future))
+        return future
+
+    def _process(self, data: Union[bytes, str], path: Path, quality: Optional[int], digest: Optional[str]) -> str:
+        store = get_artifact_store() if digest else None
+        if store is not None:
+            stored = store.lookup(digest, path.suffix)
+            if stored is not None:
+                store.materialize(stored, path)
+                return str(path)
+        raw = base64.b64decode(data) if isinstance(data, str) else data
+        final = raw
+        try:
+            final = _postprocess(raw, path, self.max_width, quality, self.recompress)
+        except Exception as exc:
+            print(f"截图后处理失败，按原样写入 {path.name}：{exc}")
+        if store is None:
+            _write_atomic(path, final)
+        elif final is raw:
+            store.materialize(store.put(raw, path.suffix, digest=digest), path)
+        else:
+            # 内容已改变：按处理后字节的哈希存放，原始哈希登记为别名供去重查找
+            stored = store.put(final, path.suffix)
+            store.add_alias(digest, stored)
+            store.materialize(stored, path)
+        return str(path)
+
+    def flush(self, timeout: Optional[float] = None, under: Union[str, Path, None] = None) -> None:
+        """等待已提交的写入完成（under 给出时只等写往该文件或该目录下的）；写入异常在此打印。"""
+        with self._lock:
+            if under is None:
+                selected, self._pending = self._pending, []
+            else:
+                root = Path(under).absolute()
+                selected = [(target, f) for target, f in self._pending if target == root or root in target.parents]
+                self._pending = [entry for entry in self._pending if entry not in selected]
+        pending = [future for _, future in selected]
+        if not pending:
+            return
+        wait(pending, timeout=timeout)
+        for future in pending:
+            if future.done() and future.exception() is not None:
+                print(f"截图写入失败：{future.exception()}")
+
+    def close(self) -> None:
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+
+_WRITER_LOCK = threading.Lock()
+_WRITER: Optional[ArtifactWriter] = None
+
+
+def get_artifact_writer() -> ArtifactWriter:
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = ArtifactWriter()
+        return _WRITER
+
+
+def write_artifact(
+    data: Union[bytes, str],
+    path: Union[str, Path],
+    quality: Optional[int] = None,
+    digest: Optional[str] = None,
+) -> Future:
+    return get_artifact_writer().submit(data, path, quality=quality, digest=digest)
+
+
+def flush_artifacts(timeout: Optional[float] = None, under: Union[str, Path, None] = None) -> None:
+    with _WRITER_LOCK:
+        writer = _WRITER
+    if writer is not None:
+        writer.flush(timeout, under=under)
+
+
+atexit.register(flush_artifacts)
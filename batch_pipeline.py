@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量流程：读取 CSV/Excel 中的公司列表，按配置的并发数调度 company_pipeline.run_full_pipeline。
+
+- 每家公司开始/结束时都会把状态写入断点文件（JSON），进程崩溃后重跑同一命令会跳过已成功的公司；
+- 多家公司共享的自然人、持股主体在整批中只查询一次（result_cache.batch_scope），其余公司共享结果与截图；
+- 整批记录一份追踪（tracing），结束时打印汇总并导出 Chrome trace JSON；
+- 全部结束后输出每家公司的状态与各阶段耗时汇总表（CSV，可直接用 Excel 打开），并在终端打印。
+
+用法：
+    python batch_pipeline.py companies.csv --workers 2
+    python batch_pipeline.py companies.xlsx --workers 2 --concurrent
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+import company_pipeline
+import result_cache
+import wenshu
+from driver_pool import DriverPool
+from storage_utils import RECORD_BACKENDS, create_record_backend, set_record_backend
+from tracing import current_tracer, finish_trace, start_trace
+from wait_utils import print_wait_stats
+import webdriver_profiler
+
+COMPANY_COLUMN_CANDIDATES = ("公司名称", "公司名", "企业名称", "company", "company_name", "name")
+
+STATUS_RUNNING = "running"
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+
+SUMMARY_FIELDS = [
+    "company",
+    "status",
+    "total_seconds",
+    "amac_seconds",
+    "nested_seconds",
+    "lookups_seconds",
+    "critical_path",
+    "started_at",
+    "finished_at",
+    "error",
+]
+
+
+def _read_rows(path: Path) -> List[List[str]]:
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise RuntimeError("读取 Excel 需要安装 openpyxl：pip install openpyxl") from None
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            return [
+                [("" if cell is None else str(cell)).strip() for cell in row]
+                for row in workbook.active.iter_rows(values_only=True)
+            ]
+        finally:
+            workbook.close()
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        return [[cell.strip() for cell in row] for row in csv.reader(f)]
+
+
+def load_companies(path: str | Path) -> List[str]:
+    """读取公司列表：有表头时按常见列名取列，否则取第一列；自动去重并保持原顺序。"""
+    rows = [row for row in _read_rows(Path(path)) if any(row)]
+    if not rows:
+        return []
+    header = [cell.lower() for cell in rows[0]]
+    column, start = 0, 0
+    for candidate in COMPANY_COLUMN_CANDIDATES:
+        if candidate.lower() in header:
+            column, start = header.index(candidate.lower()), 1
+            break
+    names = [row[column] for row in rows[start:] if len(row) > column]
+    return company_pipeline._deduplicate_keep_order(names)
+
+
+class BatchCheckpoint:
+    """公司 → 运行状态 的断点文件；每次更新都整体写入临时文件再替换，崩溃时不会留下半截 JSON。"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as exc:
+            print(f"读取断点文件失败，将从头开始：{exc}")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def is_done(self, company: str) -> bool:
+        return self.entries.get(company, {}).get("status") == STATUS_SUCCESS
+
+    def update(self, company: str, **fields: Any) -> None:
+        with self._lock:
+            self.entries.setdefault(company, {}).update(fields)
+            self._save()
+
+
+def _run_one(company: str, checkpoint: BatchCheckpoint, pipeline_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    started_at = datetime.now().strftime("%Y%m%d_%H%M%S")
+    checkpoint.update(company, status=STATUS_RUNNING, started_at=started_at, finished_at=None, error=None)
+    start = time.perf_counter()
+    status, error, timings, critical_path = STATUS_SUCCESS, None, {}, []
+    try:
+        result = company_pipeline.run_full_pipeline(company, **pipeline_kwargs)
+        timings = result.get("timings") or {}
+        critical_path = result.get("critical_path") or []
+    except Exception as exc:
+        status, error = STATUS_FAILED, str(exc)
+        print(f"[批量] {company} 失败：{exc}")
+    checkpoint.update(
+        company,
+        status=status,
+        error=error,
+        total_seconds=round(time.perf_counter() - start, 1),
+        timings={stage: round(seconds, 1) for stage, seconds in timings.items()},
+        critical_path=critical_path,
+        finished_at=datetime.now().strftime("%Y%m%d_%H%M%S"),
+    )
+    return checkpoint.entries[company]
+
+
+def _summary_rows(companies: List[str], checkpoint: BatchCheckpoint) -> List[Dict[str, Any]]:
+    rows = []
+    for company in companies:
+        entry = checkpoint.entries.get(company, {})
+        timings = entry.get("timings") or {}
+        rows.append({
+            "company": company,
+            "status": entry.get("status", "pending"),
+            "total_seconds": entry.get("total_seconds", ""),
+            "amac_seconds": timings.get("amac", ""),
+            "nested_seconds": timings.get("nested", ""),
+            "lookups_seconds": timings.get("lookups", ""),
+            "critical_path": " → ".join(entry.get("critical_path") or []),
+            "started_at": entry.get("started_at", ""),
+            "finished_at": entry.get("finished_at", ""),
+            "error": entry.get("error") or "",
+        })
+    return rows
+
+
+def write_summary(rows: List[Dict[str, Any]], summary_path: str | Path) -> Path:
+    path = Path(summary_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # utf-8-sig 方便 Excel 直接识别中文
+    with path.open("w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def _print_summary(rows: List[Dict[str, Any]]) -> None:
+    print("\n" + "=" * 60)
+    print("批量运行汇总")
+    print("=" * 60)
+    for row in rows:
+        line = f"  {row['status']:<8} {str(row['total_seconds']):>8}s  {row['company']}"
+        if row["error"]:
+            line += f"  ({row['error']})"
+        print(line)
+    success = sum(1 for row in rows if row["status"] == STATUS_SUCCESS)
+    print(f"成功 {success} / 共 {len(rows)}")
+    print("=" * 60)
+
+
+def run_batch(
+    companies: List[str],
+    workers: int = 1,
+    checkpoint_path: str | Path = "batch_checkpoint.json",
+    summary_path: Optional[str | Path] = None,
+    trace_path: Optional[str | Path] = None,
+    **pipeline_kwargs: Any,
+) -> List[Dict[str, Any]]:
+    """
+    按 workers 个并发调度各公司的全流程；已在断点文件中标记成功的公司直接跳过。
+    pipeline_kwargs 原样传给 run_full_pipeline（如 concurrent、neris_workers）；
+    未指定 driver_pool 时整批共享一个浏览器池，避免每家公司重新冷启动 Chrome；
+    整批共享一个查询登记，相同的 (来源, 查询词) 只执行一次。
+    """
+    checkpoint = BatchCheckpoint(checkpoint_path)
+    pending = [company for company in companies if not checkpoint.is_done(company)]
+    skipped = len(companies) - len(pending)
+    print(f"[批量] 共 {len(companies)} 家公司，待处理 {len(pending)} 家，断点跳过 {skipped} 家，并发 {workers}")
+
+    owns_trace = current_tracer() is None
+    tracer = start_trace(f"batch_{Path(checkpoint_path).stem}")
+    owns_pool = pipeline_kwargs.get("driver_pool") is None
+    if owns_pool:
+        pipeline_kwargs["driver_pool"] = DriverPool()
+    try:
+        with result_cache.batch_scope() as registry, ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="company"
+        ) as executor:
+            futures = {
+                executor.submit(_run_one, company, checkpoint, pipeline_kwargs): company
+                for company in pending
+            }
+            for done_count, future in enumerate(as_completed(futures), start=1):
+                company = futures[future]
+                entry = future.result()
+                print(f"[批量] ({done_count}/{len(pending)}) {company}: {entry['status']}，耗时 {entry['total_seconds']}s")
+        print(f"[批量] {registry.summary()}")
+    finally:
+        if owns_pool:
+            pipeline_kwargs["driver_pool"].close()
+        if owns_trace:
+            finish_trace(tracer, trace_path)
+
+    rows = _summary_rows(companies, checkpoint)
+    _print_summary(rows)
+    if summary_path is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        summary_path = Path(checkpoint_path).with_name(f"batch_summary_{timestamp}.csv")
+    written = write_summary(rows, summary_path)
+    print(f"汇总表已写入：{written}")
+    return rows
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="批量执行 company_pipeline 一键流程")
+    parser.add_argument("input", help="公司列表文件（CSV/Excel，一行一家公司）")
+    parser.add_argument("--workers", type=int, default=1, help="同时处理的公司数")
+    parser.add_argument("--checkpoint", help="断点文件路径（默认与输入文件同目录）")
+    parser.add_argument("--summary", help="汇总表 CSV 路径（默认与断点文件同目录）")
+    parser.add_argument("--concurrent", action="store_true", help="单个公司内 NERIS 与文书网查询并发执行")
+    parser.add_argument("--neris-workers", type=int, default=2, help="并发模式下 NERIS 的最大并发数")
+    parser.add_argument("--wenshu-workers", type=int, default=1, help="并发模式下文书网的最大并发数")
+    parser.add_argument(
+        "--wenshu-max-pages",
+        type=int,
+        default=wenshu.MAX_RESULT_PAGES,
+        help="文书网每个关键词最多解析的结果页数（0 为只截图）",
+    )
+    parser.add_argument(
+        "--record-backend",
+        choices=RECORD_BACKENDS,
+        help="记录存储后端：json 每家公司一个 JSON（默认）/ sqlite 写入 ~/.founders/records.sqlite3",
+    )
+    parser.add_argument("--refresh", action="store_true", help="忽略结果缓存，所有来源都重新查询")
+    parser.add_argument(
+        "--profile-webdriver",
+        action="store_true",
+        help="统计每条 WebDriver 命令的次数与耗时，退出时打印热点报告",
+    )
+    parser.add_argument("--trace", help="整批追踪文件（Chrome trace JSON）路径，默认写入 ~/.founders/traces/")
+    return parser
+
+
+def main():
+    args = _build_arg_parser().parse_args()
+    input_path = Path(args.input)
+    if not input_path.exists():
+        print(f"找不到公司列表文件：{input_path}")
+        sys.exit(1)
+
+    try:
+        companies = load_companies(input_path)
+    except Exception as exc:
+        print(f"读取公司列表失败：{exc}")
+        sys.exit(1)
+    if not companies:
+        print("公司列表为空，程序退出。")
+        sys.exit(1)
+
+    if args.record_backend:
+        set_record_backend(create_record_backend(args.record_backend))
+    wenshu.configure_results(args.wenshu_max_pages)
+    result_cache.configure(refresh=args.refresh)
+    if args.profile_webdriver:
+        webdriver_profiler.enable()
+    checkpoint_path = args.checkpoint or input_path.with_name(f"{input_path.stem}.checkpoint.json")
+    rows = run_batch(
+        companies,
+        workers=args.workers,
+        checkpoint_path=checkpoint_path,
+        summary_path=args.summary,
+        trace_path=args.trace,
+        concurrent=args.concurrent,
+        neris_workers=args.neris_workers,
+        wenshu_workers=args.wenshu_workers,
+    )
+    print_wait_stats()
+    sys.exit(0 if all(row["status"] == STATUS_SUCCESS for row in rows) else 1)
+
+
+if __name__ == "__main__":
+    main()
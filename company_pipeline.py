@@ -6,12 +6,18 @@
 2. 调用 nested_judge 模块（内部使用企查查）计算法定代表人与受益所有人；
 3. 对法定代表人/受益人使用 neris.py 查询失信记录并截图；
 4. 使用 wenshu.py 分别以公司名、法定代表人、受益人名搜索裁判文书并截图。
+
+各步骤按 stage_graph 的依赖图调度：AMAC、企查查穿透、以公司名为目标的 NERIS/文书网查询同时开始，
+只有针对法定代表人与受益人的查询等待穿透结果；运行结束时打印各阶段耗时与关键路径。
+每次运行都会记录追踪（tracing）：导出 Chrome trace JSON，并打印按阶段、查询、导航、等待汇总的耗时表。
 """
 
 from __future__ import annotations
 
+import argparse
 import sys
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Tuple, Optional
 
@@ -25,12 +31,32 @@ if str(NESTED_DIR) not in sys.path:
 
 import amac as amac_spider
 from nested_judge import nested_judge as nested_processor
-
-import shutil
+import qcc_nested
 
 import neris
+from artifact_store import get_artifact_store
+from artifact_writer import flush_artifacts
+from driver_pool import DriverPool, checkout_from
+from result_cache import SOURCE_AMAC, SOURCE_NERIS, SOURCE_QCC, SOURCE_WENSHU, cached_lookup
+import result_cache
+from stage_graph import StageFailed, StageGraph
+from tracing import current_tracer, finish_trace, start_trace
+from storage_utils import (
+    RECORD_BACKENDS,
+    WriteBehindBuffer,
+    create_record_backend,
+    set_record_backend,
+    write_behind,
+)
+from wait_utils import pause, print_wait_stats
+import webdriver_profiler
+import wenshu
 from wenshu import search_wenshu as wenshu_search
 
+_QCC_LOCK = threading.Lock()
+_QCC_RESULT_OPTIONS = ("max_depth", "max_nodes", "min_effective_stake")
+LOOKUP_STAGES = ("neris_company", "wenshu_company", "neris_people", "wenshu_people")
+
 
 def _deduplicate_keep_order(items: List[str]) -> List[str]:
     seen = set()
@@ -54,37 +80,77 @@ def _copy_screenshot(src_path: Optional[str], target_dir: Path, prefix: str) ->
     if not src_path:
         print(f"  ✗ 没有可复制的截图（{prefix}）")
         return None
+    # 截图由后台线程写入，复制前只等待这一张写完
     src = Path(src_path)
+    flush_artifacts(under=src)
     if not src.exists():
         print(f"  ✗ 截图文件不存在：{src}")
         return None
     target_dir.mkdir(parents=True, exist_ok=True)
     dst = target_dir / f"{prefix}_{src.name}"
     try:
-        shutil.copy2(src, dst)
-        print(f"  ✓ 截图已复制到：{dst}")
+        # 按内容存储后硬链接过去，不再复制文件内容
+        get_artifact_store().link_file(src, dst)
+        print(f"  ✓ 截图已链接到：{dst}")
         return str(dst)
     except Exception as exc:
-        print(f"  ✗ 复制截图失败：{exc}")
+        print(f"  ✗ 链接截图失败：{exc}")
         return None
 
 
-def _run_amac(company_name: str):
+def _company_json_path(company_name: str) -> Path:
+    return _company_folder(company_name) / f"{company_name}.json"
+
+
+def _run_amac(company_name: str, driver_pool: Optional[DriverPool] = None):
     print(f"\n==> [AMAC] 开始查询 {company_name}")
-    amac_result = amac_spider.search_and_screenshot(company_name, save_to_desktop=True)
+
+    def _fetch():
+        with checkout_from(driver_pool, "amac") as driver:
+            return amac_spider.search_and_screenshot(company_name, save_to_desktop=True, driver=driver)
+
+    amac_result = cached_lookup(SOURCE_AMAC, company_name, _fetch, _company_json_path(company_name))
     if not amac_result:
         raise RuntimeError("AMAC 查询失败，流程终止。")
     return amac_result
 
 
-def _run_nested(company_name: str):
+def _run_nested(
+    company_name: str,
+    driver_pool: Optional[DriverPool] = None,
+    qcc_fetch_mode: str = qcc_nested.DEFAULT_FETCH_MODE,
+    qcc_crawl_options: Optional[dict] = None,
+):
     print(f"\n==> [Nested Judge] 通过企查查获取股东结构")
-    analysis = nested_processor.analyze_company(company_name)
+    crawl_options = dict(qcc_crawl_options or {})
+    # 影响穿透结果的参数计入缓存键，换参数重跑时不会用到旧结果：
+    # dfs/bfs 的剪枝口径与提前结束条件不同，读取方式不同时解析结果也可能不同
+    variant = {key: crawl_options[key] for key in _QCC_RESULT_OPTIONS if crawl_options.get(key) is not None}
+    variant["crawl_mode"] = crawl_options.get("crawl_mode") or qcc_nested.DEFAULT_CRAWL_MODE
+    variant["fetch_mode"] = qcc_fetch_mode
+    crawl_options.setdefault("driver_pool", driver_pool)
+
+    def _fetch():
+        # 企查查账号不能多处同时登录，批量模式下多个公司的穿透阶段需要排队
+        with _QCC_LOCK, checkout_from(driver_pool, "qcc") as driver:
+            analysis = nested_processor.analyze_company(
+                company_name, driver=driver, fetch_mode=qcc_fetch_mode, **crawl_options
+            )
+        if not analysis:
+            return None
+        return {
+            "legal_representative": analysis.get("legal_representative"),
+            "major_shareholders": [list(item) for item in analysis.get("major_shareholders") or []],
+        }
+
+    analysis = cached_lookup(
+        SOURCE_QCC, company_name, _fetch, _company_json_path(company_name), variant=variant
+    )
     if not analysis:
         raise RuntimeError("nested_judge 未返回分析结果。")
 
     legal_rep = analysis.get("legal_representative")
-    major_shareholders = analysis.get("major_shareholders") or []
+    major_shareholders = [tuple(item) for item in analysis.get("major_shareholders") or []]
     print(f"法定代表人: {legal_rep or '未识别'}")
     if major_shareholders:
         print("受益所有人（>=30%）：")
@@ -96,14 +162,93 @@ def _run_nested(company_name: str):
     return legal_rep, major_shareholders
 
 
-def _run_neris_for_people(names: List[str], company_folder: Path, company_name: str):
+def _call_with_retry(label: str, func, max_retries: int, retry_delay: float):
+    result = None
+    for attempt in range(1, max_retries + 1):
+        try:
+            result = func()
+        except Exception as exc:
+            print(f"  ✗ {label} 查询异常（第 {attempt} 次）：{exc}")
+            result = None
+        if result:
+            break
+        if attempt < max_retries:
+            print(f"  … {label} 查询失败，准备重试（{attempt}/{max_retries}）")
+            pause(retry_delay, site="pipeline", kind="retry")
+    return result
+
+
+def _neris_lookup(
+    name: str,
+    company_folder: Path,
+    company_name: str,
+    max_retries: int = 5,
+    retry_delay: float = 2.0,
+    driver_pool: Optional[DriverPool] = None,
+):
+    print(f"-- 查询 {name}")
+
+    def _attempt():
+        with checkout_from(driver_pool, "neris") as driver:
+            return neris.search_and_get_results(name, company_name=company_name, driver=driver)
+
+    # neris 以 company_name 为目录名，截图已直接写入公司文件夹，无需再复制
+    return cached_lookup(
+        SOURCE_NERIS,
+        name,
+        lambda: _call_with_retry("NERIS", _attempt, max_retries, retry_delay),
+        company_folder / f"{company_name}.json",
+    )
+
+
+def _wenshu_lookup(
+    keyword: str,
+    company_folder: Path,
+    company_name: str,
+    max_retries: int = 5,
+    retry_delay: float = 2.0,
+    driver_pool: Optional[DriverPool] = None,
+):
+    print(f"-- 裁判文书网搜索：{keyword}")
+
+    def _attempt():
+        with checkout_from(driver_pool, "wenshu") as driver:
+            return wenshu_search(
+                keyword,
+                save_to_desktop=True,
+                target_directory=str(company_folder),
+                record_name=company_name,
+                driver=driver,
+            )
+
+    result = cached_lookup(
+        SOURCE_WENSHU,
+        keyword,
+        lambda: _call_with_retry("裁判文书网", _attempt, max_retries, retry_delay),
+        company_folder / f"{company_name}.json",
+        variant={"max_pages": wenshu.MAX_RESULT_PAGES},
+    )
+    if not result:
+        print(f"  ✗ 裁判文书网查询多次失败：{keyword}")
+        return None
+    screenshot_path = result.get("screenshot")
+    if screenshot_path:
+        shot_parent = Path(screenshot_path).resolve().parent
+        if shot_parent != company_folder.resolve():
+            _copy_screenshot(screenshot_path, company_folder, f"WENSHU_{keyword}")
+    return result
+
+
+def _run_neris_for_people(
+    names: List[str],
+    company_folder: Path,
+    company_name: str,
+    driver_pool: Optional[DriverPool] = None,
+):
     print("\n==> [NERIS] 开始逐个查询失信记录")
     results = []
     for name in _deduplicate_keep_order(names):
-        print(f"-- 查询 {name}")
-        result = neris.search_and_get_results(name, company_name=company_name)
-        if result:
-            _copy_screenshot(result.get("screenshot"), company_folder, f"NERIS_{name}")
+        result = _neris_lookup(name, company_folder, company_name, driver_pool=driver_pool)
         results.append((name, result))
     return results
 
@@ -114,92 +259,305 @@ def _run_wenshu_for_keywords(
     company_name: str,
     max_retries: int = 5,
     retry_delay: float = 2.0,
+    driver_pool: Optional[DriverPool] = None,
 ):
     print("\n==> [Wenshu] 开始逐个关键词搜索并截图")
     results = []
-    seen = set()
-    target_dir_resolved = company_folder.resolve()
     for keyword in _deduplicate_keep_order(keywords):
-        normalized = keyword.strip()
-        if not normalized:
-            continue
-        if normalized in seen:
-            print(f"-- 裁判文书网搜索：{normalized}（已处理，跳过）")
-            continue
-        seen.add(normalized)
-        print(f"-- 裁判文书网搜索：{keyword}")
-        result = None
-        for attempt in range(1, max_retries + 1):
-            try:
-                result = wenshu_search(
-                    keyword,
-                    save_to_desktop=True,
-                    target_directory=str(company_folder),
-                    record_name=company_name,
-                )
-            except Exception as exc:
-                print(f"  ✗ 裁判文书网查询异常（第 {attempt} 次）：{exc}")
-                result = None
-            if result:
-                break
-            if attempt < max_retries:
-                print(f"  … 查询失败，准备重试（{attempt}/{max_retries}）")
-                time.sleep(retry_delay)
-        if not result:
-            print(f"  ✗ 裁判文书网查询多次失败：{keyword}")
-        if result:
-            screenshot_path = result.get("screenshot")
-            if screenshot_path:
-                shot_parent = Path(screenshot_path).resolve().parent
-                if shot_parent != target_dir_resolved:
-                    _copy_screenshot(screenshot_path, company_folder, f"WENSHU_{keyword}")
+        result = _wenshu_lookup(
+            keyword, company_folder, company_name, max_retries, retry_delay, driver_pool=driver_pool
+        )
         results.append((keyword, result))
     return results
 
 
-def run_full_pipeline(company_name: str):
+def run_full_pipeline(
+    company_name: str,
+    concurrent: bool = False,
+    neris_workers: int = 2,
+    wenshu_workers: int = 1,
+    driver_pool: Optional[DriverPool] = None,
+    qcc_fetch_mode: str = qcc_nested.DEFAULT_FETCH_MODE,
+    qcc_crawl_options: Optional[dict] = None,
+    trace_path: Optional[str] = None,
+):
+    """
+    driver_pool 为空时为本次运行创建一个浏览器池并在结束时关闭；
+    批量模式可传入共享的池，让多家公司复用同一批浏览器。
+    qcc_crawl_options 原样传给 qcc_nested.search_and_screenshot（crawl_mode、crawl_workers、allow_concurrent_sessions、max_depth、max_nodes、min_effective_stake）。
+    没有正在进行的追踪时（单独运行）为本次运行开启追踪，结束时打印汇总并导出到 trace_path
+    （缺省为 ~/.founders/traces/）；批量模式下由整批的追踪统一导出。
+    """
+    owns_trace = current_tracer() is None
+    tracer = start_trace(company_name)
+    owns_pool = driver_pool is None
+    if owns_pool:
+        driver_pool = DriverPool()
+    try:
+        return _run_full_pipeline(
+            company_name, concurrent, neris_workers, wenshu_workers, driver_pool, qcc_fetch_mode, qcc_crawl_options
+        )
+    finally:
+        # 截图在后台写入，返回前确保本次的文件都已落盘
+        flush_artifacts()
+        if owns_pool:
+            driver_pool.close()
+        if owns_trace:
+            finish_trace(tracer, trace_path)
+
+
+def _run_full_pipeline(
+    company_name: str,
+    concurrent: bool,
+    neris_workers: int,
+    wenshu_workers: int,
+    driver_pool: DriverPool,
+    qcc_fetch_mode: str,
+    qcc_crawl_options: Optional[dict],
+):
     company_folder = _company_folder(company_name)
-    amac_info = _run_amac(company_name)
+    # 各阶段写往 公司名.json 的记录先暂存，阶段结束时统一写入；中途失败也会写入已完成的部分
+    with write_behind([company_folder / f"{company_name}.json"]) as records_buffer:
+        return _run_stages(
+            company_name,
+            company_folder,
+            concurrent,
+            neris_workers,
+            wenshu_workers,
+            driver_pool,
+            qcc_fetch_mode,
+            qcc_crawl_options,
+            records_buffer,
+        )
+
+
+def _person_targets(company_name: str, legal_rep: Optional[str], major_shareholders) -> List[str]:
+    targets = []
+    if legal_rep:
+        targets.append(legal_rep)
+    targets.extend(name for name, _ in major_shareholders)
+    # 公司名已由 *_company 阶段查询过
+    return [target for target in _deduplicate_keep_order(targets) if target != company_name]
 
-    legal_rep, major_shareholders = _run_nested(company_name)
 
-    beneficiary_names = [name for name, _ in major_shareholders]
-    person_targets = []
-    if legal_rep:
-        person_targets.append(legal_rep)
-    person_targets.extend(beneficiary_names)
+def _run_lookups(
+    source: str,
+    targets: List[str],
+    company_folder: Path,
+    company_name: str,
+    concurrent: bool = False,
+    workers: int = 1,
+    driver_pool: Optional[DriverPool] = None,
+):
+    """
+    单一来源（neris / wenshu）的一批查询。concurrent 时使用该来源自己的有界线程池，
+    否则逐个执行；各脚本通过 storage_utils.save_record 按文件加锁合并，不会互相覆盖。
+    返回 [(目标, 结果)]，顺序与输入一致。
+    """
+    targets = _deduplicate_keep_order(targets)
+    if not targets:
+        return []
+    if not concurrent or len(targets) == 1:
+        if source == "neris":
+            return _run_neris_for_people(targets, company_folder, company_name, driver_pool=driver_pool)
+        return _run_wenshu_for_keywords(targets, company_folder, company_name, driver_pool=driver_pool)
+
+    lookup = _neris_lookup if source == "neris" else _wenshu_lookup
+    print(f"\n==> [{source}] 并发查询 {len(targets)} 个目标（并发 {workers}）")
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=source) as executor:
+        futures = [
+            executor.submit(lookup, target, company_folder, company_name, driver_pool=driver_pool)
+            for target in targets
+        ]
+        results = []
+        for target, future in zip(targets, futures):
+            try:
+                results.append((target, future.result()))
+            except Exception as exc:
+                print(f"  ✗ {source} 查询 {target} 失败：{exc}")
+                results.append((target, None))
+    return results
+
+
+def _run_stages(
+    company_name: str,
+    company_folder: Path,
+    concurrent: bool,
+    neris_workers: int,
+    wenshu_workers: int,
+    driver_pool: DriverPool,
+    qcc_fetch_mode: str,
+    qcc_crawl_options: Optional[dict],
+    records_buffer: WriteBehindBuffer,
+):
+    """
+    阶段依赖图：AMAC、企查查穿透、以公司名为目标的 NERIS/文书网查询互不依赖，同时开始；
+    只有针对法定代表人与受益人的查询等待穿透结果。同一来源的人员查询排在公司名查询之后，
+    以复用同一个文书网登录会话。
+    """
+
+    def _lookup(source: str, targets: List[str], workers: int = 1):
+        return _run_lookups(source, targets, company_folder, company_name, concurrent, workers, driver_pool)
+
+    def _nested():
+        legal_rep, major_shareholders = _run_nested(company_name, driver_pool, qcc_fetch_mode, qcc_crawl_options)
+        return {"legal_representative": legal_rep, "beneficial_owners": major_shareholders}
+
+    graph = StageGraph(label=company_name)
+    graph.add("amac", lambda: _run_amac(company_name, driver_pool))
+    graph.add("nested", _nested, outputs=("legal_representative", "beneficial_owners"))
+    graph.add("neris_company", lambda: _lookup("neris", [company_name]))
+    graph.add("wenshu_company", lambda: _lookup("wenshu", [company_name]))
+    graph.add(
+        "neris_people",
+        lambda legal_representative, beneficial_owners, neris_company: _lookup(
+            "neris", _person_targets(company_name, legal_representative, beneficial_owners), neris_workers
+        ),
+        inputs=("legal_representative", "beneficial_owners", "neris_company"),
+    )
+    graph.add(
+        "wenshu_people",
+        lambda legal_representative, beneficial_owners, wenshu_company: _lookup(
+            "wenshu", _person_targets(company_name, legal_representative, beneficial_owners), wenshu_workers
+        ),
+        inputs=("legal_representative", "beneficial_owners", "wenshu_company"),
+    )
+
+    def _on_stage_done(name: str, error: Optional[BaseException]) -> None:
+        # 阶段边界：把该阶段暂存的记录写入后端
+        records_buffer.flush()
+        if error is not None:
+            print(f"  ✗ 阶段 {name} 失败：{error}")
 
-    neris_targets = [company_name]
-    neris_targets.extend(person_targets)
-    _run_neris_for_people(neris_targets, company_folder, company_name)
+    try:
+        run = graph.run(on_stage_done=_on_stage_done)
+    except StageFailed as exc:
+        print(f"\n==> 流程失败，关键路径：{exc.result.format_critical_path()}")
+        raise RuntimeError(str(exc)) from exc
 
-    wenshu_targets = [company_name]
-    wenshu_targets.extend(person_targets)
-    _run_wenshu_for_keywords(wenshu_targets, company_folder, company_name)
+    timings = run.timings()
+    lookup_spans = [run.spans[name] for name in LOOKUP_STAGES if name in run.spans]
+    if lookup_spans:
+        timings["lookups"] = max(end for _, end in lookup_spans) - min(start for start, _ in lookup_spans)
 
     print("\n==> 流程结束")
+    print("阶段耗时：")
+    for name, (start, end) in sorted(run.spans.items(), key=lambda item: item[1][0]):
+        print(f"  {name:<15} {start:>7.1f}s → {end:>7.1f}s  （{end - start:.1f}s）")
+    print(f"关键路径：{run.format_critical_path()}")
+    return {
+        "amac": run.values.get("amac"),
+        "legal_representative": run.values.get("legal_representative"),
+        "beneficial_owners": run.values.get("beneficial_owners"),
+        "timings": timings,
+        "critical_path": run.critical_path,
+    }
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="AMAC → 企查查穿透 → 失信查询 → 文书网检索 一键流程")
+    parser.add_argument("company", nargs="*", help="公司名称（缺省时交互输入）")
+    parser.add_argument("--concurrent", action="store_true", help="同一来源的人员查询在各自的线程池中并发执行（各阶段之间始终按依赖并行）")
+    parser.add_argument("--neris-workers", type=int, default=2, help="并发模式下 NERIS 的最大并发数")
+    parser.add_argument("--wenshu-workers", type=int, default=1, help="并发模式下文书网的最大并发数")
+    parser.add_argument(
+        "--wenshu-max-pages",
+        type=int,
+        default=wenshu.MAX_RESULT_PAGES,
+        help="文书网每个关键词最多解析的结果页数（0 为只截图）",
+    )
+    parser.add_argument(
+        "--qcc-fetch-mode",
+        choices=qcc_nested.FETCH_MODES,
+        default=qcc_nested.DEFAULT_FETCH_MODE,
+        help="企查查股东表读取方式：selenium 逐元素 / html 本地解析 / http 直接请求",
+    )
+    parser.add_argument(
+        "--qcc-crawl-mode",
+        choices=qcc_nested.CRAWL_MODES,
+        default=qcc_nested.DEFAULT_CRAWL_MODE,
+        help="企查查穿透方式：dfs 单浏览器逐个穿透 / bfs 按层并发穿透",
+    )
+    parser.add_argument(
+        "--qcc-crawl-workers",
+        type=int,
+        default=1,
+        help="bfs 穿透的并发会话数，大于 1 时需同时加 --qcc-allow-concurrent-sessions",
+    )
+    parser.add_argument(
+        "--qcc-allow-concurrent-sessions",
+        action="store_true",
+        help="确认各并发会话使用独立的企查查账号（同一账号并发会被强制下线），允许 --qcc-crawl-workers 大于 1",
+    )
+    parser.add_argument("--qcc-max-depth", type=int, help="bfs 穿透的最大层数（公司本身为第 0 层）")
+    parser.add_argument("--qcc-max-nodes", type=int, help="bfs 穿透最多展开的主体数")
+    parser.add_argument(
+        "--record-backend",
+        choices=RECORD_BACKENDS,
+        help="记录存储后端：json 每家公司一个 JSON（默认）/ sqlite 写入 ~/.founders/records.sqlite3",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="忽略结果缓存，所有来源都重新查询（新结果仍写回缓存）",
+    )
+    parser.add_argument(
+        "--profile-webdriver",
+        action="store_true",
+        help="统计每条 WebDriver 命令的次数与耗时，退出时打印按调用函数排序的热点报告",
+    )
+    parser.add_argument("--trace", help="追踪文件（Chrome trace JSON）路径，默认写入 ~/.founders/traces/")
+    parser.add_argument(
+        "--qcc-prune-below",
+        type=float,
+        help="剪枝阈值（%%）：穿透比例低于该值的非自然人股东不再向上穿透",
+    )
+    return parser
+
+
+def _crawl_options_from_args(args) -> dict:
     return {
-        "amac": amac_info,
-        "legal_representative": legal_rep,
-        "beneficial_owners": major_shareholders,
+        "crawl_mode": args.qcc_crawl_mode,
+        "crawl_workers": args.qcc_crawl_workers,
+        "allow_concurrent_sessions": args.qcc_allow_concurrent_sessions,
+        "max_depth": args.qcc_max_depth,
+        "max_nodes": args.qcc_max_nodes,
+        "min_effective_stake": args.qcc_prune_below,
     }
 
 
 def main():
-    if len(sys.argv) >= 2:
-        company_name = " ".join(sys.argv[1:]).strip()
+    args = _build_arg_parser().parse_args()
+    if args.company:
+        company_name = " ".join(args.company).strip()
     else:
         company_name = input("请输入公司名称：").strip()
 
     if not company_name:
         print("未输入公司名称，程序退出。")
         sys.exit(1)
+    if args.record_backend:
+        set_record_backend(create_record_backend(args.record_backend))
+    wenshu.configure_results(args.wenshu_max_pages)
+    result_cache.configure(refresh=args.refresh)
+    if args.profile_webdriver:
+        webdriver_profiler.enable()
 
     try:
-        run_full_pipeline(company_name)
+        run_full_pipeline(
+            company_name,
+            concurrent=args.concurrent,
+            neris_workers=args.neris_workers,
+            wenshu_workers=args.wenshu_workers,
+            qcc_fetch_mode=args.qcc_fetch_mode,
+            qcc_crawl_options=_crawl_options_from_args(args),
+            trace_path=args.trace,
+        )
     except Exception as exc:
         print(f"流程失败：{exc}")
         sys.exit(1)
+    finally:
+        print_wait_stats()
 
 
 if __name__ == "__main__":
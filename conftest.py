@@ -0,0 +1,13 @@
+"""
+pytest 路径设置：各脚本以「python 文件名.py」方式运行，模块之间按文件名直接 import
+（如 nested_judge 内部的 from qcc_nested import ...），这里把仓库根目录与 nested_judge 加入 sys.path，
+从仓库根目录运行 python -m pytest 时同样能导入。
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+for path in (ROOT, ROOT / "nested_judge"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
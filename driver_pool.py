@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+WebDriver 池：按站点（amac / neris / wenshu / qcc）复用已启动的 Chrome，省去每次冷启动。
+
+- 各爬虫在模块加载时通过 register_site 注册自己的 Chrome 选项与初始化逻辑（反检测脚本等），
+  create_driver(site) 按注册信息启动一个新的浏览器；
+- DriverPool.checkout(site) 借出一个预热好的浏览器，归还时关闭多余窗口、清理 Cookie 与存储；
+- 同一个浏览器使用满 max_uses 次、归还时检测到已崩溃、重置后不在空白页，借用期间抛出异常，
+  或爬虫自行捕获异常后调用了 mark_broken(driver)，都会直接退出，下次借出时重新创建；
+- 注册时声明 persistent_profile 的站点（企查查、文书网）使用 ~/.founders/profiles/<站点>/slot-N
+  下的固定 Chrome 配置目录，Cookie 与本地存储跨运行保留；同时运行的多个浏览器各占一个槽位。
+  session_is_warm(site, driver) 调用站点注册的 health_check 确认登录状态仍然有效，
+  有效时各爬虫跳过注入 Cookie / 登录流程。设置 FOUNDERS_BROWSER_PROFILES=0 可关闭。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.remote.command import Command
+
+from storage_utils import try_lock_file, unlock_file
+from tracing import span
+import webdriver_profiler
+
+PROFILE_ROOT = Path(os.environ.get("FOUNDERS_PROFILE_DIR", Path.home() / ".founders" / "profiles"))
+PROFILES_ENABLED = os.environ.get("FOUNDERS_BROWSER_PROFILES", "1") != "0"
+MAX_PROFILE_SLOTS = 8
+# 健康检查结果的有效期（秒），期间同一浏览器再次检查直接沿用
+HEALTH_CHECK_TTL = 600.0
+
+
+class _SiteConfig:
+    def __init__(
+        self,
+        options_factory: Callable[[], Options],
+        setup: Optional[Callable] = None,
+        keep_cookies: bool = False,
+        persistent_profile: bool = False,
+        health_check: Optional[Callable] = None,
+    ):
+        self.options_factory = options_factory
+        self.setup = setup
+        self.keep_cookies = keep_cookies
+        self.persistent_profile = persistent_profile
+        self.health_check = health_check
+
+
+_SITES: Dict[str, _SiteConfig] = {}
+
+
+def register_site(
+    site: str,
+    options_factory: Callable[[], Options],
+    setup: Optional[Callable] = None,
+    keep_cookies: bool = False,
+    persistent_profile: bool = False,
+    health_check: Optional[Callable] = None,
+) -> None:
+    """
+    注册站点的 Chrome 选项工厂；setup(driver) 在浏览器启动后执行一次（如注入反检测脚本）。
+    persistent_profile 为真时使用持久的配置目录；health_check(driver) -> bool 判断登录状态是否仍有效。
+    """
+    _SITES[site] = _SiteConfig(options_factory, setup, keep_cookies, persistent_profile, health_check)
+
+
+class _ProfileSlot:
+    """一个站点配置目录槽位；持有槽位锁期间其他进程/线程不会再用同一目录启动 Chrome。"""
+
+    def __init__(self, path: Path, handle: IO[bytes]):
+        self.path = path
+        self._handle: Optional[IO[bytes]] = handle
+
+    @classmethod
+    def acquire(cls, site: str) -> Optional["_ProfileSlot"]:
+        for index in range(MAX_PROFILE_SLOTS):
+            path = PROFILE_ROOT / site / f"slot-{index}"
+            handle = try_lock_file(path.with_name(path.name + ".lock"))
+            if handle is not None:
+                path.mkdir(parents=True, exist_ok=True)
+                return cls(path, handle)
+        print(f"[DriverPool] {site} 的 {MAX_PROFILE_SLOTS} 个配置目录都在使用中，本次使用临时配置")
+        return None
+
+    def release(self) -> None:
+        if self._handle is not None:
+            unlock_file(self._handle)
+            self._handle = None
+
+
+def _bind_profile_slot(driver, slot: _ProfileSlot) -> None:
+    """浏览器退出后释放槽位（不论由谁调用 quit）。"""
+    original_quit = driver.quit
+
+    def _quit():
+        try:
+            original_quit()
+        finally:
+            slot.release()
+
+    driver.quit = _quit
+    driver.founders_profile_dir = str(slot.path)
+
+
+def create_driver(site: str):
+    """按站点配置启动一个新的 Chrome；持久配置的站点会占用一个配置目录槽位。"""
+    config = _SITES.get(site)
+    if config is None:
+        raise KeyError(f"未注册的站点：{site}")
+    options = config.options_factory()
+    slot = _ProfileSlot.acquire(site) if config.persistent_profile and PROFILES_ENABLED else None
+    if slot is not None:
+        options.add_argument(f"--user-data-dir={slot.path}")
+    try:
+        driver = webdriver.Chrome(options=options)
+    except BaseException:
+        if slot is not None:
+            slot.release()
+        raise
+    if slot is not None:
+        _bind_profile_slot(driver, slot)
+    _trace_navigation(driver, site)
+    webdriver_profiler.instrument(driver)
+    try:
+        driver.maximize_window()
+    except Exception:
+        pass
+    if config.setup:
+        config.setup(driver)
+    return driver
+
+
+def _trace_navigation(driver, site: str) -> None:
+    """driver.get 经由 driver.execute(Command.GET)，在此记录每次页面导航的 navigation 区间。"""
+    execute = driver.execute
+
+    def _execute(driver_command, params=None):
+        if driver_command != Command.GET:
+            return execute(driver_command, params)
+        with span(site, "navigation", url=(params or {}).get("url")):
+            return execute(driver_command, params)
+
+    driver.execute = _execute
+
+
+def session_is_warm(site: str, driver) -> bool:
+    """
+    用站点注册的 health_check 确认 driver 上的登录状态仍然有效（通常会打开一次站点首页）。
+    未注册检查或检查出错都视为无效；HEALTH_CHECK_TTL 内检查通过过的浏览器不再重复检查。
+    """
+    config = _SITES.get(site)
+    if driver is None or config is None or config.health_check is None:
+        return False
+    checked_at = getattr(driver, "founders_healthy_at", None)
+    if checked_at is not None and time.monotonic() - checked_at < HEALTH_CHECK_TTL:
+        return True
+    try:
+        healthy = bool(config.health_check(driver))
+    except Exception as exc:
+        print(f"[DriverPool] {site} 登录状态检查出错：{exc}")
+        healthy = False
+    driver.founders_healthy_at = time.monotonic() if healthy else None
+    return healthy
+
+
+def mark_session_stale(driver) -> None:
+    """登录失效或重新登录后调用，下次 session_is_warm 重新检查。"""
+    if driver is not None:
+        driver.founders_healthy_at = None
+
+
+def mark_broken(driver) -> None:
+    """
+    爬虫捕获异常后不再向上抛出时调用：浏览器可能停在异常状态（弹窗、半加载页面、失效会话），
+    归还浏览器池时直接回收，不再复用。driver 为空时什么也不做。
+    """
+    if driver is not None:
+        try:
+            driver.founders_broken = True
+        except Exception:
+            pass
+
+
+def _is_alive(driver) -> bool:
+    try:
+        return bool(driver.window_handles)
+    except Exception:
+        return False
+
+
+def _quit_quietly(driver) -> None:
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def _is_healthy(driver) -> bool:
+    """重置后的轻量检查：停在空白页且还能执行脚本。"""
+    try:
+        return driver.execute_script("return document.readyState") == "complete" and driver.current_url == "about:blank"
+    except Exception:
+        return False
+
+
+def _reset_driver(driver, keep_cookies: bool) -> None:
+    """关闭多余窗口、回到主文档，清理 Cookie/存储后停在空白页，恢复窗口大小。"""
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+    driver.switch_to.default_content()
+    if not keep_cookies:
+        try:
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        except Exception:
+            driver.delete_all_cookies()
+        try:
+            driver.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}")
+        except Exception:
+            pass
+    driver.get("about:blank")
+    try:
+        driver.maximize_window()
+    except Exception:
+        pass
+
+
+class DriverPool:
+    """
+    线程安全的浏览器池。每个站点各自维护空闲列表，借出时优先复用空闲浏览器。
+
+    用法：
+        pool = DriverPool()
+        with pool.checkout("amac") as driver:
+            amac.search_and_screenshot(name, driver=driver)
+        pool.close()
+    """
+
+    def __init__(self, max_uses: int = 20, max_idle_per_site: int = 4):
+        self.max_uses = max_uses
+        self.max_idle_per_site = max_idle_per_site
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[Tuple[object, int]]] = {}
+        self._uses: Dict[int, int] = {}
+        self._closed = False
+
+    def acquire(self, site: str):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("DriverPool 已关闭")
+            idle = self._idle.setdefault(site, [])
+        while True:
+            with self._lock:
+                if not idle:
+                    break
+                driver, uses = idle.pop()
+            if _is_alive(driver):
+                with self._lock:
+                    self._uses[id(driver)] = uses
+                return driver
+            print(f"[DriverPool] {site} 空闲浏览器已失效，丢弃")
+            _quit_quietly(driver)
+        print(f"[DriverPool] 为 {site} 启动新的浏览器...")
+        driver = create_driver(site)
+        with self._lock:
+            self._uses[id(driver)] = 0
+        return driver
+
+    def release(self, site: str, driver, broken: bool = False) -> None:
+        with self._lock:
+            uses = self._uses.pop(id(driver), 0) + 1
+            closed = self._closed
+        broken = broken or getattr(driver, "founders_broken", False)
+        if broken or closed or uses >= self.max_uses or not _is_alive(driver):
+            _quit_quietly(driver)
+            return
+        config = _SITES.get(site)
+        try:
+            # 持久配置目录中的 Cookie 就是登录状态，归还时不能清掉
+            keep = bool(config and (config.keep_cookies or config.persistent_profile))
+            _reset_driver(driver, keep_cookies=keep)
+        except Exception as exc:
+            print(f"[DriverPool] 重置 {site} 浏览器失败，直接回收：{exc}")
+            _quit_quietly(driver)
+            return
+        if not _is_healthy(driver):
+            print(f"[DriverPool] {site} 浏览器重置后状态异常，直接回收")
+            _quit_quietly(driver)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(site, [])
+            if not self._closed and len(idle) < self.max_idle_per_site:
+                idle.append((driver, uses))
+                return
+        _quit_quietly(driver)
+
+    @contextmanager
+    def checkout(self, site: str) -> Iterator[object]:
+        driver = self.acquire(site)
+        broken = False
+        try:
+            yield driver
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            self.release(site, driver, broken=broken)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            drivers = [driver for idle in self._idle.values() for driver, _ in idle]
+            self._idle.clear()
+        for driver in drivers:
+            _quit_quietly(driver)
+
+    def __enter__(self) -> "DriverPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def checkout_from(pool: Optional[DriverPool], site: str):
+    """pool 为空时返回 nullcontext(None)，调用方据此回退到各爬虫自行创建浏览器。"""
+    if pool is None:
+        return nullcontext(None)
+    return pool.checkout(site)
@@ -10,7 +10,6 @@ CSRC 失信查询爬虫（https://neris.csrc.gov.cn/shixinchaxun/）
 - 完成后解析查询结果，并打印输出
 """
 
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
@@ -23,7 +22,10 @@ import os
 import json
 from urllib.parse import quote
 
-from storage_utils import load_records, upsert_record, write_records
+from driver_pool import create_driver, mark_broken, register_site
+from screenshot_utils import save_screenshot_artifact, screenshot_extension
+from storage_utils import save_record
+from wait_utils import pause, polite_pause, prompt_user, wait_for_document_ready, wait_until
 
 
 def _build_chrome_options() -> Options:
@@ -45,6 +47,9 @@ def _build_chrome_options() -> Options:
     return chrome_options
 
 
+register_site("neris", _build_chrome_options)
+
+
 def _clear_proxy_env_vars() -> None:
     for var in ["http_proxy", "https_proxy", "all_proxy", "HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY"]:
         if var in os.environ:
@@ -71,7 +76,7 @@ def _maybe_wait_for_human_verification(driver) -> None:
     if need_wait:
         print("\n检测到人机验证/验证码页面，请在浏览器中手动完成验证...")
         try:
-            input("验证完成后按回车继续：")
+            prompt_user("验证完成后按回车继续：", site="neris")
         except KeyboardInterrupt:
             pass
 
@@ -170,7 +175,7 @@ def _extract_results(driver):
     return results
 
 
-def search_and_get_results(legal_name: str, company_name: str = None):
+def search_and_get_results(legal_name: str, company_name: str = None, driver=None):
     """
     在 CSRC 失信查询网站中输入法定代表人姓名并回车，等待新页面加载；
     若出现人机验证，暂停等待用户完成；之后解析并返回查询结果。
@@ -178,15 +183,16 @@ def search_and_get_results(legal_name: str, company_name: str = None):
     Args:
         legal_name: 法定代表人姓名（用于查询）
         company_name: 公司名称（可选，如果提供则用于文件夹和JSON文件名）
+        driver: 可选，外部（如 DriverPool）提供的浏览器；传入时不在此处创建
     """
     _clear_proxy_env_vars()
-    chrome_options = _build_chrome_options()
-    driver = None
 
     try:
-        print("正在启动浏览器并访问: https://neris.csrc.gov.cn/shixinchaxun/")
-        driver = webdriver.Chrome(options=chrome_options)
-        driver.maximize_window()
+        if driver is None:
+            print("正在启动浏览器...")
+            driver = create_driver("neris")
+        print("正在访问: https://neris.csrc.gov.cn/shixinchaxun/")
+        polite_pause("neris")
         driver.get("https://neris.csrc.gov.cn/shixinchaxun/")
 
         wait = WebDriverWait(driver, 12)
@@ -213,11 +219,18 @@ def search_and_get_results(legal_name: str, company_name: str = None):
         print(f"正在输入姓名并触发搜索: {legal_name}")
         name_input.clear()
         name_input.send_keys(legal_name)
-        time.sleep(0.3)
+        pause(0.3, site="neris", kind="typing")
         current_handles = driver.window_handles[:]
         name_input.send_keys(Keys.ENTER)
 
-        time.sleep(2)
+        # 等到新窗口弹出或当前页开始跳转（最多 2 秒），再检查人机验证
+        wait_until(
+            driver,
+            lambda d: len(d.window_handles) > len(current_handles) or d.execute_script("return document.readyState") != "complete",
+            timeout=2,
+            site="neris",
+            kind="search_submit",
+        )
 
         # 如遇到人机验证，等待用户处理
         _maybe_wait_for_human_verification(driver)
@@ -234,7 +247,7 @@ def search_and_get_results(legal_name: str, company_name: str = None):
 
 
         # 再等待结果元素出现，获取查询结果（简化逻辑）
-        time.sleep(1.0)
+        wait_for_document_ready(driver, timeout=10, site="neris")
         try:
             no_data_el = WebDriverWait(driver, 3).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, "div.noData"))
@@ -262,8 +275,8 @@ def search_and_get_results(legal_name: str, company_name: str = None):
         if not os.path.exists(save_dir):
             os.makedirs(save_dir)
         ts = time.strftime("%Y%m%d_%H%M%S", time.localtime())
-        screenshot_path = os.path.join(save_dir, f"CSRC_失信查询_{legal_name}_{ts}.png")
-        driver.save_screenshot(screenshot_path)
+        screenshot_path = os.path.join(save_dir, f"CSRC_失信查询_{legal_name}_{ts}{screenshot_extension()}")
+        screenshot_path, screenshot_sha256 = save_screenshot_artifact(driver, screenshot_path)
         print(f"截图已保存：{screenshot_path}")
         print("=" * 60)
 
@@ -276,12 +289,11 @@ def search_and_get_results(legal_name: str, company_name: str = None):
                 "has_issue": not has_no_data,
                 "ret_url": driver.current_url,
                 "screenshot": screenshot_path,
+                "screenshot_sha256": screenshot_sha256,
                 "queried_at": ts
             }
             json_path = os.path.join(save_dir, f"{json_filename}.json")
-            existing_records = load_records(json_path)
-            updated_records = upsert_record(existing_records, record)
-            write_records(json_path, updated_records)
+            save_record(json_path, record)
             print(f"查询结果已写入/更新：{json_path}")
         except Exception as write_err:
             print(f"写入JSON时出错：{write_err}")
@@ -290,6 +302,7 @@ def search_and_get_results(legal_name: str, company_name: str = None):
             "url": driver.current_url,
             "has_issue": not has_no_data,
             "screenshot": screenshot_path,
+            "screenshot_sha256": screenshot_sha256,
             "name": legal_name,
             "queried_at": ts
         }
@@ -306,6 +319,7 @@ def search_and_get_results(legal_name: str, company_name: str = None):
         print(f"发生错误: {e}")
         import traceback
         traceback.print_exc()
+        mark_broken(driver)
         return None
     finally:
         if driver:
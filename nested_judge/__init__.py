@@ -2,6 +2,6 @@
 nested_judge 包初始化：暴露子模块，方便外部脚本引用。
 """
 
-from . import nested_judge, qcc_nested, qcc_sim, test_nested
+from . import nested_judge, qcc_nested, qcc_sim, shareholder_cache, test_nested
 
-__all__ = ["nested_judge", "qcc_nested", "qcc_sim", "test_nested"]
+__all__ = ["nested_judge", "qcc_nested", "qcc_sim", "shareholder_cache", "test_nested"]
@@ -9,9 +9,9 @@ from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
-from qcc_nested import search_and_screenshot, DEFAULT_COOKIES
-from storage_utils import load_records, upsert_record, write_records
-from test_nested import ShareholderCalculator
+from qcc_nested import search_and_screenshot, DEFAULT_COOKIES, DEFAULT_FETCH_MODE
+from storage_utils import save_record
+from test_nested import METHOD_RECURSIVE, ShareholderCalculator
 
 
 def _company_json_path(company_name: str) -> Path:
@@ -24,6 +24,7 @@ def _persist_nested_judge_record(
     result_url: str | None,
     ultimate_shareholders: List[Dict[str, float]],
     major_shareholders: List[Dict[str, float]],
+    pruned_entities: Optional[List[Dict]] = None,
 ) -> Path:
     json_path = _company_json_path(company_name)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -34,45 +35,88 @@ def _persist_nested_judge_record(
         "data": {
             "ultimate_shareholders": ultimate_shareholders,
             "major_shareholders": major_shareholders,
+            "pruned_entities": pruned_entities or [],
         },
         "queried_at": timestamp,
     }
-    existing_records = load_records(json_path)
-    updated_records = upsert_record(existing_records, record)
-    write_records(json_path, updated_records)
+    save_record(json_path, record)
     return json_path
 
 
-def build_calculator_from_payload(payload):
-    calculator = ShareholderCalculator()
-    direct_shareholders = payload.get("direct_shareholders") or {}
-    entity_structure = payload.get("entity_structure") or {}
-    
-    for name, percentage in direct_shareholders.items():
+def _normalize_holders(holders) -> Dict[str, float]:
+    normalized = {}
+    for sub_name, sub_percentage in holders.items():
         try:
-            calculator.add_direct_shareholder(name, float(percentage))
+            normalized[sub_name] = float(sub_percentage)
         except (TypeError, ValueError):
             continue
+    return normalized
+
+
+def build_calculator_from_payload(payload, method: str = METHOD_RECURSIVE):
+    calculator = ShareholderCalculator(method=method)
+    direct_shareholders = payload.get("direct_shareholders") or {}
+    entity_structure = payload.get("entity_structure") or {}
+    
+    for name, percentage in _normalize_holders(direct_shareholders).items():
+        calculator.add_direct_shareholder(name, percentage)
     
     for entity, holders in entity_structure.items():
         if not isinstance(holders, dict):
             continue
-        normalized = {}
-        for sub_name, sub_percentage in holders.items():
-            try:
-                normalized[sub_name] = float(sub_percentage)
-            except (TypeError, ValueError):
-                continue
+        normalized = _normalize_holders(holders)
         if normalized:
             calculator.set_entity_structure(entity, normalized)
     
     return calculator
 
 
-def analyze_company(name: str):
+def _live_calculator(root: str, method: str = METHOD_RECURSIVE):
+    """
+    穿透过程中实时更新的计算器及其 on_node 回调：每展开一个主体只增量重算受影响的部分，
+    并打印当前受益人快照，长时间穿透时可以提前看到结果走向。
+    """
+    calculator = ShareholderCalculator(method=method)
+    
+    def _on_node(entity: str, holders: Dict[str, float]) -> None:
+        normalized = _normalize_holders(holders)
+        if entity == root:
+            for holder, percentage in normalized.items():
+                calculator.add_direct_shareholder(holder, percentage)
+        elif normalized:
+            calculator.set_entity_structure(entity, normalized)
+        top = sorted(calculator.snapshot().items(), key=lambda x: x[1], reverse=True)[:3]
+        if top:
+            print("  当前穿透结果：" + "、".join(f"{person} {percentage:.2f}%" for person, percentage in top))
+    
+    return calculator, _on_node
+
+
+def analyze_company(
+    name: str,
+    driver=None,
+    fetch_mode: str = DEFAULT_FETCH_MODE,
+    calculator_method: str = METHOD_RECURSIVE,
+    **crawl_options,
+):
+    """
+    calculator_method 选择受益人计算方法（recursive / matrix，见 test_nested.METHODS）；
+    crawl_options 原样传给 search_and_screenshot
+    （crawl_mode、crawl_workers、allow_concurrent_sessions、max_depth、max_nodes、driver_pool、min_effective_stake）。
+    穿透过程中每展开一个主体都会增量更新受益人计算并打印当前快照。
+    """
     print(f"开始处理公司：{name}")
     json_path: Optional[Path] = None
-    crawl_result = search_and_screenshot(name, cookies=DEFAULT_COOKIES, save_to_desktop=True)
+    _, on_node = _live_calculator(name.strip(), method=calculator_method)
+    crawl_result = search_and_screenshot(
+        name,
+        cookies=DEFAULT_COOKIES,
+        save_to_desktop=True,
+        driver=driver,
+        fetch_mode=fetch_mode,
+        on_node=on_node,
+        **crawl_options,
+    )
     if not crawl_result:
         raise RuntimeError("爬虫失败，无法获取股东信息。")
     
@@ -84,7 +128,7 @@ def analyze_company(name: str):
         legal_rep = crawl_result.get("legal_representative")
         if legal_rep:
             crawl_result["top_shareholder"] = legal_rep
-    calculator = build_calculator_from_payload(payload)
+    calculator = build_calculator_from_payload(payload, method=calculator_method)
     
     print("\n=== 股东结构 ===")
     calculator.print_detailed_analysis()
@@ -107,12 +151,19 @@ def analyze_company(name: str):
     else:
         print("  无")
     
+    pruned_entities = crawl_result.get("pruned_entities") or []
+    if pruned_entities:
+        print("\n=== 剪枝未穿透的主体 ===")
+        for entry in pruned_entities:
+            print(f"  - {entry['name']}: {entry['effective_percentage']:.2f}%（上级：{'、'.join(entry['parents'])}）")
+    
     try:
         json_path = _persist_nested_judge_record(
             name,
             crawl_result.get("result_url"),
             ultimate_list,
             major_list,
+            crawl_result.get("pruned_entities"),
         )
         print(f"\n分析结果已写入：{json_path}")
     except Exception as exc:
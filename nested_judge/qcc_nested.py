@@ -9,7 +9,6 @@ https://www.qcc.com/web/search?key=%E5%AE%87%E6%A0%91%E7%A7%91%E6%8A%80%E8%82%A1
 
 """
 
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
@@ -21,16 +20,34 @@ import os
 import json
 import re
 import random
-from urllib.parse import quote
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import quote, urljoin
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import requests
+from bs4 import BeautifulSoup
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))
 
-from storage_utils import load_records, upsert_record, write_records
+from driver_pool import create_driver, mark_broken, register_site, session_is_warm
+from shareholder_cache import ShareholderCache
+from screenshot_utils import save_screenshot_artifact, screenshot_extension
+from storage_utils import save_record
+from wait_utils import (
+    pause,
+    polite_pause,
+    prompt_user,
+    wait_for_document_ready,
+    wait_for_network_idle,
+    wait_for_page,
+)
 
 # 默认Cookie（已写死）
 # 公司的cookie。。。。为什么不开一个团体的账号呢。这会导致这个账号很容易在爬虫的时候出问题
@@ -49,6 +66,12 @@ DEFAULT_COOKIES = {
 #     'qcc_did': '11b92845-5179-4bed-8afd-82b0ace93c60'
 # }
 
+# 搜索页/公司页的就绪标记：出现任一即视为页面已渲染
+_SEARCH_READY_SELECTORS = ['a[href*="/firm/"]', 'div.qcc-login-qrcode']
+_COMPANY_READY_SELECTORS = ['section#partner', '#partner', 'table.ntable']
+
+QCC_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
 
 def _looks_like_natural_person(name: str) -> bool:
     """Heuristic similar to ShareholderCalculator for classifying自然人."""
@@ -81,9 +104,8 @@ def _parse_percentage(raw_text: str):
 
 
 def _human_pause(min_delay: float = 0.6, max_delay: float = 1.4):
-    """Sleep a random amount of time to mimic human browsing."""
-    delay = random.uniform(min_delay, max_delay)
-    time.sleep(delay)
+    """Sleep a random amount of time to mimic human browsing (recorded in wait stats)."""
+    pause(random.uniform(min_delay, max_delay), site="qcc", kind="human")
 
 
 def _extract_first_text(element, selectors: List[str]) -> str:
@@ -116,7 +138,7 @@ def _expand_shareholder_section(driver):
             try:
                 if btn.is_displayed() and btn.is_enabled():
                     driver.execute_script("arguments[0].click();", btn)
-                    _human_pause(0.5, 1.2)
+                    wait_for_network_idle(driver, idle_time=0.4, timeout=3, site="qcc")
             except Exception:
                 continue
     for keyword in keyword_variants:
@@ -128,25 +150,104 @@ def _expand_shareholder_section(driver):
                     )
                 )
                 driver.execute_script("arguments[0].click();", button)
-                _human_pause(0.6, 1.3)
+                wait_for_network_idle(driver, idle_time=0.4, timeout=3, site="qcc")
             except Exception:
                 break
 
 
-def _scrape_shareholders(driver) -> List[Dict[str, Any]]:
-    """Collect all shareholder rows (name + percentage)."""
-    _expand_shareholder_section(driver)
+# 股东信息区域（根据HTML结构：section#partner.company-partner）
+_PARTNER_SECTION_SELECTORS = [
+    'section#partner.company-partner',
+    'section.company-partner',
+    'section#partner',
+    '[id="partner"]',
+]
+
+# 在股东区域内查找表格（根据HTML结构：.app-tree-table table.ntable）
+_SHAREHOLDER_ROW_SELECTORS = [
+    '.app-tree-table table.ntable tr',  # 优先使用精确路径
+    'section#partner table.ntable tr',
+    'section.company-partner table.ntable tr',
+    'table.ntable tr',
+    '.partner-table tr',
+    '.partner-list tr',
+]
+
+# 股东名称选择器（根据HTML结构：td .td-coy.partner-app-tdcoy .name a）
+_SHAREHOLDER_NAME_SELECTORS = [
+    'td .td-coy.partner-app-tdcoy .name a',  # 最精确的路径
+    'td .td-coy .name a',
+    'td .partner-app-tdcoy .name a',
+    'td.left .name a',
+    'td .name a',
+    'td.left span.name a',
+    'td.left span a',
+    'td:nth-of-type(2) .name a',
+    'td:nth-of-type(2) a',
+]
+
+# 持股比例选择器
+_SHAREHOLDER_RATIO_SELECTORS = [
+    'td.right span.has-stock span',
+    'td.right .has-stock',
+    'td:nth-of-type(3) span',
+    'td:nth-of-type(3)',
+    '.has-stock span',
+    '.partner-percent',
+    '.percent',
+]
+
+# 过滤掉明显不是股东名称的内容（如企业动态、变更记录等）
+_NON_SHAREHOLDER_KEYWORDS = ['变更', '变更前', '变更后', '企业名称', '日期', '2022-', '2023-', '2024-', '2025-']
+
+FETCH_MODE_SELENIUM = "selenium"  # 逐个元素通过 WebDriver 读取（最慢，兼容性最好）
+FETCH_MODE_HTML = "html"          # 浏览器打开页面后一次性取 page_source，本地解析
+FETCH_MODE_HTTP = "http"          # requests 携带 Cookie 直接请求页面，本地解析，失败再回退浏览器
+FETCH_MODES = (FETCH_MODE_SELENIUM, FETCH_MODE_HTML, FETCH_MODE_HTTP)
+DEFAULT_FETCH_MODE = FETCH_MODE_HTML
+
+CRAWL_MODE_DFS = "dfs"  # 单浏览器深度优先逐个穿透
+CRAWL_MODE_BFS = "bfs"  # 按层广度优先，同一层的非自然人股东并发抓取
+CRAWL_MODES = (CRAWL_MODE_DFS, CRAWL_MODE_BFS)
+DEFAULT_CRAWL_MODE = CRAWL_MODE_DFS
+
+# 与 ShareholderCalculator.get_major_shareholders 的默认阈值一致
+MAJOR_SHAREHOLDER_THRESHOLD = 30.0
+
+
+def _add_shareholder_entry(seen: Dict[str, Dict[str, Any]], name: str, ratio) -> None:
+    """Validate one parsed row and keep the highest ratio per shareholder name."""
+    if not name or any(keyword in name for keyword in _NON_SHAREHOLDER_KEYWORDS):
+        return
+    # 验证持股比例是否合理（0-100之间）
+    if ratio is None or ratio < 0 or ratio > 100:
+        return
+    entry = {
+        "name": name,
+        "percentage": ratio,
+        "type": "natural" if _looks_like_natural_person(name) else "entity"
+    }
+    existing = seen.get(name)
+    if existing is None or ratio > existing["percentage"]:
+        seen[name] = entry
+        print(f"  提取股东: {name} ({ratio}%)")
+
+
+def _sorted_shareholders(seen: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    shareholders = list(seen.values())
+    shareholders.sort(key=lambda item: item["percentage"], reverse=True)
+    print(f"共提取 {len(shareholders)} 位股东")
+    return shareholders
+
+
+def _scrape_shareholders(driver, expand: bool = True) -> List[Dict[str, Any]]:
+    """Collect all shareholder rows (name + percentage) through WebDriver element lookups."""
+    if expand:
+        _expand_shareholder_section(driver)
     
-    # 首先定位到股东信息区域（根据HTML结构：section#partner.company-partner）
+    # 首先定位到股东信息区域
     partner_section = None
-    section_selectors = [
-        'section#partner.company-partner',
-        'section.company-partner',
-        'section#partner',
-        '[id="partner"]',
-    ]
-    
-    for selector in section_selectors:
+    for selector in _PARTNER_SECTION_SELECTORS:
         try:
             sections = driver.find_elements(By.CSS_SELECTOR, selector)
             for section in sections:
@@ -162,43 +263,9 @@ def _scrape_shareholders(driver) -> List[Dict[str, Any]]:
     # 如果没有找到专门的股东区域，尝试在整个页面查找
     search_root = partner_section if partner_section else driver
     
-    # 在股东区域内查找表格（根据HTML结构：.app-tree-table table.ntable）
-    row_selectors = [
-        '.app-tree-table table.ntable tr',  # 优先使用精确路径
-        'section#partner table.ntable tr',
-        'section.company-partner table.ntable tr',
-        'table.ntable tr',
-        '.partner-table tr',
-        '.partner-list tr',
-    ]
-    
-    # 股东名称选择器（根据HTML结构：td .td-coy.partner-app-tdcoy .name a）
-    name_selectors = [
-        'td .td-coy.partner-app-tdcoy .name a',  # 最精确的路径
-        'td .td-coy .name a',
-        'td .partner-app-tdcoy .name a',
-        'td.left .name a',
-        'td .name a',
-        'td.left span.name a',
-        'td.left span a',
-        'td:nth-of-type(2) .name a',
-        'td:nth-of-type(2) a',
-    ]
-    
-    # 持股比例选择器
-    ratio_selectors = [
-        'td.right span.has-stock span',
-        'td.right .has-stock',
-        'td:nth-of-type(3) span',
-        'td:nth-of-type(3)',
-        '.has-stock span',
-        '.partner-percent',
-        '.percent',
-    ]
-    
     seen: Dict[str, Dict[str, Any]] = {}
     
-    for selector in row_selectors:
+    for selector in _SHAREHOLDER_ROW_SELECTORS:
         try:
             rows = search_root.find_elements(By.CSS_SELECTOR, selector)
         except Exception:
@@ -222,7 +289,7 @@ def _scrape_shareholders(driver) -> List[Dict[str, Any]]:
                 continue
             
             # 提取股东名称（优先从 .name a 中提取）
-            name = _extract_first_text(row, name_selectors)
+            name = _extract_first_text(row, _SHAREHOLDER_NAME_SELECTORS)
             if not name:
                 # 备用方案：从第一个包含链接的单元格提取
                 try:
@@ -236,39 +303,164 @@ def _scrape_shareholders(driver) -> List[Dict[str, Any]]:
                     except Exception:
                         name = ''
             
-            # 过滤掉明显不是股东名称的内容（如企业动态、变更记录等）
-            if not name or any(keyword in name for keyword in ['变更', '变更前', '变更后', '企业名称', '日期', '2022-', '2023-', '2024-', '2025-']):
-                continue
-            
             # 提取持股比例
-            ratio_text = _extract_first_text(row, ratio_selectors)
+            ratio_text = _extract_first_text(row, _SHAREHOLDER_RATIO_SELECTORS)
             ratio = _parse_percentage(ratio_text)
             if ratio is None:
                 # 尝试从整行文本中提取
                 ratio = _parse_percentage(row.text)
             
-            # 验证持股比例是否合理（0-100之间）
-            if ratio is None or ratio < 0 or ratio > 100:
-                continue
-            
-            entry = {
-                "name": name,
-                "percentage": ratio,
-                "type": "natural" if _looks_like_natural_person(name) else "entity"
-            }
-            existing = seen.get(name)
-            if existing is None or ratio > existing["percentage"]:
-                seen[name] = entry
-                print(f"  提取股东: {name} ({ratio}%)")
+            _add_shareholder_entry(seen, name, ratio)
         
         # 如果找到了股东数据，就不需要尝试其他选择器了
         if seen:
             break
     
-    shareholders = list(seen.values())
-    shareholders.sort(key=lambda item: item["percentage"], reverse=True)
-    print(f"共提取 {len(shareholders)} 位股东")
-    return shareholders
+    return _sorted_shareholders(seen)
+
+
+def _soup_first_text(element, selectors: List[str]) -> str:
+    """BeautifulSoup counterpart of _extract_first_text."""
+    for selector in selectors:
+        try:
+            matches = element.select(selector)
+        except Exception:
+            continue
+        for match in matches:
+            text = match.get_text(strip=True)
+            if text:
+                return text
+    return ''
+
+
+def _is_hidden(tag) -> bool:
+    """Best-effort stand-in for is_displayed(): inline display:none on the tag or an ancestor."""
+    node = tag
+    while node is not None and getattr(node, "attrs", None) is not None:
+        style = (node.attrs.get("style") or "").replace(" ", "").lower()
+        if "display:none" in style:
+            return True
+        node = node.parent
+    return False
+
+
+def _parse_shareholders_html(html: str) -> List[Dict[str, Any]]:
+    """Parse shareholder rows from a page's HTML locally, with the same selectors as _scrape_shareholders."""
+    if not html:
+        return []
+    soup = BeautifulSoup(html, "lxml")
+    
+    search_root = soup
+    for selector in _PARTNER_SECTION_SELECTORS:
+        sections = [section for section in soup.select(selector) if not _is_hidden(section)]
+        if sections:
+            search_root = sections[0]
+            print(f"找到股东信息区域: {selector}")
+            break
+    
+    seen: Dict[str, Dict[str, Any]] = {}
+    for selector in _SHAREHOLDER_ROW_SELECTORS:
+        rows = search_root.select(selector)
+        if not rows:
+            continue
+        print(f"使用选择器 {selector} 找到 {len(rows)} 行（本地解析）")
+        for row in rows:
+            if _is_hidden(row):
+                continue
+            cells = row.select('td')
+            if len(cells) < 2:
+                continue
+            name = _soup_first_text(row, _SHAREHOLDER_NAME_SELECTORS)
+            if not name:
+                name_cell = cells[1]
+                name_link = name_cell.select_one('a')
+                name = (name_link or name_cell).get_text(strip=True)
+            ratio = _parse_percentage(_soup_first_text(row, _SHAREHOLDER_RATIO_SELECTORS))
+            if ratio is None:
+                ratio = _parse_percentage(row.get_text(" ", strip=True))
+            _add_shareholder_entry(seen, name, ratio)
+        if seen:
+            break
+    
+    return _sorted_shareholders(seen)
+
+
+def _build_http_session(cookies=None) -> requests.Session:
+    """requests.Session sharing the browser's UA and the QCC login cookies."""
+    session = requests.Session()
+    session.trust_env = False  # 与浏览器一致，不走系统代理
+    session.headers.update({
+        "User-Agent": QCC_USER_AGENT,
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "zh-CN,zh;q=0.9",
+        "Referer": "https://www.qcc.com/",
+    })
+    for name, value in (cookies or {}).items():
+        session.cookies.set(name, value, domain=".qcc.com", path="/")
+    return session
+
+
+def _fetch_company_html_http(session: requests.Session, company_name: str):
+    """
+    Search and open the company page over plain HTTP.
+
+    Returns (search_url, page_url, html) or None when QCC answers with a login/verification
+    page or no result link, in which case the caller falls back to the browser.
+    """
+    search_url = f"https://www.qcc.com/web/search?key={quote(company_name)}"
+    response = session.get(search_url, timeout=15)
+    if response.status_code != 200:
+        print(f"HTTP 搜索失败（{response.status_code}）：{company_name}")
+        return None
+    soup = BeautifulSoup(response.text, "lxml")
+    page_url = None
+    for link in soup.select('a[href*="/firm/"], a[href*="/company/"]'):
+        if link.get_text(strip=True):
+            page_url = urljoin(search_url, link.get("href"))
+            break
+    if not page_url:
+        print(f"HTTP 搜索页未找到结果链接（可能需要登录或验证）：{company_name}")
+        return None
+    polite_pause("qcc")
+    response = session.get(page_url, timeout=15)
+    if response.status_code != 200:
+        print(f"HTTP 打开公司页失败（{response.status_code}）：{page_url}")
+        return None
+    return search_url, page_url, response.text
+
+
+def _fetch_node(driver, company_name: str, fetch_mode: str = DEFAULT_FETCH_MODE, session=None):
+    """
+    Fetch one company's direct shareholders with the given fetch mode.
+
+    Returns (search_url, page_url, shareholders); navigation errors propagate to the caller.
+    The local-parse modes fall back to WebDriver lookups when they find no rows.
+    """
+    if fetch_mode == FETCH_MODE_HTTP and session is not None:
+        try:
+            fetched = _fetch_company_html_http(session, company_name)
+        except requests.RequestException as http_err:
+            print(f"HTTP 抓取失败: {http_err}")
+            fetched = None
+        if fetched:
+            search_url, page_url, html = fetched
+            shareholders = _parse_shareholders_html(html)
+            if shareholders:
+                return search_url, page_url, shareholders
+        print("HTTP 路径未解析到股东，回退到浏览器")
+    
+    if driver is None:
+        raise RuntimeError("当前会话没有可回退的浏览器")
+    search_url, page_url = _navigate_to_company_page(driver, company_name)
+    if fetch_mode == FETCH_MODE_SELENIUM:
+        return search_url, page_url, _scrape_shareholders(driver)
+    
+    _expand_shareholder_section(driver)
+    shareholders = _parse_shareholders_html(driver.page_source)
+    if not shareholders:
+        print("本地解析未找到股东，回退到逐元素读取")
+        shareholders = _scrape_shareholders(driver, expand=False)
+    return search_url, page_url, shareholders
 
 
 def _find_search_result_link(driver):
@@ -309,7 +501,7 @@ def _navigate_to_company_page(driver, search_query: str):
     search_url = f"https://www.qcc.com/web/search?key={quote(search_query)}"
     print(f"正在访问搜索页面: {search_url}")
     driver.get(search_url)
-    _human_pause(2.0, 3.5)
+    wait_for_page(driver, "qcc", selectors=_SEARCH_READY_SELECTORS)
     
     print("正在查找搜索结果...")
     result_link = _find_search_result_link(driver)
@@ -320,10 +512,7 @@ def _navigate_to_company_page(driver, search_query: str):
             login_overlay = driver.find_elements(By.CSS_SELECTOR, "div.qcc-login-qrcode")
             if login_overlay:
                 print("检测到登录界面，请切换到浏览器窗口完成登录后返回本终端，按回车继续…")
-                try:
-                    input()
-                except EOFError:
-                    pass
+                prompt_user(site="qcc")
                 login_prompted = True
         except Exception:
             pass
@@ -334,7 +523,7 @@ def _navigate_to_company_page(driver, search_query: str):
                 if current_url:
                     print(f"登录后重新加载搜索页面: {current_url}")
                     driver.get(current_url)
-                    _human_pause(2.0, 3.5)
+                    wait_for_page(driver, "qcc", selectors=_SEARCH_READY_SELECTORS)
             except Exception as reload_err:
                 print(f"重新加载搜索页面失败: {reload_err}")
             print("再次查找搜索结果...")
@@ -344,14 +533,69 @@ def _navigate_to_company_page(driver, search_query: str):
     if not final_url:
         final_url = search_url
     print(f"\n正在访问结果页面: {final_url}")
+    polite_pause("qcc")
     driver.get(final_url)
-    _human_pause(2.5, 4.0)
+    wait_for_page(driver, "qcc", selectors=_COMPANY_READY_SELECTORS)
     
     return search_url, final_url
 
 
-def _collect_shareholder_structure(driver, company_name: str, visited=None, cache=None):
-    """Recursively collect shareholder data for company and nested entities."""
+def _record_pruned(pruned: Dict[str, Dict[str, Any]], name: str, parent: str, stake: float) -> None:
+    """记录被剪枝的主体；同一主体经多条路径被剪枝时合并上级并累加穿透比例。"""
+    entry = pruned.setdefault(name, {"name": name, "parents": [], "effective_percentage": 0.0})
+    if parent not in entry["parents"]:
+        entry["parents"].append(parent)
+    entry["effective_percentage"] += stake
+
+
+def _pruned_list(pruned: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {**entry, "effective_percentage": round(entry["effective_percentage"], 4)}
+        for entry in sorted(pruned.values(), key=lambda item: item["effective_percentage"], reverse=True)
+    ]
+
+
+NodeCallback = Callable[[str, Dict[str, float]], None]
+
+
+def _notify_node(on_node: Optional[NodeCallback], name: str, holders: Dict[str, float]) -> None:
+    """把刚展开主体的直接股东交给回调（如实时更新 ShareholderCalculator）；回调出错不影响穿透。"""
+    if on_node is None:
+        return
+    try:
+        on_node(name, holders)
+    except Exception as exc:
+        print(f"穿透进度回调失败（{name}）: {exc}")
+
+
+def _collect_shareholder_structure(
+    driver,
+    company_name: str,
+    visited=None,
+    cache=None,
+    store=None,
+    fetch_mode: str = DEFAULT_FETCH_MODE,
+    session=None,
+    min_effective_stake: Optional[float] = None,
+    effective_stake: float = 100.0,
+    pruned: Optional[Dict[str, Dict[str, Any]]] = None,
+    on_node: Optional[NodeCallback] = None,
+):
+    """
+    Recursively collect shareholder data for company and nested entities.
+
+    ``cache`` only lives for one crawl; ``store`` is the persistent ShareholderCache
+    consulted before navigating to a node, so shared upstream entities are fetched once.
+    ``fetch_mode``/``session`` select how each node is fetched (see _fetch_node).
+    ``effective_stake`` is the ownership (in %) flowing into this node along the current
+    path; corporate shareholders whose stake along the path falls below
+    ``min_effective_stake`` are not visited and are recorded in ``pruned``.
+    Each ``cache`` entry remembers the stake it was crawled with: a node reached again
+    along a path with a higher stake reuses its fetched shareholders but re-walks them,
+    so upstream entities pruned on the first (weaker) path are expanded after all.
+    ``on_node(name, direct_shareholders)`` is called once per expanded node, before
+    its corporate shareholders are crawled.
+    """
     normalized_name = (company_name or "").strip()
     if not normalized_name:
         return None
@@ -361,34 +605,80 @@ def _collect_shareholder_structure(driver, company_name: str, visited=None, cach
     if cache is None:
         cache = {}
     
-    if normalized_name in cache:
+    cached = cache.get(normalized_name)
+    if cached is not None and (min_effective_stake is None or effective_stake <= cached["stake"]):
         print(f"缓存命中: {normalized_name}")
-        return cache[normalized_name]
+        return cached["payload"]
     
     if normalized_name in visited:
         print(f"检测到循环引用，跳过 {normalized_name}")
         return None
     
     visited.add(normalized_name)
-    _human_pause(0.8, 1.6)
-    try:
-        search_url, page_url = _navigate_to_company_page(driver, normalized_name)
-    except Exception as nav_err:
-        print(f"跳转到 {normalized_name} 页面失败: {nav_err}")
-        visited.discard(normalized_name)
-        return None
-    
-    shareholders = _scrape_shareholders(driver)
+    stored = store.get(normalized_name) if store is not None else None
+    if cached is not None:
+        # 经穿透比例更高的路径再次到达：沿用已抓取的股东表，重新判断此前被剪枝的上游
+        print(
+            f"{normalized_name} 经穿透比例更高的路径再次到达"
+            f"（{effective_stake:.2f}% > {cached['stake']:.2f}%），重新穿透其上游..."
+        )
+        search_url = cached["payload"].get("search_url")
+        page_url = cached["payload"].get("page_url")
+        shareholders = cached["payload"].get("shareholders") or []
+    elif stored:
+        print(f"持久化缓存命中: {normalized_name}")
+        search_url = stored.get("search_url")
+        page_url = stored.get("page_url")
+        shareholders = stored.get("shareholders") or []
+    else:
+        # 礼貌间隔只在真正访问网站前生效，缓存命中不再空等
+        polite_pause("qcc")
+        try:
+            search_url, page_url, shareholders = _fetch_node(driver, normalized_name, fetch_mode, session)
+        except Exception as nav_err:
+            print(f"跳转到 {normalized_name} 页面失败: {nav_err}")
+            visited.discard(normalized_name)
+            return None
+        
+        # 空结果可能是页面异常，不写入缓存，下次重新抓取
+        if shareholders and store is not None:
+            store.put(normalized_name, {
+                "search_url": search_url,
+                "page_url": page_url,
+                "shareholders": shareholders,
+            })
     direct_shareholders = {entry["name"]: entry["percentage"] for entry in shareholders}
+    if cached is None:
+        _notify_node(on_node, normalized_name, direct_shareholders)
     entity_structure: Dict[str, Dict[str, float]] = {}
     
     for entry in shareholders:
         sub_name = entry.get("name")
         if entry.get("type") == "natural" or not sub_name:
             continue
+        sub_stake = effective_stake * (entry.get("percentage") or 0.0) / 100.0
+        # 已经穿透过的主体直接复用缓存，不再剪枝
+        if min_effective_stake is not None and sub_stake < min_effective_stake and sub_name not in cache:
+            print(f"\n非自然人股东 {sub_name} 穿透后仅占 {sub_stake:.2f}%，低于 {min_effective_stake}%，剪枝跳过。")
+            if pruned is not None:
+                _record_pruned(pruned, sub_name, normalized_name, sub_stake)
+            continue
+        if pruned is not None:
+            pruned.pop(sub_name, None)
         print(f"\n发现非自然人股东 {sub_name}，继续穿透查询...")
-        _human_pause(1.0, 2.2)
-        sub_data = _collect_shareholder_structure(driver, sub_name, visited, cache)
+        sub_data = _collect_shareholder_structure(
+            driver,
+            sub_name,
+            visited,
+            cache,
+            store,
+            fetch_mode=fetch_mode,
+            session=session,
+            min_effective_stake=min_effective_stake,
+            effective_stake=sub_stake,
+            pruned=pruned,
+            on_node=on_node,
+        )
         if not sub_data:
             print(f"无法获取 {sub_name} 的股东信息，跳过。")
             continue
@@ -408,10 +698,292 @@ def _collect_shareholder_structure(driver, company_name: str, visited=None, cach
         "entity_structure": entity_structure
     }
     
-    cache[normalized_name] = payload
+    cache[normalized_name] = {"stake": effective_stake, "payload": payload}
     visited.discard(normalized_name)
     return payload
 
+
+class _CrawlSessions:
+    """
+    BFS 并发穿透用的会话槽：除调用方传入的主浏览器外，按需再开至多 size-1 个会话。
+    http 模式下额外会话只是独立的 requests.Session；其余模式优先从 driver_pool 借浏览器，
+    没有浏览器池时自行创建，close() 时归还或退出。
+    额外会话沿用同一份 Cookie，同一企查查账号多会话并发会被强制下线，因此 size > 1 需要
+    allow_concurrent=True 显式开启（并自行保证各会话使用独立账号），否则按 1 个会话运行。
+    """
+
+    def __init__(
+        self,
+        driver,
+        session=None,
+        size=1,
+        cookies=None,
+        fetch_mode=DEFAULT_FETCH_MODE,
+        driver_pool=None,
+        allow_concurrent=False,
+    ):
+        size = max(1, int(size or 1))
+        if size > 1 and not allow_concurrent:
+            print(
+                f"警告：同一企查查账号并发 {size} 个会话可能被强制下线，已改为 1 个会话穿透；"
+                "确需并发请为各会话准备独立账号并显式开启并发会话"
+            )
+            size = 1
+        elif size > 1:
+            print(f"警告：企查查穿透将以 {size} 个会话并发访问，请确认各会话使用独立账号，否则可能被强制下线")
+        self.size = size
+        self._cookies = cookies
+        self._fetch_mode = fetch_mode
+        self._driver_pool = driver_pool
+        self._idle: "queue.Queue[Tuple[Any, Any]]" = queue.Queue()
+        self._idle.put((driver, session))
+        self._opened = 1
+        self._extra_drivers: List[Any] = []
+        self._lock = threading.Lock()
+
+    def _open_slot(self):
+        session = _build_http_session(self._cookies) if self._fetch_mode == FETCH_MODE_HTTP else None
+        driver = None
+        if self._fetch_mode != FETCH_MODE_HTTP:
+            print("为并发穿透启动额外的企查查浏览器...")
+            driver = self._driver_pool.acquire("qcc") if self._driver_pool is not None else create_driver("qcc")
+            with self._lock:
+                self._extra_drivers.append(driver)
+            _prepare_qcc_session(driver, self._cookies)
+        return driver, session
+
+    @contextmanager
+    def slot(self):
+        try:
+            slot = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    slot = self._open_slot()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                slot = self._idle.get()
+        try:
+            yield slot
+        finally:
+            self._idle.put(slot)
+
+    def close(self) -> None:
+        with self._lock:
+            drivers, self._extra_drivers = self._extra_drivers, []
+        for driver in drivers:
+            if self._driver_pool is not None:
+                self._driver_pool.release("qcc", driver)
+                continue
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+
+def _propagate_stakes(
+    root_direct: Dict[str, float],
+    entity_structure: Dict[str, Dict[str, float]],
+    natural_names: Set[str],
+    resolved: Set[str],
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """
+    按 ShareholderCalculator 的口径把持股比例向上穿透。
+    返回 (自然人已知穿透比例, 尚未展开主体收到的比例)；已展开但没有股东数据的主体视为无法继续穿透。
+    """
+    persons: Dict[str, float] = {}
+    pending: Dict[str, float] = {}
+
+    def _walk(holders: Dict[str, float], mass: float, path: Set[str]) -> None:
+        for name, percentage in holders.items():
+            effective = mass * (percentage or 0.0) / 100.0
+            if effective <= 0:
+                continue
+            if name in natural_names:
+                persons[name] = persons.get(name, 0.0) + effective
+            elif name in path:
+                continue
+            elif name in entity_structure:
+                _walk(entity_structure[name], effective, path | {name})
+            elif name not in resolved:
+                pending[name] = pending.get(name, 0.0) + effective
+
+    _walk(root_direct, 100.0, set())
+    return persons, pending
+
+
+def _threshold_settled(persons: Dict[str, float], unexplored_mass: float, threshold: float) -> bool:
+    """剩余未展开的比例 U 已不足以让任何人（含尚未出现的人）跨过阈值：U < T - max(已知且 < T 的比例, 0)。"""
+    below = [value for value in persons.values() if value < threshold]
+    return unexplored_mass < threshold - max(below, default=0.0)
+
+
+def _collect_shareholder_structure_bfs(
+    sessions: _CrawlSessions,
+    company_name: str,
+    store=None,
+    fetch_mode: str = DEFAULT_FETCH_MODE,
+    max_depth: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+    threshold: float = MAJOR_SHAREHOLDER_THRESHOLD,
+    min_effective_stake: Optional[float] = None,
+    on_node: Optional[NodeCallback] = None,
+):
+    """
+    Breadth-first variant of _collect_shareholder_structure.
+
+    Each level's unexpanded corporate shareholders are fetched concurrently over the
+    slots in ``sessions``. The crawl stops at ``max_depth`` (root is depth 0), after
+    ``max_nodes`` expanded nodes, or as soon as the ownership still flowing into
+    unexpanded entities can no longer move anyone across ``threshold``. Entities whose
+    aggregated effective stake (summed over all known paths) is below
+    ``min_effective_stake`` are pruned; a pruned entity is reconsidered if another
+    parent turns up later. ``on_node`` is called as each node is expanded, like in
+    the DFS crawl. Returns the same payload as the DFS crawl plus ``crawl_stats``
+    and ``pruned_entities``.
+    """
+    root = (company_name or "").strip()
+    if not root:
+        return None
+
+    nodes: Dict[str, Dict[str, Any]] = {}
+    natural_names: Set[str] = set()
+    resolved: Set[str] = set()
+    parents: Dict[str, List[str]] = {}
+    pruned: Dict[str, Dict[str, Any]] = {}
+    stats: Dict[str, Any] = {
+        "mode": CRAWL_MODE_BFS,
+        "workers": sessions.size,
+        "depth_reached": 0,
+        "nodes_expanded": 0,
+        "stopped_reason": "exhausted",
+        "unexplored": [],
+    }
+
+    def _expand(name: str):
+        stored = store.get(name) if store is not None else None
+        if stored:
+            print(f"持久化缓存命中: {name}")
+            return name, stored
+        try:
+            with sessions.slot() as (driver, session):
+                polite_pause("qcc")
+                search_url, page_url, shareholders = _fetch_node(driver, name, fetch_mode, session)
+        except Exception as nav_err:
+            print(f"跳转到 {name} 页面失败: {nav_err}")
+            return name, None
+        node = {"search_url": search_url, "page_url": page_url, "shareholders": shareholders}
+        if shareholders and store is not None:
+            store.put(name, node)
+        return name, node
+
+    def _structure() -> Dict[str, Dict[str, float]]:
+        return {
+            name: {entry["name"]: entry["percentage"] for entry in node["shareholders"]}
+            for name, node in nodes.items()
+            if name != root and node["shareholders"]
+        }
+
+    def _root_direct() -> Dict[str, float]:
+        return {entry["name"]: entry["percentage"] for entry in nodes[root]["shareholders"]}
+
+    frontier = [root]
+    depth = 0
+    pending: Dict[str, float] = {}
+    with ThreadPoolExecutor(max_workers=sessions.size, thread_name_prefix="qcc-bfs") as executor:
+        while frontier:
+            deferred: List[str] = []
+            if max_nodes is not None:
+                remaining = max_nodes - stats["nodes_expanded"]
+                if len(frontier) > remaining:
+                    # 预算不足时先展开流入比例最大的主体
+                    frontier.sort(key=lambda name: pending.get(name, 0.0), reverse=True)
+                    frontier, deferred = frontier[:max(remaining, 0)], frontier[max(remaining, 0):]
+            if depth > 0:
+                print(f"\n第 {depth} 层：并发穿透 {len(frontier)} 个非自然人股东（{sessions.size} 个会话）...")
+            resolved.update(frontier)
+            results = list(executor.map(_expand, frontier))
+            stats["nodes_expanded"] += len(frontier)
+            stats["depth_reached"] = depth
+
+            next_level: List[str] = []
+            for name, node in results:
+                if not node:
+                    if name == root:
+                        return None
+                    print(f"无法获取 {name} 的股东信息，跳过。")
+                    continue
+                nodes[name] = node
+                _notify_node(
+                    on_node, name, {entry["name"]: entry["percentage"] for entry in node["shareholders"]}
+                )
+                for entry in node["shareholders"]:
+                    sub_name = entry.get("name")
+                    if not sub_name:
+                        continue
+                    if entry.get("type") == "natural":
+                        natural_names.add(sub_name)
+                        continue
+                    parents.setdefault(sub_name, [])
+                    if name not in parents[sub_name]:
+                        parents[sub_name].append(name)
+                    if sub_name not in resolved and sub_name not in deferred and sub_name not in next_level:
+                        next_level.append(sub_name)
+
+            persons, pending = _propagate_stakes(_root_direct(), _structure(), natural_names, resolved)
+            if min_effective_stake is not None:
+                kept = []
+                for sub_name in next_level:
+                    stake = pending.get(sub_name, 0.0)
+                    if stake < min_effective_stake:
+                        print(f"非自然人股东 {sub_name} 穿透后仅占 {stake:.2f}%，低于 {min_effective_stake}%，剪枝跳过。")
+                        pruned[sub_name] = {
+                            "name": sub_name,
+                            "parents": list(parents.get(sub_name, [])),
+                            "effective_percentage": stake,
+                        }
+                    else:
+                        pruned.pop(sub_name, None)
+                        kept.append(sub_name)
+                next_level = kept
+            frontier = next_level + deferred
+            depth += 1
+            if not frontier:
+                break
+            if deferred or (max_nodes is not None and stats["nodes_expanded"] >= max_nodes):
+                stats["stopped_reason"] = "max_nodes"
+                break
+            if max_depth is not None and depth > max_depth:
+                stats["stopped_reason"] = "max_depth"
+                break
+            unexplored_mass = sum(pending.get(name, 0.0) for name in frontier)
+            if _threshold_settled(persons, unexplored_mass, threshold):
+                print(f"剩余未穿透比例 {unexplored_mass:.2f}% 已不影响 {threshold:.0f}% 阈值判断，提前结束。")
+                stats["stopped_reason"] = "threshold"
+                break
+
+    stats["unexplored"] = [
+        {"name": name, "effective_percentage": round(pending.get(name, 0.0), 4)}
+        for name in frontier
+    ]
+    root_node = nodes[root]
+    return {
+        "search_url": root_node.get("search_url"),
+        "page_url": root_node.get("page_url"),
+        "shareholders": root_node["shareholders"],
+        "direct_shareholders": _root_direct(),
+        "entity_structure": _structure(),
+        "crawl_stats": stats,
+        "pruned_entities": _pruned_list(pruned),
+    }
+
 def add_cookies_to_driver(driver, cookies):
     """
     向浏览器添加Cookie
@@ -424,7 +996,7 @@ def add_cookies_to_driver(driver, cookies):
     # 先访问网站根域名，才能设置cookie
     print("正在访问企查查首页以设置Cookie...")
     driver.get("https://www.qcc.com")
-    _human_pause(2.5, 4.0)  # 等待页面完全加载
+    wait_for_document_ready(driver, site="qcc")  # 等待页面完全加载
     
     try:
         # 如果是字典格式
@@ -457,7 +1029,7 @@ def add_cookies_to_driver(driver, cookies):
         # 刷新页面让Cookie生效
         print("刷新页面以应用Cookie...")
         driver.refresh()
-        _human_pause(1.2, 2.2)
+        wait_for_document_ready(driver, site="qcc")
         
         # 验证Cookie是否生效（可选）
         current_cookies = driver.get_cookies()
@@ -469,23 +1041,7 @@ def add_cookies_to_driver(driver, cookies):
         print(f"添加Cookie时出错: {str(e)}")
         return False
 
-def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save_cookies=False):
-    """
-    在企查查搜索公司并截图保存
-    
-    Args:
-        search_query: 要搜索的公司名
-        cookies: Cookie数据：
-            - 字典: {'name1': 'value1', 'name2': 'value2'}
-        save_to_desktop: 是否保存到桌面，默认True
-        save_cookies: 是否保存当前cookie到文件，默认False
-    """
-    # 清除代理环境变量
-    proxy_vars = ['http_proxy', 'https_proxy', 'all_proxy', 'HTTP_PROXY', 'HTTPS_PROXY', 'ALL_PROXY']
-    for var in proxy_vars:
-        if var in os.environ:
-            del os.environ[var]
-    
+def _build_chrome_options() -> Options:
     # 配置Chrome选项
     chrome_options = Options()
     chrome_options.add_argument('--no-sandbox')
@@ -497,7 +1053,7 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
     chrome_options.add_argument('--proxy-bypass-list=*')
     
     # 设置用户代理（使用更真实的User-Agent）
-    chrome_options.add_argument('user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    chrome_options.add_argument(f'user-agent={QCC_USER_AGENT}')
     chrome_options.add_argument('--window-size=1920,1080')
     
     # 禁用自动化检测（重要！）
@@ -508,37 +1064,165 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
     # 添加额外的反检测措施
     chrome_options.add_argument('--disable-web-security')
     chrome_options.add_argument('--allow-running-insecure-content')
+    return chrome_options
+
+
+def _apply_stealth(driver) -> None:
+    # 执行JavaScript隐藏webdriver特征（重要！）
+    driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+        'source': '''
+            Object.defineProperty(navigator, 'webdriver', {
+                get: () => undefined
+            });
+            window.navigator.chrome = {
+                runtime: {}
+            };
+            Object.defineProperty(navigator, 'plugins', {
+                get: () => [1, 2, 3, 4, 5]
+            });
+        '''
+    })
+
+
+_QCC_LOGGED_OUT_JS = "return !!document.querySelector('div.qcc-login-qrcode, a[href*=\"/weblogin\"]');"
+
+
+def _qcc_session_healthy(driver) -> bool:
+    """打开首页，确认浏览器里有企查查会话 Cookie 且页面没有要求登录。"""
+    driver.get("https://www.qcc.com")
+    wait_for_document_ready(driver, site="qcc")
+    if not any(cookie.get("name") == "QCCSESSID" for cookie in driver.get_cookies()):
+        return False
+    return not driver.execute_script(_QCC_LOGGED_OUT_JS)
+
+
+def _prepare_qcc_session(driver, cookies=None):
+    """
+    浏览器配置目录里的登录仍然有效时跳过 Cookie 注入，返回浏览器当前的 Cookie（供 http 会话使用）；
+    否则注入传入的 cookies 并原样返回。
+    """
+    if session_is_warm("qcc", driver):
+        print("企查查登录状态有效（浏览器配置目录），跳过 Cookie 注入")
+        return {cookie["name"]: cookie["value"] for cookie in driver.get_cookies() if "qcc.com" in cookie.get("domain", "")}
+    if cookies:
+        print("正在添加Cookie...")
+        add_cookies_to_driver(driver, cookies)
+    return cookies
+
+
+# 配置目录持久保存企查查登录，登录一次后续运行直接复用
+register_site("qcc", _build_chrome_options, setup=_apply_stealth, persistent_profile=True, health_check=_qcc_session_healthy)
+
+
+def search_and_screenshot(
+    search_query,
+    cookies=None,
+    save_to_desktop=True,
+    save_cookies=False,
+    driver=None,
+    use_shareholder_cache=True,
+    fetch_mode=DEFAULT_FETCH_MODE,
+    crawl_mode=DEFAULT_CRAWL_MODE,
+    crawl_workers=1,
+    max_depth=None,
+    max_nodes=None,
+    driver_pool=None,
+    min_effective_stake=None,
+    allow_concurrent_sessions=False,
+    on_node=None,
+):
+    """
+    在企查查搜索公司并截图保存
     
-    driver = None
+    Args:
+        search_query: 要搜索的公司名
+        cookies: Cookie数据：
+            - 字典: {'name1': 'value1', 'name2': 'value2'}
+        save_to_desktop: 是否保存到桌面，默认True
+        save_cookies: 是否保存当前cookie到文件，默认False
+        driver: 可选，外部（如 DriverPool）提供的浏览器；传入时不在此处创建或关闭
+        use_shareholder_cache: 是否使用跨运行的股东结构缓存（见 shareholder_cache.py），默认True
+        fetch_mode: 股东表读取方式，见 FETCH_MODES：
+            - "selenium": 逐元素通过 WebDriver 读取
+            - "html": 取一次 page_source 本地解析（默认），解析不到时回退 selenium
+            - "http": 用携带 Cookie 的 requests.Session 直接请求，失败时回退浏览器
+        crawl_mode: 穿透方式，见 CRAWL_MODES：
+            - "dfs": 单浏览器深度优先逐个穿透（默认）
+            - "bfs": 按层广度优先，同一层用 crawl_workers 个会话并发抓取；
+              剩余未穿透比例已不影响 30% 阈值判断时提前结束
+        crawl_workers: bfs 模式下的并发会话数，默认 1；大于 1 时需同时开启 allow_concurrent_sessions
+        allow_concurrent_sessions: 确认各并发会话使用独立账号，允许 crawl_workers > 1
+            （同一账号并发会被强制下线）；未开启时打印警告并按 1 个会话运行
+        max_depth / max_nodes: bfs 模式下的最大穿透层数（公司本身为第 0 层）与最多展开的主体数
+        driver_pool: 可选，bfs 模式下额外浏览器从该池借用
+        min_effective_stake: 剪枝阈值（%）。穿透后流入某个非自然人股东的比例低于该值时不再向上穿透，
+            被跳过的主体记录在结果的 pruned_entities 中；dfs 按单条路径计算，bfs 按所有已知路径汇总计算。
+            默认 None 不剪枝
+        on_node: 可选回调 on_node(主体名称, {直接股东: 持股比例})，每展开一个主体（含公司本身）调用一次，
+            可用于在穿透过程中实时更新受益人计算
+    """
+    if fetch_mode not in FETCH_MODES:
+        raise ValueError(f"未知的 fetch_mode: {fetch_mode}，可选 {FETCH_MODES}")
+    if crawl_mode not in CRAWL_MODES:
+        raise ValueError(f"未知的 crawl_mode: {crawl_mode}，可选 {CRAWL_MODES}")
+    # 清除代理环境变量
+    proxy_vars = ['http_proxy', 'https_proxy', 'all_proxy', 'HTTP_PROXY', 'HTTPS_PROXY', 'ALL_PROXY']
+    for var in proxy_vars:
+        if var in os.environ:
+            del os.environ[var]
+    
+    owns_driver = driver is None
     try:
         # 初始化浏览器
-        print("正在初始化浏览器...")
-        driver = webdriver.Chrome(options=chrome_options)
-        driver.maximize_window()
-        
-        # 执行JavaScript隐藏webdriver特征（重要！）
-        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
-            'source': '''
-                Object.defineProperty(navigator, 'webdriver', {
-                    get: () => undefined
-                });
-                window.navigator.chrome = {
-                    runtime: {}
-                };
-                Object.defineProperty(navigator, 'plugins', {
-                    get: () => [1, 2, 3, 4, 5]
-                });
-            '''
-        })
+        if owns_driver:
+            print("正在初始化浏览器...")
+            driver = create_driver("qcc")
         
-        # 如果提供了cookie，先添加cookie
-        if cookies:
-            print("正在添加Cookie...")
-            add_cookies_to_driver(driver, cookies)
-            _human_pause(1.5, 2.5)
+        # 配置目录中的登录仍有效时直接复用，否则注入传入的 Cookie
+        cookies = _prepare_qcc_session(driver, cookies)
         
         shareholder_cache: Dict[str, Dict[str, Any]] = {}
-        company_graph = _collect_shareholder_structure(driver, search_query, visited=set(), cache=shareholder_cache)
+        pruned: Dict[str, Dict[str, Any]] = {}
+        shareholder_store = ShareholderCache() if use_shareholder_cache else None
+        http_session = _build_http_session(cookies) if fetch_mode == FETCH_MODE_HTTP else None
+        if crawl_mode == CRAWL_MODE_BFS:
+            sessions = _CrawlSessions(
+                driver,
+                http_session,
+                size=crawl_workers,
+                cookies=cookies,
+                fetch_mode=fetch_mode,
+                driver_pool=driver_pool,
+                allow_concurrent=allow_concurrent_sessions,
+            )
+            try:
+                company_graph = _collect_shareholder_structure_bfs(
+                    sessions,
+                    search_query,
+                    store=shareholder_store,
+                    fetch_mode=fetch_mode,
+                    max_depth=max_depth,
+                    max_nodes=max_nodes,
+                    min_effective_stake=min_effective_stake,
+                    on_node=on_node,
+                )
+            finally:
+                sessions.close()
+        else:
+            company_graph = _collect_shareholder_structure(
+                driver,
+                search_query,
+                visited=set(),
+                cache=shareholder_cache,
+                store=shareholder_store,
+                fetch_mode=fetch_mode,
+                session=http_session,
+                min_effective_stake=min_effective_stake,
+                pruned=pruned,
+                on_node=on_node,
+            )
+            if company_graph:
+                company_graph["pruned_entities"] = _pruned_list(pruned)
         if not company_graph:
             print("无法获取公司股东信息，流程终止。")
             return None
@@ -548,27 +1232,28 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
             "direct_shareholders": company_graph.get("direct_shareholders", {}),
             "entity_structure": company_graph.get("entity_structure", {})
         }
+        crawl_stats = company_graph.get("crawl_stats")
+        pruned_entities = company_graph.get("pruned_entities") or []
+        if pruned_entities:
+            print(f"\n剪枝跳过 {len(pruned_entities)} 个非自然人股东（穿透比例低于 {min_effective_stake}%）")
         search_url = company_graph.get("search_url", f"https://www.qcc.com/web/search?key={quote(search_query)}")
         result_link = company_graph.get("page_url")
         if result_link:
+            polite_pause("qcc")
             driver.get(result_link)
-            _human_pause(1.5, 2.7)
+            wait_for_page(driver, "qcc", selectors=_COMPANY_READY_SELECTORS)
         else:
             result_link = driver.current_url
         
         # 滚动页面确保内容加载完整
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        _human_pause(0.8, 1.5)
+        wait_for_network_idle(driver, idle_time=0.5, timeout=3, site="qcc")
         driver.execute_script("window.scrollTo(0, 0);")
-        _human_pause(0.8, 1.5)
         
         # 提取法定代表人名字
         print("\n正在提取法定代表人信息...")
         legal_representative = None
         try:
-            # 等待页面加载
-            _human_pause(1.5, 2.6)
-            
             # 根据HTML结构提取法定代表人名字
             # 法定代表人在工商信息表格中，路径: table.ntable tr td.base-opertd div div.td-coy span.cont span.upside-line span a
             legal_rep_selectors = [
@@ -643,27 +1328,6 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
         else:
             print("未解析到股东列表")
         
-        # 获取页面完整尺寸（全页截图）
-        print("正在获取页面完整尺寸...")
-        total_width = driver.execute_script("return Math.max(document.body.scrollWidth, document.body.offsetWidth, document.documentElement.clientWidth, document.documentElement.scrollWidth, document.documentElement.offsetWidth);")
-        total_height = driver.execute_script("return Math.max(document.body.scrollHeight, document.body.offsetHeight, document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight);")
-        
-        viewport_width = driver.execute_script("return window.innerWidth")
-        viewport_height = driver.execute_script("return window.innerHeight")
-        
-        print(f"页面完整尺寸: {total_width} x {total_height}")
-        print(f"当前视窗尺寸: {viewport_width} x {viewport_height}")
-        
-        max_width = min(total_width + 100, 3840)
-        max_height = min(total_height + 200, 21600)
-        
-        if total_width > viewport_width or total_height > viewport_height:
-            print(f"调整窗口大小至: {max_width} x {max_height}")
-            driver.set_window_size(max_width, max_height)
-            _human_pause(1.5, 2.5)
-            driver.execute_script("window.scrollTo(0, 0);")
-            _human_pause(0.4, 0.9)
-        
         # 截图保存
         if save_to_desktop:
             desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
@@ -680,11 +1344,11 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_query = "".join(c for c in search_query if c.isalnum() or c in (' ', '-', '_')).strip()[:30]
-        filename = f"企查查_{safe_query}_{timestamp}.png"
+        filename = f"企查查_{safe_query}_{timestamp}{screenshot_extension()}"
         filepath = os.path.join(company_folder, filename)  # 保存到公司文件夹中
         
         print(f"正在截图全页内容并保存到: {filepath}")
-        driver.save_screenshot(filepath)
+        filepath, screenshot_sha256 = save_screenshot_artifact(driver, filepath)
         
         # 将结果写入/更新到 JSON（与其他脚本统一）
         try:
@@ -700,14 +1364,15 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
                     "top_shareholder": max_shareholder,
                     "top_shareholding_ratio": f"{max_ratio}%" if max_ratio > 0 else "",
                     "shareholders": shareholders,
-                    "calculator_input": calculator_payload
+                    "calculator_input": calculator_payload,
+                    "crawl_stats": crawl_stats,
+                    "pruned_entities": pruned_entities,
                 },
                 "screenshot": filepath,
+                "screenshot_sha256": screenshot_sha256,
                 "queried_at": timestamp
             }
-            existing_records = load_records(json_filepath)
-            updated_records = upsert_record(existing_records, record)
-            write_records(json_filepath, updated_records)
+            save_record(json_filepath, record)
             print(f"查询结果已写入/更新：{json_filepath}")
         except Exception as write_err:
             print(f"写入JSON时出错：{write_err}")
@@ -724,21 +1389,25 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
             'search_url': search_url,
             'result_url': result_link,
             'screenshot_path': filepath,
+            'screenshot_sha256': screenshot_sha256,
             'legal_representative': legal_representative,
             'top_shareholder': max_shareholder,
             'top_shareholding_ratio': max_ratio,
             'shareholders': shareholders,
-            'calculator_input': calculator_payload
+            'calculator_input': calculator_payload,
+            'crawl_stats': crawl_stats,
+            'pruned_entities': pruned_entities,
         }
         
     except Exception as e:
         print(f"发生错误: {str(e)}")
         import traceback
         traceback.print_exc()
+        mark_broken(driver)
         return None
     
     finally:
-        if driver:
+        if driver and owns_driver:
             print("\n正在关闭浏览器...")
             _human_pause(1.0, 2.0)
             driver.quit()
@@ -14,7 +14,6 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-import time
 import sys
 import os
 import json
@@ -26,7 +25,16 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))
 
-from storage_utils import load_records, upsert_record, write_records
+from screenshot_utils import save_screenshot_artifact, screenshot_extension
+from storage_utils import save_record
+from wait_utils import (
+    pause,
+    polite_pause,
+    wait_for_document_ready,
+    wait_for_network_idle,
+    wait_for_page,
+    wait_for_selector,
+)
 
 # 默认Cookie（已写死）
 # zjfzzq
@@ -61,7 +69,7 @@ def add_cookies_to_driver(driver, cookies):
     # 先访问网站根域名，才能设置cookie
     print("正在访问企查查首页以设置Cookie...")
     driver.get("https://www.qcc.com")
-    time.sleep(3)  # 等待页面完全加载
+    wait_for_document_ready(driver, site="qcc")  # 等待页面完全加载
     
     try:
         # 如果是字典格式
@@ -94,7 +102,7 @@ def add_cookies_to_driver(driver, cookies):
         # 刷新页面让Cookie生效
         print("刷新页面以应用Cookie...")
         driver.refresh()
-        time.sleep(2)
+        wait_for_document_ready(driver, site="qcc")
         
         # 验证Cookie是否生效（可选）
         current_cookies = driver.get_cookies()
@@ -172,16 +180,17 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
         if cookies:
             print("正在添加Cookie...")
             add_cookies_to_driver(driver, cookies)
-            time.sleep(2)
         
         # 构建搜索URL
         search_url = f"https://www.qcc.com/web/search?key={quote(search_query)}"
         print(f"正在访问搜索页面: {search_url}")
+        polite_pause("qcc")
         driver.get(search_url)
         
         # # 等待页面加载
         print("等待页面加载...")
-        time.sleep(5)  # 企查查可能需要更长的加载时间
+        # 企查查可能需要更长的加载时间：等到出现结果链接/登录框或网络空闲
+        wait_for_page(driver, "qcc", selectors=['a[href*="/firm/"]', 'a[href*="/company/"]', '.login', '.verify'], timeout=15)
         
         # 检查是否需要登录（如果cookie无效）
         try:
@@ -204,7 +213,6 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
         
         # 查找搜索结果链接（企查查的结果通常在第一个）
         print("正在查找搜索结果...")
-        time.sleep(2)
         
         result_link = None
         result_selectors = [
@@ -239,22 +247,19 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
         else:
             # 访问结果链接
             print(f"\n正在访问结果页面: {result_link}")
+            polite_pause("qcc")
             driver.get(result_link)
-            time.sleep(3)
+            wait_for_page(driver, "qcc", selectors=['table.ntable', 'section#partner'])
         
         # 滚动页面确保内容加载完整
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(1)
+        wait_for_network_idle(driver, idle_time=0.5, timeout=3, site="qcc")
         driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(1)
         
         # 提取法定代表人名字
         print("\n正在提取法定代表人信息...")
         legal_representative = None
         try:
-            # 等待页面加载
-            time.sleep(2)
-            
             # 根据HTML结构提取法定代表人名字
             # 法定代表人在工商信息表格中，路径: table.ntable tr td.base-opertd div div.td-coy span.cont span.upside-line span a
             legal_rep_selectors = [
@@ -330,7 +335,7 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
                         if '股东' in text or 'partner' in href.lower() or '股东' in href:
                             # print(f"找到股东信息标签: {text}")
                             driver.execute_script("arguments[0].click();", elem)
-                            time.sleep(2)  # 等待标签页内容加载
+                            wait_for_network_idle(driver, idle_time=0.5, timeout=5, site="qcc")  # 等待标签页内容加载
                             shareholder_tab_clicked = True
                             break
                     if shareholder_tab_clicked:
@@ -339,7 +344,7 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
                     continue
             
             # 等待表格加载
-            time.sleep(2)
+            wait_for_selector(driver, ['#partner table tr', 'table.ntable tr'], timeout=5, site="qcc")
             
             # 只读取第一行数据（第一行的持股比例一定是最高的）
             try:
@@ -410,27 +415,6 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
             import traceback
             traceback.print_exc()
         
-        # 获取页面完整尺寸（全页截图）
-        print("正在获取页面完整尺寸...")
-        total_width = driver.execute_script("return Math.max(document.body.scrollWidth, document.body.offsetWidth, document.documentElement.clientWidth, document.documentElement.scrollWidth, document.documentElement.offsetWidth);")
-        total_height = driver.execute_script("return Math.max(document.body.scrollHeight, document.body.offsetHeight, document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight);")
-        
-        viewport_width = driver.execute_script("return window.innerWidth")
-        viewport_height = driver.execute_script("return window.innerHeight")
-        
-        print(f"页面完整尺寸: {total_width} x {total_height}")
-        print(f"当前视窗尺寸: {viewport_width} x {viewport_height}")
-        
-        max_width = min(total_width + 100, 3840)
-        max_height = min(total_height + 200, 21600)
-        
-        if total_width > viewport_width or total_height > viewport_height:
-            print(f"调整窗口大小至: {max_width} x {max_height}")
-            driver.set_window_size(max_width, max_height)
-            time.sleep(2)
-            driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(0.5)
-        
         # 截图保存
         if save_to_desktop:
             desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
@@ -447,11 +431,11 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_query = "".join(c for c in search_query if c.isalnum() or c in (' ', '-', '_')).strip()[:30]
-        filename = f"企查查_{safe_query}_{timestamp}.png"
+        filename = f"企查查_{safe_query}_{timestamp}{screenshot_extension()}"
         filepath = os.path.join(company_folder, filename)  # 保存到公司文件夹中
         
         print(f"正在截图全页内容并保存到: {filepath}")
-        driver.save_screenshot(filepath)
+        filepath, screenshot_sha256 = save_screenshot_artifact(driver, filepath)
         
         # 将结果写入/更新到 JSON（与其他脚本统一）
         try:
@@ -468,11 +452,10 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
                     "top_shareholding_ratio": f"{max_ratio}%" if max_ratio > 0 else ""
                 },
                 "screenshot": filepath,
+                "screenshot_sha256": screenshot_sha256,
                 "queried_at": timestamp
             }
-            existing_records = load_records(json_filepath)
-            updated_records = upsert_record(existing_records, record)
-            write_records(json_filepath, updated_records)
+            save_record(json_filepath, record)
             print(f"查询结果已写入/更新：{json_filepath}")
         except Exception as write_err:
             print(f"写入JSON时出错：{write_err}")
@@ -488,7 +471,8 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
         return {
             'search_url': search_url,
             'result_url': result_link,
-            'screenshot_path': filepath
+            'screenshot_path': filepath,
+            'screenshot_sha256': screenshot_sha256
         }
         
     except Exception as e:
@@ -500,7 +484,7 @@ def search_and_screenshot(search_query, cookies=None, save_to_desktop=True, save
     finally:
         if driver:
             print("\n正在关闭浏览器...")
-            time.sleep(2)
+            pause(2, site="qcc")
             driver.quit()
 
 
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+企查查股东结构的跨运行持久化缓存（SQLite）
+
+- 以规范化后的主体名称为键，缓存单个节点的直接股东列表（不含下层结构），
+  递归穿透时每一层各自查缓存，因此共享的上游控股公司、基金平台只需爬一次；
+- 每条记录带抓取时间，超过 TTL 视为未命中；
+- 命令行可手动失效：
+    python nested_judge/shareholder_cache.py invalidate 公司A 公司B
+    python nested_judge/shareholder_cache.py invalidate --all
+    python nested_judge/shareholder_cache.py list
+    python nested_judge/shareholder_cache.py purge
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+DEFAULT_CACHE_PATH = Path.home() / ".founders" / "qcc_shareholders.sqlite3"
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def normalize_entity_name(name: str) -> str:
+    """去除空白并统一全/半角括号，避免同一主体因写法不同而缓存两份。"""
+    text = (name or "").strip()
+    text = text.replace("（", "(").replace("）", ")")
+    return re.sub(r"\s+", "", text)
+
+
+class ShareholderCache:
+    def __init__(self, path: str | Path = DEFAULT_CACHE_PATH, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS):
+        # ttl_seconds=None 表示永不过期
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shareholder_nodes ("
+                " name_key TEXT PRIMARY KEY,"
+                " name TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每次操作单独连接：可在多线程/多进程间共享同一个缓存文件
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """返回未过期的节点数据（search_url / page_url / shareholders），否则返回 None。"""
+        key = normalize_entity_name(name)
+        if not key:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload, fetched_at FROM shareholder_nodes WHERE name_key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        payload, fetched_at = row
+        if self._expired(fetched_at, time.time()):
+            return None
+        try:
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def _expired(self, fetched_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - fetched_at > self.ttl_seconds
+
+    def put(self, name: str, payload: Dict[str, Any]) -> None:
+        key = normalize_entity_name(name)
+        if not key:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO shareholder_nodes (name_key, name, payload, fetched_at) VALUES (?, ?, ?, ?)",
+                (key, name.strip(), json.dumps(payload, ensure_ascii=False), time.time()),
+            )
+
+    def invalidate(self, names: Sequence[str]) -> int:
+        keys = [normalize_entity_name(name) for name in names if normalize_entity_name(name)]
+        if not keys:
+            return 0
+        with self._connect() as conn:
+            cursor = conn.executemany("DELETE FROM shareholder_nodes WHERE name_key = ?", [(k,) for k in keys])
+            return cursor.rowcount
+
+    def clear(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM shareholder_nodes").rowcount
+
+    def purge_expired(self) -> int:
+        if self.ttl_seconds is None:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM shareholder_nodes WHERE fetched_at < ?", (cutoff,)).rowcount
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT name, fetched_at, payload FROM shareholder_nodes ORDER BY fetched_at DESC"
+            ).fetchall()
+        now = time.time()
+        result = []
+        for name, fetched_at, payload in rows:
+            try:
+                count = len(json.loads(payload).get("shareholders") or [])
+            except ValueError:
+                count = 0
+            result.append({
+                "name": name,
+                "age_hours": round((now - fetched_at) / 3600, 1),
+                "expired": self._expired(fetched_at, now),
+                "shareholder_count": count,
+            })
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="企查查股东结构缓存管理")
+    parser.add_argument("--path", default=str(DEFAULT_CACHE_PATH), help="缓存文件路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    invalidate_parser = subparsers.add_parser("invalidate", help="删除指定主体（或全部）的缓存")
+    invalidate_parser.add_argument("names", nargs="*", help="主体名称")
+    invalidate_parser.add_argument("--all", action="store_true", help="清空全部缓存")
+    subparsers.add_parser("list", help="列出缓存条目")
+    subparsers.add_parser("purge", help="删除已过期的条目")
+    args = parser.parse_args()
+
+    cache = ShareholderCache(args.path)
+    if args.command == "invalidate":
+        if args.all:
+            print(f"已清空缓存，共删除 {cache.clear()} 条")
+        elif args.names:
+            print(f"已删除 {cache.invalidate(args.names)} 条缓存")
+        else:
+            print("请指定主体名称或使用 --all")
+            sys.exit(1)
+    elif args.command == "list":
+        entries = cache.entries()
+        for entry in entries:
+            flag = "（已过期）" if entry["expired"] else ""
+            print(f"  {entry['name']}: {entry['shareholder_count']} 位股东，{entry['age_hours']} 小时前{flag}")
+        print(f"共 {len(entries)} 条")
+    elif args.command == "purge":
+        print(f"已删除 {cache.purge_expired()} 条过期缓存")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,52 +3,228 @@
 
 """
 
+import argparse
 import json
 import os
 import sys
+import threading
+import warnings
+from collections import deque
 from typing import Dict, List, Tuple, Union, Optional
 
+try:
+    import numpy as np
+except ImportError:  # 可选依赖：只有 method="matrix" 需要
+    np = None
+
+try:
+    from scipy import sparse
+    from scipy.sparse.linalg import spsolve
+except ImportError:  # 可选依赖：有 scipy 时 method="matrix" 先用稀疏 LU 直接求解
+    sparse = spsolve = None
+
 ITEM_KEYWORD = "QCC_公司查询"
 FALLBACK_ITEM_KEYWORD = "QCC_企查查公司查询"
 
+METHOD_RECURSIVE = "recursive"  # 逐条路径递归（原算法，同一主体的第二条路径和交叉持股会被忽略）
+METHOD_MATRIX = "matrix"        # 持股矩阵求解 x = (I - M)^-1 d，菱形结构与交叉持股都会计入
+METHODS = (METHOD_RECURSIVE, METHOD_MATRIX)
+
 class ShareholderCalculator:
-    def __init__(self):
+    def __init__(self, method: str = METHOD_RECURSIVE):
+        if method not in METHODS:
+            raise ValueError(f"未知的计算方法: {method}，可选 {METHODS}")
+        self.method = method
         # 存储公司直接股东信息：{股东名称: 持股比例}
         self.direct_shareholders = {}
         # 存储非自然人股东的股权结构：{非自然人名称: {股东名称: 持股比例}}
         self.entity_structure = {}
         # 缓存最终计算结果
         self._result_cache = None
+        # 递归算法的增量缓存：每个直接股东穿透得到的 {自然人: 比例}，以及穿透途经的主体
+        self._contributions: Dict[str, Dict[str, float]] = {}
+        self._dependencies: Dict[str, set] = {}
+        # 爬取线程写入、其他线程读取 snapshot() 时互斥
+        self._lock = threading.RLock()
     
     def add_direct_shareholder(self, name: str, percentage: float):
-        """添加直接股东"""
-        self.direct_shareholders[name] = percentage
-        self._result_cache = None  # 清除缓存
+        """添加直接股东（只重算该股东的穿透结果）"""
+        with self._lock:
+            self.direct_shareholders[name] = percentage
+            self._contributions.pop(name, None)
+            self._dependencies.pop(name, None)
+            self._result_cache = None  # 清除缓存
     
     def set_entity_structure(self, entity_name: str, shareholders: Dict[str, float]):
-        """设置非自然人股东的股权结构"""
-        self.entity_structure[entity_name] = shareholders.copy()
-        self._result_cache = None  # 清除缓存
+        """设置非自然人股东的股权结构（只重算穿透路径经过该主体的直接股东）"""
+        with self._lock:
+            self.entity_structure[entity_name] = shareholders.copy()
+            affected = [name for name, entities in self._dependencies.items() if entity_name in entities]
+            for name in affected:
+                self._contributions.pop(name, None)
+                self._dependencies.pop(name, None)
+            self._result_cache = None  # 清除缓存
     
     def calculate_ultimate_ownership(self) -> Dict[str, float]:
         """计算最终的实际持股比例"""
-        if self._result_cache is not None:
-            return self._result_cache
-        
+        with self._lock:
+            if self._result_cache is not None:
+                return self._result_cache
+            
+            if self.method == METHOD_MATRIX:
+                result = self._calculate_matrix_ownership()
+            else:
+                result = self._calculate_recursive_ownership()
+            self._result_cache = result
+            return result
+    
+    def snapshot(self) -> Dict[str, float]:
+        """线程安全地返回当前结果的副本；爬取过程中可随时调用，只重算受更新影响的部分"""
+        with self._lock:
+            return dict(self.calculate_ultimate_ownership())
+    
+    def _calculate_recursive_ownership(self) -> Dict[str, float]:
+        """原递归算法：沿每条路径向上穿透，按直接股东缓存各自的穿透结果"""
         result = {}
         
         # 处理所有直接股东
         for shareholder, percentage in self.direct_shareholders.items():
-            if self._is_natural_person(shareholder):
-                # 自然人直接持股
-                result[shareholder] = result.get(shareholder, 0) + percentage
-            else:
-                # 非自然人股东，需要穿透计算
-                self._calculate_entity_ownership(shareholder, percentage, result)
+            contribution = self._contributions.get(shareholder)
+            if contribution is None:
+                contribution, visited = self._direct_contribution(shareholder, percentage)
+                self._contributions[shareholder] = contribution
+                self._dependencies[shareholder] = visited
+            for person, value in contribution.items():
+                result[person] = result.get(person, 0) + value
+        
+        return result
+    
+    def _direct_contribution(self, shareholder: str, percentage: float) -> Tuple[Dict[str, float], set]:
+        """单个直接股东穿透得到的 {自然人: 比例} 及途经的主体集合"""
+        contribution: Dict[str, float] = {}
+        visited: set = set()
+        if self._is_natural_person(shareholder):
+            # 自然人直接持股
+            contribution[shareholder] = percentage
+        else:
+            # 非自然人股东，需要穿透计算
+            self._calculate_entity_ownership(shareholder, percentage, contribution, visited)
+        return contribution, visited
+    
+    def _calculate_matrix_ownership(self) -> Dict[str, float]:
+        """
+        矩阵算法：M[i, j] 为主体 i 持有主体 j 的比例，d 为目标公司对各主体的直接持股，
+        各主体的综合持股 x = d + M·x，即 x = (I - M)^-1 d；自然人的结果为直接持股加上 P·x。
+        持股矩阵通常极稀疏，只以非零元 (行, 列, 比例) 的数组存储；安装了 scipy 时直接求解，否则迭代求解。
+        与递归算法一致，只输出实际穿透到的自然人（比例为 0 的不输出）。
+        """
+        if np is None:
+            raise RuntimeError("method='matrix' 需要安装 numpy：pip install numpy")
+        
+        entity_index: Dict[str, int] = {}
         
-        self._result_cache = result
+        def _index(name: str) -> int:
+            if name not in entity_index:
+                entity_index[name] = len(entity_index)
+            return entity_index[name]
+        
+        person_index: Dict[str, int] = {}
+        entity_edges, person_edges = [], []
+        for name in self.direct_shareholders:
+            if not self._is_natural_person(name):
+                _index(name)
+        for entity, shareholders in self.entity_structure.items():
+            if self._is_natural_person(entity):
+                continue
+            column = _index(entity)
+            for sub_shareholder, sub_percentage in shareholders.items():
+                fraction = sub_percentage / 100.0
+                if self._is_natural_person(sub_shareholder):
+                    row = person_index.setdefault(sub_shareholder, len(person_index))
+                    person_edges.append((row, column, fraction))
+                else:
+                    entity_edges.append((_index(sub_shareholder), column, fraction))
+        
+        result: Dict[str, float] = {}
+        for name, percentage in self.direct_shareholders.items():
+            if self._is_natural_person(name):
+                result[name] = result.get(name, 0) + percentage
+        
+        size = len(entity_index)
+        if size == 0:
+            return result
+        
+        direct = np.zeros(size)
+        for name, percentage in self.direct_shareholders.items():
+            if name in entity_index:
+                direct[entity_index[name]] += percentage
+        integrated = self._solve_integrated(size, entity_edges, direct)
+        
+        if person_edges:
+            rows, cols, vals = (np.asarray(values) for values in zip(*person_edges))
+            person_totals = np.bincount(rows, weights=vals * integrated[cols], minlength=len(person_index))
+            for name, row in person_index.items():
+                if person_totals[row] > 0:
+                    result[name] = result.get(name, 0) + float(person_totals[row])
         return result
     
+    @staticmethod
+    def _solve_integrated(size: int, edges: List[Tuple[int, int, float]], direct,
+                          tolerance: float = 1e-10):
+        """
+        求解 (I - M)x = d，edges 为 M 的非零元 (行, 列, 比例)，d、x 为 ndarray。
+        有 scipy 时先用稀疏 LU（spsolve）直接求解；没有 scipy、矩阵奇异或结果异常（如闭环 100% 互持）时
+        用 Neumann 级数 x = d + Md + M²d + … 迭代（稀疏矩阵乘向量用 np.bincount 完成），
+        新增项小于 tolerance 即收敛，新增项不再衰减（闭环）时停止并提示结果为截断近似值。
+        """
+        if edges:
+            rows, cols, vals = (np.asarray(values) for values in zip(*edges))
+        else:
+            rows, cols, vals = np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+        
+        if spsolve is not None:
+            # 重复的 (行, 列) 会被累加
+            holdings = sparse.csc_matrix((vals, (rows, cols)), shape=(size, size))
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # 奇异矩阵时 spsolve 给出 MatrixRankWarning 并返回 nan
+                solution = np.atleast_1d(spsolve(sparse.identity(size, format="csc") - holdings, direct))
+            if np.all(np.isfinite(solution)) and solution.min() >= -tolerance:
+                return solution
+        
+        # 可收敛时持股最多经过 size 步就会流出闭环，因此与 size 步之前相比新增项不再减小即视为不收敛
+        solution = direct.astype(float).copy()
+        term = solution.copy()
+        history = deque([np.abs(term).sum()], maxlen=size)
+        while True:
+            term = np.bincount(rows, weights=vals * term[cols], minlength=size)
+            solution += term
+            if np.abs(term).max() < tolerance:
+                return solution
+            magnitude = np.abs(term).sum()
+            if len(history) == size and magnitude > history[0] * (1 - 1e-12):
+                print("警告：交叉持股闭环未衰减，迭代无法收敛，结果为截断近似值")
+                return solution
+            history.append(magnitude)
+    
+    def compare_methods(self, tolerance: float = 1e-6) -> Dict[str, Tuple[float, float]]:
+        """分别用递归与矩阵算法计算，返回结果不一致的 {自然人: (递归结果, 矩阵结果)}"""
+        results = {}
+        for method in METHODS:
+            calculator = ShareholderCalculator(method=method)
+            with self._lock:
+                for name, percentage in self.direct_shareholders.items():
+                    calculator.add_direct_shareholder(name, percentage)
+                for entity, shareholders in self.entity_structure.items():
+                    calculator.set_entity_structure(entity, shareholders)
+            results[method] = calculator.calculate_ultimate_ownership()
+        recursive, matrix = results[METHOD_RECURSIVE], results[METHOD_MATRIX]
+        differences = {}
+        for person in set(recursive) | set(matrix):
+            left, right = recursive.get(person, 0.0), matrix.get(person, 0.0)
+            if abs(left - right) > tolerance:
+                differences[person] = (left, right)
+        return differences
+    
     def _is_natural_person(self, name: str) -> bool:
         """判断是否为自然人（这里用简单规则：不包含'公司'、'基金'等字眼的视为自然人）"""
         indicators = ['公司', '基金', '合伙', '企业', '银行', '保险', '信托', '资管']
@@ -164,13 +340,15 @@ def _load_company_record(company_name: str, keyword: str = ITEM_KEYWORD):
     return record, json_path
 
 
-def _build_calculator_from_record(record: Dict[str, Dict]) -> Tuple[ShareholderCalculator, Dict]:
+def _build_calculator_from_record(
+    record: Dict[str, Dict], method: str = METHOD_RECURSIVE
+) -> Tuple[ShareholderCalculator, Dict]:
     data = record.get("data") or {}
     calc_input = data.get("calculator_input") or {}
     direct_shareholders = calc_input.get("direct_shareholders") or {}
     entity_structure = calc_input.get("entity_structure") or {}
     
-    calculator = ShareholderCalculator()
+    calculator = ShareholderCalculator(method=method)
     
     for name, percentage in direct_shareholders.items():
         value = _safe_float(percentage)
@@ -194,9 +372,9 @@ def _build_calculator_from_record(record: Dict[str, Dict]) -> Tuple[ShareholderC
     return calculator, data
 
 
-def analyze_company(company_name: str):
+def analyze_company(company_name: str, method: str = METHOD_RECURSIVE, compare: bool = False):
     record, json_path = _load_company_record(company_name)
-    calculator, data = _build_calculator_from_record(record)
+    calculator, data = _build_calculator_from_record(record, method=method)
     
     print("=" * 60)
     print(f"{company_name} 股份计算")
@@ -227,20 +405,31 @@ def analyze_company(company_name: str):
             print(f"  * {person}: {percentage:.2f}%")
     else:
         print("  无")
+    
+    if compare:
+        print("\n递归算法与矩阵算法对比:")
+        differences = calculator.compare_methods()
+        if differences:
+            for person, (recursive, matrix) in sorted(differences.items(), key=lambda x: x[1][1], reverse=True):
+                print(f"  {person}: 递归 {recursive:.4f}% / 矩阵 {matrix:.4f}%")
+        else:
+            print("  两种算法结果一致")
 
 
 def main():
-    if len(sys.argv) > 1:
-        company_name = sys.argv[1]
-    else:
-        company_name = input("请输入需要分析的公司名称: ").strip()
+    parser = argparse.ArgumentParser(description="读取企查查 JSON 计算受益所有人")
+    parser.add_argument("company", nargs="?", help="公司名称（缺省时交互输入）")
+    parser.add_argument("--method", choices=METHODS, default=METHOD_RECURSIVE, help="穿透计算方法")
+    parser.add_argument("--compare", action="store_true", help="同时输出递归与矩阵算法的差异")
+    args = parser.parse_args()
+    company_name = args.company or input("请输入需要分析的公司名称: ").strip()
     
     if not company_name:
         print("未提供公司名称，程序退出。")
         sys.exit(1)
     
     try:
-        analyze_company(company_name)
+        analyze_company(company_name, method=args.method, compare=args.compare)
     except Exception as exc:
         print(f"计算失败: {exc}")
         sys.exit(1)
@@ -0,0 +1,50 @@
+"""
+qcc_nested 穿透爬取的单元测试：用内存中的股权图替换页面抓取，不启动浏览器。
+"""
+
+from typing import Dict, List
+
+import qcc_nested
+from test_nested import ShareholderCalculator
+
+
+def test_dfs_recrawls_entity_reached_with_higher_stake(monkeypatch):
+    """
+    菱形结构：目标公司 → 甲公司(10%) / 乙公司(90%) → 丙公司 → 丁公司(50%)。
+    先经低比例路径到达丙公司时丁公司被剪枝，之后经高比例路径再次到达时应补穿透丁公司，
+    且丙公司只抓取一次。
+    """
+    def _holder(name, percentage, kind="entity"):
+        return {"name": name, "percentage": percentage, "type": kind}
+
+    graph = {
+        "目标公司": [_holder("甲公司", 10.0), _holder("乙公司", 90.0)],
+        "甲公司": [_holder("丙公司", 100.0)],
+        "乙公司": [_holder("丙公司", 100.0)],
+        "丙公司": [_holder("丁公司", 50.0), _holder("张三", 50.0, "natural")],
+        "丁公司": [_holder("李四", 100.0, "natural")],
+    }
+    fetched: List[str] = []
+
+    def _fake_fetch(driver, company_name, fetch_mode=None, session=None):
+        fetched.append(company_name)
+        return None, None, graph[company_name]
+
+    monkeypatch.setattr(qcc_nested, "_fetch_node", _fake_fetch)
+    monkeypatch.setattr(qcc_nested, "polite_pause", lambda *args, **kwargs: 0.0)
+
+    pruned: Dict[str, Dict] = {}
+    result = qcc_nested._collect_shareholder_structure(
+        None, "目标公司", min_effective_stake=8.0, pruned=pruned
+    )
+
+    assert result["entity_structure"]["丁公司"] == {"李四": 100.0}
+    assert "丁公司" not in pruned
+    assert fetched.count("丙公司") == 1
+
+    calculator = ShareholderCalculator()
+    for name, percentage in result["direct_shareholders"].items():
+        calculator.add_direct_shareholder(name, percentage)
+    for entity, holders in result["entity_structure"].items():
+        calculator.set_entity_structure(entity, holders)
+    assert round(calculator.calculate_ultimate_ownership()["李四"], 4) == 50.0
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+所有爬虫记录的 SQLite 后端（storage_utils 的可选存储）
+
+- records：每条 (公司文件, item, name) 一行，payload 为原始 JSON；
+- persons / entities：从记录中抽取的自然人（法定代表人、股东、受益人、失信查询对象）与主体（股东企业）；
+- artifacts：截图等文件路径；
+- 跨公司查询不再需要逐个打开桌面上的 JSON，需要旧格式时按需导出。
+
+启用：设置环境变量 FOUNDERS_RECORD_BACKEND=sqlite，或 company_pipeline.py / batch_pipeline.py 加 --record-backend sqlite。
+
+命令行：
+    python record_db.py neris-hits                 # 有失信记录的查询对象
+    python record_db.py person 张三                # 某人出现在哪些公司、以什么身份
+    python record_db.py export 公司A [--out PATH]  # 导出旧版 公司名.json
+    python record_db.py import ~/Desktop          # 把已有的 JSON 文件导入数据库
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from storage_utils import load_records, write_records
+
+DEFAULT_DB_PATH = Path.home() / ".founders" / "records.sqlite3"
+
+ITEM_AMAC = "AMAC_证监会搜索"
+ITEM_QCC = "QCC_企查查公司查询"
+ITEM_NESTED = "nestedjudge_穿透计算"
+ITEM_NERIS = "CSRC_失信查询"
+ITEM_WENSHU = "WENSHU_裁判文书网搜索"
+
+# INSERT ... RETURNING 需要 SQLite 3.35+；更早的版本（ON CONFLICT 需要 3.24+）upsert 后再查一次 id
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    company TEXT NOT NULL,
+    json_path TEXT NOT NULL,
+    item TEXT,
+    name TEXT,
+    queried_at TEXT,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (json_path, item, name)
+);
+CREATE INDEX IF NOT EXISTS idx_records_item ON records (item);
+CREATE INDEX IF NOT EXISTS idx_records_name ON records (name);
+CREATE INDEX IF NOT EXISTS idx_records_queried_at ON records (queried_at);
+CREATE INDEX IF NOT EXISTS idx_records_company ON records (company);
+
+CREATE TABLE IF NOT EXISTS persons (
+    record_id INTEGER NOT NULL REFERENCES records (id) ON DELETE CASCADE,
+    company TEXT NOT NULL,
+    name TEXT NOT NULL,
+    role TEXT NOT NULL,
+    percentage REAL
+);
+CREATE INDEX IF NOT EXISTS idx_persons_name ON persons (name);
+CREATE INDEX IF NOT EXISTS idx_persons_record ON persons (record_id);
+
+CREATE TABLE IF NOT EXISTS entities (
+    record_id INTEGER NOT NULL REFERENCES records (id) ON DELETE CASCADE,
+    company TEXT NOT NULL,
+    name TEXT NOT NULL,
+    role TEXT NOT NULL,
+    percentage REAL
+);
+CREATE INDEX IF NOT EXISTS idx_entities_name ON entities (name);
+CREATE INDEX IF NOT EXISTS idx_entities_record ON entities (record_id);
+
+CREATE TABLE IF NOT EXISTS artifacts (
+    record_id INTEGER NOT NULL REFERENCES records (id) ON DELETE CASCADE,
+    company TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_record ON artifacts (record_id);
+"""
+
+
+def _company_of(json_path: Path) -> str:
+    # 各脚本的文件都是 <目录>/<公司名或查询词>.json
+    return json_path.stem
+
+
+def _extract_links(record: Dict[str, Any]) -> Tuple[List[Tuple], List[Tuple], List[Tuple]]:
+    """从记录中抽取 (persons, entities, artifacts)，每项为 (name, role, percentage) / (kind, path)。"""
+    persons: List[Tuple[str, str, Optional[float]]] = []
+    entities: List[Tuple[str, str, Optional[float]]] = []
+    artifacts: List[Tuple[str, str]] = []
+    item = record.get("item")
+    name = record.get("name")
+    data = record.get("data") if isinstance(record.get("data"), dict) else {}
+
+    if item == ITEM_NERIS and name:
+        persons.append((name, "neris_subject", None))
+    elif item in (ITEM_AMAC, ITEM_QCC) and name:
+        entities.append((name, "subject", None))
+    if item == ITEM_QCC:
+        if data.get("legal_representative"):
+            persons.append((data["legal_representative"], "legal_representative", None))
+        for entry in data.get("shareholders") or []:
+            if not isinstance(entry, dict) or not entry.get("name"):
+                continue
+            target = persons if entry.get("type") == "natural" else entities
+            target.append((entry["name"], "shareholder", entry.get("percentage")))
+    elif item == ITEM_NESTED:
+        for entry in data.get("major_shareholders") or []:
+            persons.append((entry.get("name"), "beneficial_owner", entry.get("percentage")))
+        for entry in data.get("ultimate_shareholders") or []:
+            persons.append((entry.get("name"), "ultimate_shareholder", entry.get("percentage")))
+
+    if record.get("screenshot"):
+        artifacts.append(("screenshot", str(record["screenshot"])))
+    persons = [entry for entry in persons if entry[0]]
+    return persons, entities, artifacts
+
+
+class SqliteRecordBackend:
+    """storage_utils 的 SQLite 存储后端：upsert 直接落库，JSON 只在 export_json 时生成。"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str | Path = DEFAULT_DB_PATH):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # 每次操作单独连接：可在多线程/多进程间共享同一个数据库文件；
+        # 块正常结束时提交、出错时回滚，随后关闭连接
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA foreign_keys=ON")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _upsert_record(conn: sqlite3.Connection, params: Tuple) -> int:
+        """插入或更新一条记录，返回其 id。"""
+        sql = (
+            "INSERT INTO records (company, json_path, item, name, queried_at, payload, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (json_path, item, name) DO UPDATE SET"
+            " queried_at = excluded.queried_at, payload = excluded.payload, updated_at = excluded.updated_at"
+        )
+        if _HAS_RETURNING:
+            return conn.execute(sql + " RETURNING id", params).fetchone()[0]
+        conn.execute(sql, params)
+        _, json_path, item, name = params[:4]
+        return conn.execute(
+            "SELECT id FROM records WHERE json_path = ? AND item IS ? AND name IS ? ORDER BY id DESC LIMIT 1",
+            (json_path, item, name),
+        ).fetchone()[0]
+
+    def upsert_many(
+        self,
+        json_path: str | Path,
+        records: Iterable[Dict[str, Any]],
+        key_fields: Sequence[str] = ("item", "name"),
+    ) -> None:
+        if tuple(key_fields) != ("item", "name"):
+            raise ValueError("SQLite 后端只支持以 (item, name) 为唯一键")
+        path = Path(json_path).expanduser().resolve()
+        company = _company_of(path)
+        now = time.time()
+        with self._connect() as conn:
+            for record in records:
+                record_id = self._upsert_record(
+                    conn,
+                    (
+                        company,
+                        str(path),
+                        record.get("item"),
+                        record.get("name"),
+                        record.get("queried_at"),
+                        json.dumps(record, ensure_ascii=False),
+                        now,
+                    ),
+                )
+                for table in ("persons", "entities", "artifacts"):
+                    conn.execute(f"DELETE FROM {table} WHERE record_id = ?", (record_id,))
+                persons, entities, artifacts = _extract_links(record)
+                conn.executemany(
+                    "INSERT INTO persons (record_id, company, name, role, percentage) VALUES (?, ?, ?, ?, ?)",
+                    [(record_id, company, *entry) for entry in persons],
+                )
+                conn.executemany(
+                    "INSERT INTO entities (record_id, company, name, role, percentage) VALUES (?, ?, ?, ?, ?)",
+                    [(record_id, company, *entry) for entry in entities],
+                )
+                conn.executemany(
+                    "INSERT INTO artifacts (record_id, company, kind, path) VALUES (?, ?, ?, ?)",
+                    [(record_id, company, *entry) for entry in artifacts],
+                )
+
+    def flush(self) -> None:
+        # 每次 upsert 已提交事务
+        pass
+
+    def load(self, json_path: str | Path) -> List[Dict[str, Any]]:
+        path = Path(json_path).expanduser().resolve()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT payload FROM records WHERE json_path = ? ORDER BY id", (str(path),)
+            ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def export_json(self, company: str, json_path: Optional[str | Path] = None) -> List[Path]:
+        """把某公司的记录导出为旧版 JSON；未指定路径时写回记录原来的文件位置。"""
+        with self._connect() as conn:
+            paths = [row[0] for row in conn.execute(
+                "SELECT DISTINCT json_path FROM records WHERE company = ? ORDER BY json_path", (company,)
+            )]
+        written = []
+        for source in paths:
+            target = Path(json_path) if json_path and len(paths) == 1 else Path(source)
+            write_records(target, self.load(source))
+            written.append(target)
+        return written
+
+    def query_records(
+        self,
+        item: Optional[str] = None,
+        name: Optional[str] = None,
+        company: Optional[str] = None,
+        since: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """按 item / name / company / queried_at 下限筛选，返回原始记录（附带 company 字段）。"""
+        clauses, params = [], []
+        for column, value in (("item", item), ("name", name), ("company", company)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("queried_at >= ?")
+            params.append(since)
+        sql = "SELECT company, payload FROM records"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY queried_at DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [{"company": company_name, **json.loads(payload)} for company_name, payload in rows]
+
+    def neris_hits(self) -> List[Dict[str, Any]]:
+        """NERIS 查询结果为有失信记录的对象。"""
+        return [record for record in self.query_records(item=ITEM_NERIS) if record.get("has_issue")]
+
+    def find_person(self, name: str) -> List[Dict[str, Any]]:
+        """某个自然人在各公司记录中的身份（法定代表人、股东、受益人、失信查询对象）。"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT p.company, p.role, p.percentage, r.item, r.queried_at"
+                " FROM persons p JOIN records r ON r.id = p.record_id"
+                " WHERE p.name = ? ORDER BY r.queried_at DESC",
+                (name,),
+            ).fetchall()
+        keys = ("company", "role", "percentage", "item", "queried_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def find_entity(self, name: str) -> List[Dict[str, Any]]:
+        """某个主体在哪些公司中作为股东出现。"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT e.company, e.role, e.percentage, r.queried_at"
+                " FROM entities e JOIN records r ON r.id = e.record_id"
+                " WHERE e.name = ? ORDER BY r.queried_at DESC",
+                (name,),
+            ).fetchall()
+        keys = ("company", "role", "percentage", "queried_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def import_json_tree(self, root: str | Path) -> int:
+        """导入 root 下所有 <目录>/<目录名>.json 旧文件，返回导入的记录数。"""
+        count = 0
+        for json_path in sorted(Path(root).expanduser().glob("*/*.json")):
+            if json_path.stem != json_path.parent.name:
+                continue
+            records = [record for record in load_records(json_path) if isinstance(record, dict)]
+            if records:
+                self.upsert_many(json_path, records)
+                count += len(records)
+        return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="爬虫记录 SQLite 数据库查询与导出")
+    parser.add_argument("--path", default=str(DEFAULT_DB_PATH), help="数据库文件路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("neris-hits", help="列出有失信记录的查询对象")
+    person_parser = subparsers.add_parser("person", help="查询某人在各公司中的身份")
+    person_parser.add_argument("name")
+    entity_parser = subparsers.add_parser("entity", help="查询某主体在哪些公司中作为股东出现")
+    entity_parser.add_argument("name")
+    export_parser = subparsers.add_parser("export", help="导出某公司的旧版 JSON")
+    export_parser.add_argument("company")
+    export_parser.add_argument("--out", help="导出路径（默认写回原位置）")
+    import_parser = subparsers.add_parser("import", help="导入已有的 JSON 文件")
+    import_parser.add_argument("root", help="包含 <公司名>/<公司名>.json 的目录，如 ~/Desktop")
+    args = parser.parse_args()
+
+    backend = SqliteRecordBackend(args.path)
+    if args.command == "neris-hits":
+        hits = backend.neris_hits()
+        for record in hits:
+            print(f"  {record.get('name')}（{record['company']}）{record.get('queried_at', '')}  {record.get('screenshot') or ''}")
+        print(f"共 {len(hits)} 条")
+    elif args.command == "person":
+        rows = backend.find_person(args.name)
+        for row in rows:
+            ratio = f" {row['percentage']:.2f}%" if row["percentage"] is not None else ""
+            print(f"  {row['company']}: {row['role']}{ratio}（{row['item']}，{row['queried_at']}）")
+        print(f"共 {len(rows)} 条")
+    elif args.command == "entity":
+        rows = backend.find_entity(args.name)
+        for row in rows:
+            ratio = f" {row['percentage']:.2f}%" if row["percentage"] is not None else ""
+            print(f"  {row['company']}: {row['role']}{ratio}（{row['queried_at']}）")
+        print(f"共 {len(rows)} 条")
+    elif args.command == "export":
+        written = backend.export_json(args.company, args.out)
+        if not written:
+            print(f"数据库中没有 {args.company} 的记录")
+            sys.exit(1)
+        for path in written:
+            print(f"已导出：{path}")
+    elif args.command == "import":
+        print(f"已导入 {backend.import_json_tree(args.root)} 条记录")
+
+
+if __name__ == "__main__":
+    main()
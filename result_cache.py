@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按 (来源, 查询词) 缓存各爬虫的查询结果（SQLite，~/.founders/results.sqlite3）
+
+- 每个来源有自己的有效期：AMAC、企查查 7 天，NERIS、文书网 1 天，可用 configure() 调整；
+- 缓存内容是查询的返回值，以及查询期间经 save_record 写出的记录；命中时把这些记录写进
+  当前公司的 JSON，并标注 fetched_from="cache"（实际抓取的记录为 "live"），
+  记录里的截图按 screenshot_sha256 从 artifact_store 硬链接到当前公司文件夹；
+- 同一位法定代表人出现在多只基金里时，一天内只查询一次；
+- 一键流程与批量流程的 --refresh 跳过缓存读取（结果仍会写回缓存）；
+- 批量流程运行在 batch_scope() 中：同一批次里每个 (来源, 查询词) 只解析一次，并发的公司等待
+  第一次查询的结果，共享其记录与截图（fetched_from="batch"），即使加了 --refresh 也不会重复查询；
+- 命令行可手动失效：
+    python result_cache.py invalidate neris 张三 李四
+    python result_cache.py invalidate --all
+    python result_cache.py list
+    python result_cache.py purge
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from artifact_store import get_artifact_store
+from artifact_writer import flush_artifacts
+from storage_utils import capture_records, upsert_many
+from tracing import OUTCOME_ERROR, span
+
+DEFAULT_CACHE_PATH = Path.home() / ".founders" / "results.sqlite3"
+
+SOURCE_AMAC = "amac"
+SOURCE_QCC = "qcc"
+SOURCE_NERIS = "neris"
+SOURCE_WENSHU = "wenshu"
+
+DAY_SECONDS = 24 * 3600
+DEFAULT_TTL_SECONDS = {
+    SOURCE_AMAC: 7 * DAY_SECONDS,
+    SOURCE_QCC: 7 * DAY_SECONDS,
+    SOURCE_NERIS: 1 * DAY_SECONDS,
+    SOURCE_WENSHU: 1 * DAY_SECONDS,
+}
+
+FETCHED_LIVE = "live"
+FETCHED_CACHE = "cache"
+FETCHED_BATCH = "batch"
+
+_SCREENSHOT_KEYS = ("screenshot", "screenshot_path")
+
+
+def normalize_query(query: str) -> str:
+    """去除空白并统一全/半角括号，与 shareholder_cache 的主体名规范化一致。"""
+    text = (query or "").strip()
+    text = text.replace("（", "(").replace("）", ")")
+    return "".join(text.split())
+
+
+def _query_key(query: str, variant: Optional[Dict[str, Any]] = None) -> str:
+    key = normalize_query(query)
+    if key and variant:
+        # 影响结果的查询参数（如文书网解析页数、企查查穿透深度）一并计入键
+        key += "|" + json.dumps(variant, ensure_ascii=False, sort_keys=True)
+    return key
+
+
+class ResultCache:
+    def __init__(self, path: str | Path = DEFAULT_CACHE_PATH, ttl_seconds: Optional[Dict[str, float]] = None):
+        self.path = Path(path)
+        self.ttl_seconds = dict(DEFAULT_TTL_SECONDS)
+        self.ttl_seconds.update(ttl_seconds or {})
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lookup_results ("
+                " source TEXT NOT NULL,"
+                " query_key TEXT NOT NULL,"
+                " query TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (source, query_key))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每次操作单独连接：批量模式的多个线程/进程共享同一个缓存文件
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _expired(self, source: str, fetched_at: float, now: Optional[float] = None) -> bool:
+        ttl = self.ttl_seconds.get(source)
+        return ttl is not None and (now or time.time()) - fetched_at > ttl
+
+    def get(self, source: str, query: str, variant: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """返回未过期的缓存（result / records / fetched_at），否则返回 None。"""
+        key = _query_key(query, variant)
+        if not key:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload, fetched_at FROM lookup_results WHERE source = ? AND query_key = ?", (source, key)
+            ).fetchone()
+        if row is None:
+            return None
+        payload, fetched_at = row
+        if self._expired(source, fetched_at):
+            return None
+        try:
+            entry = json.loads(payload)
+        except ValueError:
+            return None
+        entry["fetched_at"] = fetched_at
+        return entry
+
+    def put(
+        self,
+        source: str,
+        query: str,
+        result: Any,
+        records: Sequence[Dict[str, Any]] = (),
+        variant: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        key = _query_key(query, variant)
+        if not key:
+            return
+        payload = json.dumps({"result": result, "records": list(records)}, ensure_ascii=False)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO lookup_results (source, query_key, query, payload, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (source, key, query.strip(), payload, time.time()),
+            )
+
+    def invalidate(self, source: Optional[str], queries: Sequence[str]) -> int:
+        names = [normalize_query(query) for query in queries if normalize_query(query)]
+        if not names:
+            return 0
+        # 带 variant 的键以 "查询词|" 开头，一并删除
+        clause = "(query_key = ? OR query_key LIKE ? ESCAPE '\\')"
+        params: List[Any] = []
+        conditions = []
+        for name in names:
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append(clause)
+            params.extend([name, escaped + "|%"])
+        sql = f"DELETE FROM lookup_results WHERE ({' OR '.join(conditions)})"
+        if source:
+            sql += " AND source = ?"
+            params.append(source)
+        with self._connect() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def clear(self, source: Optional[str] = None) -> int:
+        with self._connect() as conn:
+            if source:
+                return conn.execute("DELETE FROM lookup_results WHERE source = ?", (source,)).rowcount
+            return conn.execute("DELETE FROM lookup_results").rowcount
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT source, query_key, fetched_at FROM lookup_results").fetchall()
+            expired = [(source, key) for source, key, fetched_at in rows if self._expired(source, fetched_at, now)]
+            conn.executemany("DELETE FROM lookup_results WHERE source = ? AND query_key = ?", expired)
+        return len(expired)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT source, query, fetched_at FROM lookup_results ORDER BY source, fetched_at DESC"
+            ).fetchall()
+        now = time.time()
+        return [
+            {
+                "source": source,
+                "query": query,
+                "age_hours": round((now - fetched_at) / 3600, 1),
+                "expired": self._expired(source, fetched_at, now),
+            }
+            for source, query, fetched_at in rows
+        ]
+
+
+_CACHE: Optional[ResultCache] = None
+_REFRESH = False
+_TTL_OVERRIDES: Dict[str, float] = {}
+
+
+def configure(refresh: bool = False, ttl_seconds: Optional[Dict[str, float]] = None) -> None:
+    """refresh=True 时不读缓存、总是实际查询；ttl_seconds 覆盖部分来源的有效期。"""
+    global _REFRESH, _CACHE
+    _REFRESH = bool(refresh)
+    if ttl_seconds:
+        _TTL_OVERRIDES.update(ttl_seconds)
+        _CACHE = None
+
+
+def get_result_cache() -> ResultCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ResultCache(ttl_seconds=_TTL_OVERRIDES)
+    return _CACHE
+
+
+def _relocate_screenshots(entry: Dict[str, Any], folder: Path) -> bool:
+    """把 entry 中按内容存储的截图硬链接到 folder 并改写路径；存储中缺少文件时返回 False。"""
+    digest = entry.get("screenshot_sha256")
+    if not digest:
+        return True
+    store = get_artifact_store()
+    for key in _SCREENSHOT_KEYS:
+        path = entry.get(key)
+        if not path:
+            continue
+        path = Path(path)
+        stored = store.lookup(digest, path.suffix)
+        if stored is None:
+            # 截图可能仍在后台写入（写往原公司文件夹中的这一张）
+            flush_artifacts(under=path)
+            stored = store.lookup(digest, path.suffix)
+            if stored is None:
+                return False
+        dest = folder / path.name
+        store.materialize(stored, dest)
+        entry[key] = str(dest)
+    return True
+
+
+def _replay(entry: Dict[str, Any], json_path: Path, fetched_from: str = FETCHED_CACHE) -> Any:
+    """把缓存的记录写进 json_path；截图缺失时返回 None（视为未命中）。"""
+    folder = json_path.parent
+    entry = copy.deepcopy(entry)
+    records = [dict(record, fetched_from=fetched_from) for record in entry.get("records") or []]
+    result = entry.get("result")
+    entries = records + ([result] if isinstance(result, dict) else [])
+    if not all(_relocate_screenshots(item, folder) for item in entries):
+        return None
+    if records:
+        upsert_many(json_path, records)
+    return result
+
+
+class LookupRegistry:
+    """
+    批次范围的单飞登记：同一 (来源, 查询键) 只由第一个调用者执行，其余调用者等待并共享结果。
+    执行失败（结果为空）时不登记，等待中的调用者之一接手重新查询。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self.resolved = 0
+        self.shared = 0
+
+    def resolve(
+        self,
+        source: str,
+        key: str,
+        compute: Callable[[], Tuple[Any, Optional[Dict[str, Any]]]],
+        json_path: Path,
+        trace_args: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        """compute() 返回 (结果, 可共享的缓存条目)；共享方把条目中的记录与截图写进自己的 json_path。"""
+        while True:
+            with self._lock:
+                future = self._inflight.get((source, key))
+                leader = future is None
+                if leader:
+                    future = self._inflight[(source, key)] = Future()
+            if leader:
+                entry = None
+                try:
+                    result, entry = compute()
+                finally:
+                    if entry is None:
+                        with self._lock:
+                            del self._inflight[(source, key)]
+                    future.set_result(entry)
+                if entry is not None:
+                    with self._lock:
+                        self.resolved += 1
+                return result
+            entry = future.result()
+            if entry is None:
+                continue
+            result = _replay(entry, json_path, fetched_from=FETCHED_BATCH)
+            if result is None:
+                return compute()[0]
+            with self._lock:
+                self.shared += 1
+            if trace_args is not None:
+                trace_args["fetched_from"] = FETCHED_BATCH
+            print(f"  ✓ [{source}] 共享本批次已有结果：{key.split('|', 1)[0]}")
+            return result
+
+    def summary(self) -> str:
+        return f"本批次共解析 {self.resolved} 个查询，{self.shared} 次直接共享已有结果"
+
+
+_ACTIVE_REGISTRY: Optional[LookupRegistry] = None
+
+
+@contextmanager
+def batch_scope() -> Iterator[LookupRegistry]:
+    """批次期间的 cached_lookup 经由同一个 LookupRegistry，跨公司的相同查询只执行一次。"""
+    global _ACTIVE_REGISTRY
+    previous, _ACTIVE_REGISTRY = _ACTIVE_REGISTRY, LookupRegistry()
+    try:
+        yield _ACTIVE_REGISTRY
+    finally:
+        _ACTIVE_REGISTRY = previous
+
+
+def _lookup(
+    source: str,
+    query: str,
+    fetch: Callable[[], Any],
+    json_path: Path,
+    variant: Optional[Dict[str, Any]],
+    trace_args: Dict[str, Any],
+) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    cache = get_result_cache()
+    if not _REFRESH:
+        entry = cache.get(source, query, variant)
+        if entry is not None:
+            result = _replay(entry, json_path)
+            if result is not None:
+                age_hours = (time.time() - entry["fetched_at"]) / 3600
+                print(f"  ✓ [{source}] 使用缓存结果：{query}（{age_hours:.1f} 小时前查询）")
+                trace_args["fetched_from"] = FETCHED_CACHE
+                return result, entry
+
+    trace_args["fetched_from"] = FETCHED_LIVE
+    with capture_records(fetched_from=FETCHED_LIVE) as records:
+        result = fetch()
+    if not result:
+        return result, None
+    entry = {"result": result, "records": records}
+    try:
+        cache.put(source, query, result, records, variant)
+    except (TypeError, ValueError) as exc:
+        print(f"  … [{source}] 结果无法缓存：{exc}")
+    return result, entry
+
+
+def cached_lookup(
+    source: str,
+    query: str,
+    fetch: Callable[[], Any],
+    json_path: str | Path,
+    variant: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """
+    先查缓存：命中时把缓存的记录写进 json_path 并返回缓存的结果；
+    否则调用 fetch()，其间写出的记录标注 fetched_from="live"，结果非空时写入缓存。
+    在 batch_scope() 中时，同一批次的相同查询只执行一次，其余调用共享结果。
+    开启 tracing 时整个查询记为一个 lookup 区间（args 含 query 与 fetched_from）。
+    """
+    json_path = Path(json_path)
+    registry = _ACTIVE_REGISTRY
+    key = _query_key(query, variant)
+    with span(source, "lookup", query=query) as trace_args:
+        if registry is None or not key:
+            result = _lookup(source, query, fetch, json_path, variant, trace_args)[0]
+        else:
+            result = registry.resolve(
+                source, key, lambda: _lookup(source, query, fetch, json_path, variant, trace_args), json_path, trace_args
+            )
+        if not result:
+            trace_args["outcome"] = OUTCOME_ERROR
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询结果缓存管理")
+    parser.add_argument("--path", default=str(DEFAULT_CACHE_PATH), help="缓存文件路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    invalidate_parser = subparsers.add_parser("invalidate", help="删除指定来源下某些查询（或全部）的缓存")
+    invalidate_parser.add_argument("source", nargs="?", choices=sorted(DEFAULT_TTL_SECONDS), help="来源")
+    invalidate_parser.add_argument("queries", nargs="*", help="查询词（公司名或人名）")
+    invalidate_parser.add_argument("--all", action="store_true", help="清空该来源（未指定来源时为全部）的缓存")
+    subparsers.add_parser("list", help="列出缓存条目")
+    subparsers.add_parser("purge", help="删除已过期的条目")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.path)
+    if args.command == "invalidate":
+        if args.all:
+            print(f"已清空缓存，共删除 {cache.clear(args.source)} 条")
+        elif args.queries:
+            print(f"已删除 {cache.invalidate(args.source, args.queries)} 条缓存")
+        else:
+            print("请指定查询词或使用 --all")
+            sys.exit(1)
+    elif args.command == "list":
+        entries = cache.entries()
+        for entry in entries:
+            flag = "（已过期）" if entry["expired"] else ""
+            print(f"  [{entry['source']}] {entry['query']}: {entry['age_hours']} 小时前{flag}")
+        print(f"共 {len(entries)} 条")
+    elif args.command == "purge":
+        print(f"已删除 {cache.purge_expired()} 条过期缓存")
+
+
+if __name__ == "__main__":
+    main()
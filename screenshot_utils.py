@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+全页截图：通过 Chrome DevTools 的 Page.captureScreenshot（captureBeyondViewport + clip）直接截取整页，
+不再调整窗口大小、等待重排，浏览器视窗保持不变，截图后可以继续在同一页面上爬取。
+
+- 输出格式由文件后缀决定：.png / .jpg(.jpeg) / .webp，后两者支持 quality（0-100）；
+- 默认格式与质量可用环境变量 FOUNDERS_SCREENSHOT_FORMAT（png/jpeg/webp）与
+  FOUNDERS_SCREENSHOT_QUALITY 调整，各爬虫用 screenshot_extension() 生成文件后缀；
+- CDP 不可用时（非 Chrome 驱动等）回退到 WebDriver 的视窗截图；
+- 爬虫线程只负责取回截图数据并计算 sha256，写盘交给 artifact_writer 的后台线程池，函数立即返回路径；
+  内容按哈希存入 artifact_store，公司文件夹中是硬链接，重复的截图不再占用额外空间。
+"""
+
+from __future__ import annotations
+
+import base64
+import math
+import os
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from artifact_store import digest_bytes
+from artifact_writer import write_artifact
+
+FORMAT_PNG = "png"
+FORMAT_JPEG = "jpeg"
+FORMAT_WEBP = "webp"
+FORMAT_EXTENSIONS = {FORMAT_PNG: ".png", FORMAT_JPEG: ".jpg", FORMAT_WEBP: ".webp"}
+_SUFFIX_FORMATS = {".png": FORMAT_PNG, ".jpg": FORMAT_JPEG, ".jpeg": FORMAT_JPEG, ".webp": FORMAT_WEBP}
+
+DEFAULT_FORMAT = os.environ.get("FOUNDERS_SCREENSHOT_FORMAT", FORMAT_PNG).lower()
+if DEFAULT_FORMAT not in FORMAT_EXTENSIONS:
+    DEFAULT_FORMAT = FORMAT_PNG
+DEFAULT_QUALITY = int(os.environ.get("FOUNDERS_SCREENSHOT_QUALITY", "80"))
+
+# 与原先调整窗口时的上限一致，避免超长页面生成过大的图片
+MAX_CAPTURE_WIDTH = 3840
+MAX_CAPTURE_HEIGHT = 21600
+
+
+def screenshot_extension(fmt: Optional[str] = None) -> str:
+    """截图文件后缀（含点），如 ".png"。"""
+    return FORMAT_EXTENSIONS.get((fmt or DEFAULT_FORMAT).lower(), ".png")
+
+
+def format_for_path(path: str | Path) -> str:
+    return _SUFFIX_FORMATS.get(Path(path).suffix.lower(), FORMAT_PNG)
+
+
+def page_content_size(driver) -> Tuple[int, int]:
+    """整页内容的 CSS 像素尺寸（一次 CDP 调用，代替原先的四次 execute_script）。"""
+    metrics = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})
+    content = metrics.get("cssContentSize") or metrics.get("contentSize") or {}
+    return int(math.ceil(content.get("width", 0))), int(math.ceil(content.get("height", 0)))
+
+
+def capture_full_page(
+    driver,
+    fmt: str = FORMAT_PNG,
+    quality: Optional[int] = None,
+    clip: Optional[Dict[str, float]] = None,
+) -> str:
+    """
+    返回 base64 编码的截图数据。clip 为 {"x", "y", "width", "height"}
+    （页面 CSS 像素，可选 "scale"），缺省时截取整页（宽高受 MAX_CAPTURE_* 限制）。
+    """
+    if clip is None:
+        width, height = page_content_size(driver)
+        clip = {
+            "x": 0,
+            "y": 0,
+            "width": max(1, min(width, MAX_CAPTURE_WIDTH)),
+            "height": max(1, min(height, MAX_CAPTURE_HEIGHT)),
+        }
+    params = {
+        "format": fmt,
+        "captureBeyondViewport": True,
+        "fromSurface": True,
+        "clip": {"scale": 1, **clip},
+    }
+    if fmt in (FORMAT_JPEG, FORMAT_WEBP):
+        params["quality"] = _quality(quality)
+    return driver.execute_cdp_cmd("Page.captureScreenshot", params)["data"]
+
+
+def _quality(quality: Optional[int]) -> int:
+    return int(DEFAULT_QUALITY if quality is None else quality)
+
+
+def _submit_capture(
+    driver,
+    filepath: str | Path,
+    quality: Optional[int],
+    clip: Optional[Dict[str, float]],
+) -> Tuple[Future, str]:
+    path = Path(filepath)
+    fmt = format_for_path(path)
+    try:
+        data = capture_full_page(driver, fmt, quality=quality, clip=clip)
+    except Exception as exc:
+        print(f"CDP 全页截图失败，改用当前视窗截图：{exc}")
+        data = driver.get_screenshot_as_base64()
+    # 解码和哈希都很快，放在本线程里做，记录里才能立即写上内容哈希
+    raw = base64.b64decode(data)
+    digest = digest_bytes(raw)
+    lossy_quality = _quality(quality) if fmt in (FORMAT_JPEG, FORMAT_WEBP) else None
+    return write_artifact(raw, path, quality=lossy_quality, digest=digest), digest
+
+
+def save_screenshot_artifact(
+    driver,
+    filepath: str | Path,
+    quality: Optional[int] = None,
+    clip: Optional[Dict[str, float]] = None,
+) -> Tuple[str, str]:
+    """截取整页，立即返回 (路径, sha256)；文件按内容存入 artifact_store 并在后台硬链接到 filepath。"""
+    _, digest = _submit_capture(driver, filepath, quality, clip)
+    return str(filepath), digest
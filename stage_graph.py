@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+流水线阶段的依赖图调度：每个阶段声明输入与输出，输入全部就绪即开始执行，互不依赖的阶段并行。
+
+- Stage 的 func 以输入名作为关键字参数调用；只有一个输出时返回值就是该输出，
+  多个输出时返回以输出名为键的 dict；
+- 必需阶段失败时，依赖它的阶段不再执行，其余分支照常跑完，最后抛出 StageFailed；
+  可选阶段失败只跳过其下游；
+- 运行结束后给出每个阶段的起止时间与关键路径（决定总耗时的那条依赖链）；
+  开启 tracing 时每个阶段记为一个 stage 区间，args 中的 graph 为图的标签（如公司名）。
+
+用法：
+    graph = StageGraph()
+    graph.add("amac", lambda: run_amac(name))
+    graph.add("nested", lambda: run_nested(name), outputs=("legal_rep", "owners"))
+    graph.add("people", lambda legal_rep, owners: lookup(legal_rep, owners), inputs=("legal_rep", "owners"))
+    result = graph.run()
+    print(result.format_critical_path())
+"""
+
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from tracing import span
+
+
+class StageFailed(RuntimeError):
+    """必需阶段执行失败；errors 为 {阶段名: 异常}。"""
+
+    def __init__(self, errors: Dict[str, BaseException], result: "StageRunResult"):
+        self.errors = errors
+        self.result = result
+        first_name, first_error = next(iter(errors.items()))
+        super().__init__(f"阶段 {first_name} 失败：{first_error}")
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        inputs: Sequence[str] = (),
+        outputs: Optional[Sequence[str]] = None,
+        required: bool = True,
+    ):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs) if outputs else (name,)
+        self.required = required
+
+
+class StageRunResult:
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+        self.spans: Dict[str, Tuple[float, float]] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.skipped: List[str] = []
+        self.critical_path: List[str] = []
+
+    def duration(self, name: str) -> float:
+        start, end = self.spans[name]
+        return end - start
+
+    def timings(self) -> Dict[str, float]:
+        return {name: self.duration(name) for name in self.spans}
+
+    def format_critical_path(self) -> str:
+        if not self.critical_path:
+            return "（无）"
+        parts = [f"{name}({self.duration(name):.1f}s)" for name in self.critical_path]
+        return " → ".join(parts)
+
+
+class StageGraph:
+    def __init__(self, label: Optional[str] = None):
+        self.label = label
+        self._stages: Dict[str, Stage] = {}
+        self._producers: Dict[str, str] = {}
+
+    def add(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        inputs: Sequence[str] = (),
+        outputs: Optional[Sequence[str]] = None,
+        required: bool = True,
+    ) -> Stage:
+        if name in self._stages:
+            raise ValueError(f"重复的阶段名：{name}")
+        stage = Stage(name, func, inputs, outputs, required)
+        for output in stage.outputs:
+            if output in self._producers:
+                raise ValueError(f"输出 {output} 已由阶段 {self._producers[output]} 提供")
+            self._producers[output] = name
+        self._stages[name] = stage
+        return stage
+
+    def dependencies(self, name: str) -> List[str]:
+        return sorted({self._producers[item] for item in self._stages[name].inputs})
+
+    def _validate(self) -> None:
+        for stage in self._stages.values():
+            missing = [item for item in stage.inputs if item not in self._producers]
+            if missing:
+                raise ValueError(f"阶段 {stage.name} 的输入没有提供者：{missing}")
+        # 拓扑排序检查环
+        remaining = {name: set(self.dependencies(name)) for name in self._stages}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"阶段之间存在循环依赖：{sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    def run(
+        self,
+        max_workers: Optional[int] = None,
+        on_stage_done: Optional[Callable[[str, Optional[BaseException]], None]] = None,
+    ) -> StageRunResult:
+        """
+        执行整张图。on_stage_done(name, error) 在调度线程中于每个阶段结束后调用（如刷新写缓冲）。
+        必需阶段失败时抛出 StageFailed（此时其余分支已执行完毕）。
+        """
+        self._validate()
+        result = StageRunResult()
+        pending = dict(self._stages)
+        running: Dict[Future, str] = {}
+        origin = time.perf_counter()
+        workers = max_workers or max(1, len(self._stages))
+
+        def _blocked(stage: Stage) -> bool:
+            return any(dep in result.errors or dep in result.skipped for dep in self.dependencies(stage.name))
+
+        def _ready(stage: Stage) -> bool:
+            return all(item in result.values for item in stage.inputs)
+
+        def _call(stage: Stage):
+            start = time.perf_counter()
+            try:
+                with span(stage.name, "stage", graph=self.label):
+                    return stage.func(**{item: result.values[item] for item in stage.inputs})
+            finally:
+                result.spans[stage.name] = (start - origin, time.perf_counter() - origin)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stage") as executor:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if _blocked(stage):
+                        result.skipped.append(name)
+                        del pending[name]
+                    elif _ready(stage):
+                        running[executor.submit(_call, stage)] = name
+                        del pending[name]
+                if not running:
+                    # 剩余阶段都被失败的上游阻塞，下一轮循环会把它们标记为跳过
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    stage = self._stages[name]
+                    error = future.exception()
+                    if error is None:
+                        value = future.result()
+                        if len(stage.outputs) == 1:
+                            result.values[stage.outputs[0]] = value
+                        else:
+                            for output in stage.outputs:
+                                result.values[output] = (value or {}).get(output)
+                    else:
+                        result.errors[name] = error
+                    if on_stage_done is not None:
+                        on_stage_done(name, error)
+
+        result.critical_path = self._critical_path(result)
+        failed = {name: error for name, error in result.errors.items() if self._stages[name].required}
+        if failed:
+            raise StageFailed(failed, result)
+        return result
+
+    def _critical_path(self, result: StageRunResult) -> List[str]:
+        """从最晚结束的阶段出发，每次回溯到最晚结束的上游阶段（即它实际在等待的那个）。"""
+        if not result.spans:
+            return []
+        current = max(result.spans, key=lambda name: result.spans[name][1])
+        path = [current]
+        while True:
+            deps = [dep for dep in self.dependencies(current) if dep in result.spans]
+            if not deps:
+                break
+            current = max(deps, key=lambda name: result.spans[name][1])
+            path.append(current)
+        path.reverse()
+        return path
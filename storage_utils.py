@@ -1,11 +1,96 @@
 # json 覆盖写入
+#
+# save_record 经由 RecordStore：内存中按 (item, name) 建索引，每次更新只追加一行到
+# <公司名>.json.journal.jsonl，后台合并（防抖）后再整体写回原有的 JSON 布局，进程退出时强制合并。
+# 追加日志与合并都持有 <公司名>.json.lock 上的跨进程文件锁，JSON 通过临时文件 + os.replace 原子替换。
+# 存储后端可替换：默认 JSON（上述 RecordStore），FOUNDERS_RECORD_BACKEND=sqlite 时改写 record_db 的 SQLite 库。
 
 from __future__ import annotations
 
+import atexit
 import json
+import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, List, Dict, Any, Sequence
+from typing import IO, Iterable, Iterator, List, Dict, Any, Optional, Sequence, Set, Tuple
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+BACKEND_JSON = "json"
+BACKEND_SQLITE = "sqlite"
+RECORD_BACKENDS = (BACKEND_JSON, BACKEND_SQLITE)
+BACKEND_ENV_VAR = "FOUNDERS_RECORD_BACKEND"
+
+JOURNAL_SUFFIX = ".journal.jsonl"
+LOCK_SUFFIX = ".lock"
+DEFAULT_COMPACT_DELAY = 2.0
+
+
+@contextmanager
+def file_lock(json_path: str | Path) -> Iterator[None]:
+    """
+    跨进程排他锁（锁文件为 <json_path>.lock）。每次调用各自打开锁文件，
+    因此同一进程的不同线程之间同样互斥。
+    """
+    path = Path(json_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock_path = path.with_name(path.name + LOCK_SUFFIX)
+    with lock_path.open("a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK 重试约 10 秒后仍拿不到锁会抛错，继续等待
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def try_lock_file(lock_path: str | Path) -> Optional[IO[bytes]]:
+    """
+    非阻塞地获取 lock_path 上的排他锁，成功返回需一直持有的文件句柄（关闭即释放），
+    已被其他进程或线程持有时返回 None。
+    """
+    path = Path(lock_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle = path.open("a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def unlock_file(handle: IO[bytes]) -> None:
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        handle.close()
 
 def load_records(json_path: str | Path) -> List[Dict[str, Any]]:
     path = Path(json_path)
@@ -44,7 +129,399 @@ def upsert_record(
 
 
 def write_records(json_path: str | Path, records: Iterable[Dict[str, Any]]) -> None:
+    """先写同目录临时文件并 fsync，再 os.replace 原子替换；读取方不会看到写了一半的 JSON。"""
     path = Path(json_path)
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as f:
-        json.dump(list(records), f, indent=2, ensure_ascii=False)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(list(records), f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _journal_path(path: Path) -> Path:
+    return path.with_name(path.name + JOURNAL_SUFFIX)
+
+
+class RecordStore:
+    """
+    单个 JSON 文件的记录存储。
+
+    - 打开时读取 JSON 并重放上次未合并的日志（进程崩溃时日志中的更新不会丢）；
+    - upsert 只更新内存索引并向日志追加一行，耗时与记录总数无关；
+    - 最后一次更新 compact_delay 秒后由后台线程把全部记录写回 JSON 并清空日志，
+      已有的读取方（test_nested、人工查看）看到的仍是原来的列表格式；
+    - 追加与合并都持有跨进程文件锁。合并时以磁盘上的 JSON 为底、按顺序重放日志
+      （包括其他进程追加的行），因此多个进程写同一家公司也不会互相覆盖。
+      其他进程的更新在合并后才会出现在本进程的内存索引里。
+    """
+
+    def __init__(
+        self,
+        json_path: str | Path,
+        key_fields: Sequence[str] = ("item", "name"),
+        compact_delay: float = DEFAULT_COMPACT_DELAY,
+    ):
+        self.path = Path(json_path)
+        self.journal_path = _journal_path(self.path)
+        self.key_fields = tuple(key_fields)
+        self.compact_delay = compact_delay
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._records: List[Dict[str, Any]] = []
+        self._index: Dict[Tuple, int] = {}
+        self._dirty = False
+        with file_lock(self.path):
+            for record in load_records(self.path):
+                self._apply(record)
+            replayed = self._replay_journal()
+        if replayed:
+            print(f"读取到 {replayed} 条尚未合并的日志记录：{self.journal_path}")
+            self._dirty = True
+
+    def _key(self, record: Dict[str, Any]) -> Tuple:
+        return tuple(record.get(field) for field in self.key_fields)
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        key = self._key(record)
+        position = self._index.get(key)
+        if position is None:
+            self._index[key] = len(self._records)
+            self._records.append(record)
+        else:
+            self._records[position] = record
+
+    def _replay_journal(self) -> int:
+        if not self.journal_path.exists():
+            return 0
+        count = 0
+        with self.journal_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半
+                    continue
+                self._apply(record)
+                count += 1
+        return count
+
+    def _append_journal(self, records: Sequence[Dict[str, Any]]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.journal_path.open("a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _schedule_compaction(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.compact_delay, self.compact)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        self.upsert_many([record])
+
+    def upsert_many(self, records: Sequence[Dict[str, Any]]) -> None:
+        records = list(records)
+        if not records:
+            return
+        with self._lock:
+            with file_lock(self.path):
+                self._append_journal(records)
+            for record in records:
+                self._apply(record)
+            self._dirty = True
+            self._schedule_compaction()
+
+    def get(self, *key: Any) -> Optional[Dict[str, Any]]:
+        """按 key_fields 的取值查找记录，如 store.get("CSRC_失信查询", "张三")。"""
+        with self._lock:
+            position = self._index.get(tuple(key))
+            return None if position is None else self._records[position]
+
+    def records(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._records)
+
+    def compact(self) -> None:
+        """在文件锁内重新读取 JSON、重放日志，原子写回并清空日志，同时刷新内存索引。"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty and not self.journal_path.exists():
+                return
+            with file_lock(self.path):
+                self._records, self._index = [], {}
+                for record in load_records(self.path):
+                    self._apply(record)
+                self._replay_journal()
+                write_records(self.path, self._records)
+                self.journal_path.unlink(missing_ok=True)
+            self._dirty = False
+
+    flush = compact
+
+
+_STORES: Dict[str, RecordStore] = {}
+_STORES_GUARD = threading.Lock()
+
+
+def get_store(json_path: str | Path, key_fields: Sequence[str] = ("item", "name")) -> RecordStore:
+    """同一进程内同一文件共用一个 RecordStore。"""
+    path = Path(json_path)
+    key = str(path.expanduser().resolve())
+    with _STORES_GUARD:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = RecordStore(path, key_fields)
+        return store
+
+
+def flush_all() -> None:
+    """立即合并所有打开过的 RecordStore（进程退出时自动调用）。"""
+    with _STORES_GUARD:
+        stores = list(_STORES.values())
+    for store in stores:
+        try:
+            store.compact()
+        except Exception as exc:
+            print(f"合并记录文件失败 {store.path}: {exc}")
+
+
+atexit.register(flush_all)
+
+
+class JsonRecordBackend:
+    """默认后端：每家公司一个 JSON 文件（经由 RecordStore）。"""
+
+    name = BACKEND_JSON
+
+    def upsert_many(
+        self,
+        json_path: str | Path,
+        records: Iterable[Dict[str, Any]],
+        key_fields: Sequence[str] = ("item", "name"),
+    ) -> None:
+        get_store(json_path, key_fields).upsert_many(list(records))
+
+    def load(self, json_path: str | Path) -> List[Dict[str, Any]]:
+        return get_store(json_path).records()
+
+    def flush(self) -> None:
+        flush_all()
+
+
+_BACKEND = None
+_BACKEND_GUARD = threading.Lock()
+
+
+def create_record_backend(name: str, **kwargs: Any):
+    """按名称创建存储后端（json / sqlite），sqlite 的 kwargs 如 path 传给 record_db.SqliteRecordBackend。"""
+    if name == BACKEND_JSON:
+        return JsonRecordBackend()
+    if name == BACKEND_SQLITE:
+        from record_db import SqliteRecordBackend
+        return SqliteRecordBackend(**kwargs)
+    raise ValueError(f"未知的存储后端: {name}，可选 {RECORD_BACKENDS}")
+
+
+def set_record_backend(backend) -> None:
+    """替换全局存储后端；backend 需实现 upsert_many(json_path, records, key_fields)、load(json_path)、flush()。"""
+    global _BACKEND
+    with _BACKEND_GUARD:
+        _BACKEND = backend
+
+
+def get_record_backend():
+    """当前存储后端；未设置时按环境变量 FOUNDERS_RECORD_BACKEND 创建，默认 JSON。"""
+    global _BACKEND
+    with _BACKEND_GUARD:
+        if _BACKEND is None:
+            _BACKEND = create_record_backend(os.environ.get(BACKEND_ENV_VAR) or BACKEND_JSON)
+        return _BACKEND
+
+
+def _path_key(json_path: str | Path) -> str:
+    return str(Path(json_path).expanduser().resolve())
+
+
+class WriteBehindBuffer:
+    """
+    流水线范围的写缓冲：活动期间，写往 paths 中文件的 save_record / upsert_many 只暂存在内存
+    （同一键后写覆盖先写），flush() 时每个文件一次性交给存储后端。
+
+    用法：
+        with write_behind([json_path]) as buffer:
+            ...            # 各阶段照常调用 save_record
+            buffer.flush() # 阶段边界
+    退出 with（包括抛异常）时会写入已暂存的记录；进程意外退出时由 atexit 兜底。
+    后端写入失败时未写入的记录放回暂存区并抛出异常，之后的 flush() 或进程退出时的 atexit 会再次尝试。
+    """
+
+    def __init__(self, paths: Iterable[str | Path]):
+        self._keys = {_path_key(path) for path in paths}
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[Tuple, Tuple[Tuple[str, ...], Dict[str, Any]]]] = {}
+        self._paths: Dict[str, Path] = {}
+
+    def covers(self, json_path: str | Path) -> bool:
+        return _path_key(json_path) in self._keys
+
+    def add(
+        self,
+        json_path: str | Path,
+        records: Iterable[Dict[str, Any]],
+        key_fields: Sequence[str] = ("item", "name"),
+    ) -> None:
+        key = _path_key(json_path)
+        fields = tuple(key_fields)
+        with self._lock:
+            self._paths.setdefault(key, Path(json_path))
+            pending = self._pending.setdefault(key, {})
+            for record in records:
+                record_key = (fields, tuple(record.get(field) for field in fields))
+                # 先删后插，保持最后一次写入的顺序
+                pending.pop(record_key, None)
+                pending[record_key] = (fields, record)
+
+    def flush(self) -> int:
+        """把暂存的记录写入后端，返回写入条数；写入失败时把未写入的记录放回暂存区后重新抛出异常。"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            paths = dict(self._paths)
+        count = 0
+        try:
+            backend = get_record_backend()
+            for key in list(pending):
+                entries = pending[key]
+                by_fields: Dict[Tuple[str, ...], List[Tuple]] = {}
+                for record_key, (fields, _) in entries.items():
+                    by_fields.setdefault(fields, []).append(record_key)
+                for fields, record_keys in by_fields.items():
+                    backend.upsert_many(paths[key], [entries[record_key][1] for record_key in record_keys], fields)
+                    count += len(record_keys)
+                    for record_key in record_keys:
+                        del entries[record_key]
+                del pending[key]
+        except BaseException:
+            self._requeue(pending)
+            raise
+        return count
+
+    def _requeue(self, unwritten: Dict[str, Dict[Tuple, Tuple[Tuple[str, ...], Dict[str, Any]]]]) -> None:
+        """把未写入的记录放回暂存区；flush 期间又暂存了同键记录时保留较新的那条。"""
+        with self._lock:
+            for key, entries in unwritten.items():
+                merged = dict(entries)
+                for record_key, entry in self._pending.get(key, {}).items():
+                    merged.pop(record_key, None)
+                    merged[record_key] = entry
+                if merged:
+                    self._pending[key] = merged
+
+    def __enter__(self) -> "WriteBehindBuffer":
+        with _WRITE_BUFFERS_GUARD:
+            for key in self._keys:
+                _WRITE_BUFFERS[key] = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        with _WRITE_BUFFERS_GUARD:
+            for key in self._keys:
+                if _WRITE_BUFFERS.get(key) is self:
+                    del _WRITE_BUFFERS[key]
+        try:
+            written = self.flush()
+        except Exception:
+            # 记录仍在暂存区，进程退出时由 atexit 再试一次
+            with _WRITE_BUFFERS_GUARD:
+                _UNFLUSHED_BUFFERS.add(self)
+            raise
+        if exc_type is not None and written:
+            print(f"流程异常退出，已写入 {written} 条已完成的记录")
+
+
+_WRITE_BUFFERS: Dict[str, WriteBehindBuffer] = {}
+_WRITE_BUFFERS_GUARD = threading.Lock()
+# 退出 with 时写入失败、仍有暂存记录的缓冲
+_UNFLUSHED_BUFFERS: Set[WriteBehindBuffer] = set()
+
+
+def write_behind(paths: Iterable[str | Path]) -> WriteBehindBuffer:
+    return WriteBehindBuffer(paths)
+
+
+def _active_buffer(json_path: str | Path) -> Optional[WriteBehindBuffer]:
+    with _WRITE_BUFFERS_GUARD:
+        if not _WRITE_BUFFERS:
+            return None
+        return _WRITE_BUFFERS.get(_path_key(json_path))
+
+
+def _flush_write_buffers() -> None:
+    with _WRITE_BUFFERS_GUARD:
+        buffers = set(_WRITE_BUFFERS.values()) | _UNFLUSHED_BUFFERS
+    for buffer in buffers:
+        try:
+            buffer.flush()
+        except Exception as exc:
+            print(f"写入缓冲记录失败: {exc}")
+
+
+# atexit 按注册的逆序执行：先把缓冲交给后端，再由 flush_all 合并 JSON
+atexit.register(_flush_write_buffers)
+
+
+_CAPTURE = threading.local()
+
+
+@contextmanager
+def capture_records(**annotations: Any) -> Iterator[List[Dict[str, Any]]]:
+    """
+    当前线程内经 save_record / upsert_many 写入的记录都附加 annotations 中的字段，
+    并收集到返回的列表里（result_cache 借此把一次查询写出的记录存进缓存）。
+    """
+    captured: List[Dict[str, Any]] = []
+    previous = getattr(_CAPTURE, "state", None)
+    _CAPTURE.state = (captured, annotations)
+    try:
+        yield captured
+    finally:
+        _CAPTURE.state = previous
+
+
+def upsert_many(
+    json_path: str | Path,
+    records: Iterable[Dict[str, Any]],
+    key_fields: Sequence[str] = ("item", "name"),
+) -> None:
+    """批量覆盖或追加记录：一次加锁、一次追加日志，适合并发 worker 共享同一家公司的文件。"""
+    records = list(records)
+    capture = getattr(_CAPTURE, "state", None)
+    if capture is not None:
+        captured, annotations = capture
+        records = [{**record, **annotations} for record in records]
+        captured.extend(records)
+    buffer = _active_buffer(json_path)
+    if buffer is not None:
+        buffer.add(json_path, records, key_fields)
+        return
+    get_record_backend().upsert_many(json_path, records, key_fields)
+
+
+def save_record(
+    json_path: str | Path,
+    new_record: Dict[str, Any],
+    key_fields: Sequence[str] = ("item", "name"),
+) -> None:
+    """按 key_fields 覆盖或追加一条记录；同一文件的并发调用会依次执行，不会丢更新。"""
+    upsert_many(json_path, [new_record], key_fields)
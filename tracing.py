@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+运行追踪：记录流水线各阶段、每次爬虫查询、每次页面导航以及每次等待/停留的起止时间与结果，
+运行结束后导出 Chrome trace JSON（chrome://tracing 或 https://ui.perfetto.dev 直接打开），
+并打印按（类别, 名称）汇总的耗时表。
+
+- 只有在 start_trace() 之后才记录，未开启时 span() 几乎没有开销；
+- 类别：stage（stage_graph 的阶段）、lookup（result_cache 的各来源查询）、
+  navigation（driver_pool 创建的浏览器上的 driver.get）、wait（wait_utils 的等待与停留）；
+- 追踪文件默认写到 ~/.founders/traces/（可用 FOUNDERS_TRACE_DIR 指定），
+  otherData 中带有代码版本与汇总表，便于对比不同版本之间的耗时变化。
+
+用法：
+    tracer = start_trace("某某公司")
+    with span("amac", "lookup", query="某某公司") as args:
+        ...
+        args["fetched_from"] = "live"
+    finish_trace(tracer)   # 停止记录、打印汇总并导出
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_TRACE_DIR = Path(os.environ.get("FOUNDERS_TRACE_DIR", Path.home() / ".founders" / "traces"))
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_TIMEOUT = "timeout"
+
+
+class Span:
+    __slots__ = ("name", "category", "start", "end", "outcome", "thread", "args")
+
+    def __init__(self, name: str, category: str, start: float, end: float, outcome: str, thread: str, args: Dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.start = start
+        self.end = end
+        self.outcome = outcome
+        self.thread = thread
+        self.args = args
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class Tracer:
+    def __init__(self, label: str = "run"):
+        self.label = label
+        self.started_at = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._spans: List[Span] = []
+
+    def add(
+        self,
+        name: str,
+        category: str,
+        start: float,
+        end: float,
+        outcome: str = OUTCOME_OK,
+        **args: Any,
+    ) -> None:
+        """start / end 为 time.perf_counter() 读数。"""
+        record = Span(name, category, start, end, outcome, threading.current_thread().name, args)
+        with self._lock:
+            self._spans.append(record)
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """按（类别, 名称）汇总，累计耗时降序：[{category, name, count, total, max, errors}]。"""
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        for record in self.spans():
+            row = groups.setdefault(
+                (record.category, record.name),
+                {"category": record.category, "name": record.name, "count": 0, "total": 0.0, "max": 0.0, "errors": 0},
+            )
+            row["count"] += 1
+            row["total"] += record.duration
+            row["max"] = max(row["max"], record.duration)
+            if record.outcome != OUTCOME_OK:
+                row["errors"] += 1
+        return sorted(groups.values(), key=lambda row: row["total"], reverse=True)
+
+    def print_summary(self, limit: int = 30) -> None:
+        rows = self.summary()
+        if not rows:
+            return
+        print("\n" + "=" * 72)
+        print(f"运行追踪汇总：{self.label}（类别 / 名称 / 次数 / 累计 / 最长 / 失败或超时）")
+        print("=" * 72)
+        for row in rows[:limit]:
+            print(
+                f"  {row['category']:<10} {row['name']:<24} {row['count']:>5} 次"
+                f"  {row['total']:>8.1f}s  {row['max']:>6.1f}s  {row['errors']:>3}"
+            )
+        if len(rows) > limit:
+            print(f"  …… 其余 {len(rows) - limit} 项见追踪文件")
+        print("=" * 72)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Chrome trace event 格式（JSON Object Format），时间单位为微秒。"""
+        spans = self.spans()
+        threads: Dict[str, int] = {}
+        events: List[Dict[str, Any]] = []
+        for record in spans:
+            tid = threads.setdefault(record.thread, len(threads) + 1)
+            events.append({
+                "name": record.name,
+                "cat": record.category,
+                "ph": "X",
+                "ts": round((record.start - self.origin) * 1e6),
+                "dur": round(record.duration * 1e6),
+                "pid": 1,
+                "tid": tid,
+                "args": {"outcome": record.outcome, **record.args},
+            })
+        for thread_name, tid in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": thread_name}})
+        events.append({"name": "process_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": self.label}})
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "label": self.label,
+                "started_at": self.started_at,
+                "version": _code_version(),
+                "summary": [
+                    {**row, "total": round(row["total"], 3), "max": round(row["max"], 3)} for row in self.summary()
+                ],
+            },
+        }
+
+    def export(self, path: Optional[str | Path] = None) -> Path:
+        """写出 Chrome trace JSON，缺省路径为 DEFAULT_TRACE_DIR/<标签>_<开始时间>.json。"""
+        if path is None:
+            safe_label = "".join(c for c in self.label if c.isalnum() or c in ("-", "_")).strip()[:40] or "run"
+            path = DEFAULT_TRACE_DIR / f"{safe_label}_{self.started_at}.json"
+        path = Path(path).expanduser()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
+
+
+def _code_version() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+_TRACER_LOCK = threading.Lock()
+_TRACER: Optional[Tracer] = None
+
+
+def start_trace(label: str = "run") -> Tracer:
+    """开启全局追踪并返回 Tracer；已有追踪在进行时沿用它（如批量流程中的单个公司）。"""
+    global _TRACER
+    with _TRACER_LOCK:
+        if _TRACER is None:
+            _TRACER = Tracer(label)
+        return _TRACER
+
+
+def stop_trace(tracer: Tracer) -> None:
+    global _TRACER
+    with _TRACER_LOCK:
+        if _TRACER is tracer:
+            _TRACER = None
+
+
+def finish_trace(tracer: Tracer, path: Optional[str | Path] = None) -> Optional[Path]:
+    """停止追踪，打印汇总表并导出 Chrome trace JSON；返回写入的路径。"""
+    stop_trace(tracer)
+    tracer.print_summary()
+    try:
+        written = tracer.export(path)
+    except OSError as exc:
+        print(f"写入追踪文件失败：{exc}")
+        return None
+    print(f"追踪文件已写入：{written}（可在 chrome://tracing 或 https://ui.perfetto.dev 打开）")
+    return written
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _TRACER
+
+
+def add_span(name: str, category: str, start: float, end: float, outcome: str = OUTCOME_OK, **args: Any) -> None:
+    """补记一段已经测得起止时间的区间（如 wait_utils 统计过的等待）。"""
+    tracer = _TRACER
+    if tracer is not None:
+        tracer.add(name, category, start, end, outcome, **args)
+
+
+@contextmanager
+def span(name: str, category: str, **args: Any) -> Iterator[Dict[str, Any]]:
+    """
+    记录 with 块的耗时；块内抛出异常时结果记为 error（异常照常抛出）。
+    返回的 dict 即该区间的 args，可在块内补充字段；写入 "outcome" 可覆盖结果（如查询返回空时记为 error）。
+    """
+    tracer = _TRACER
+    if tracer is None:
+        yield args
+        return
+    start = time.perf_counter()
+    outcome = OUTCOME_OK
+    try:
+        yield args
+    except BaseException as exc:
+        outcome = OUTCOME_ERROR
+        args.setdefault("error", str(exc)[:200])
+        raise
+    finally:
+        tracer.add(name, category, start, time.perf_counter(), args.pop("outcome", outcome), **args)
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+等待引擎：用具体的就绪信号代替固定 time.sleep。
+
+- 就绪判断：文档加载完成、DOM 标记出现、元素数量达标、网络空闲（一段时间内没有新的资源请求）、
+  页面高度稳定等，满足即返回，超时也只是继续往下走（与原先 sleep 后直接操作的行为一致）；
+- 礼貌间隔：每个站点单独配置两次访问之间的最小间隔（随机区间），与就绪判断分开；
+  间隔按站点全局计算，所有线程（批量流程的各公司、bfs 穿透的各会话、并发阶段）共享同一个时间表，
+  K 个线程同时访问时依次错开，而不是以 K 倍频率访问；进程内第一次访问同样先等待一个间隔；
+  页面加载本身耗掉的时间会计入间隔，因此多数情况下不需要额外再睡；
+- 每次等待的实际耗时按（站点, 类型）累计，print_wait_stats() 可查看一次运行里空等了多久；
+  开启 tracing 时每次等待同时记为一个 wait 区间。
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from tracing import OUTCOME_OK, OUTCOME_TIMEOUT, add_span
+
+# 站点 → (最小间隔, 最大间隔) 秒；两次导航之间至少间隔该区间内的随机值
+SITE_POLITENESS: Dict[str, Tuple[float, float]] = {
+    "amac": (1.0, 2.0),
+    "neris": (0.5, 1.2),
+    "wenshu": (1.0, 2.0),
+    "qcc": (2.0, 3.5),
+}
+DEFAULT_POLITENESS = (0.5, 1.0)
+
+_STATS_LOCK = threading.Lock()
+_WAIT_STATS: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+# 终端交互（验证码、人机验证、扫码登录）全局串行：并发的 NERIS / 文书网 / 企查查查询不会同时抢 stdin
+_PROMPT_LOCK = threading.Lock()
+
+_LAST_ACTION_LOCK = threading.Lock()
+# 站点 → 最近一次分配出去的访问时刻（time.monotonic），可能在未来（已排队的线程）
+_LAST_ACTION: Dict[str, float] = {}
+
+_NETWORK_ENTRIES_JS = "return window.performance ? performance.getEntriesByType('resource').length : 0;"
+_PAGE_HEIGHT_JS = (
+    "return Math.max(document.body ? document.body.scrollHeight : 0,"
+    " document.documentElement ? document.documentElement.scrollHeight : 0);"
+)
+
+
+def configure_site(site: str, min_delay: float, max_delay: float) -> None:
+    """调整站点的礼貌间隔（秒）。"""
+    SITE_POLITENESS[site] = (min_delay, max(min_delay, max_delay))
+
+
+def record_wait(site: str, kind: str, seconds: float) -> None:
+    end = time.perf_counter()
+    timed_out = kind.endswith("(timeout)")
+    add_span(
+        f"{site}.{kind[:-len('(timeout)')] if timed_out else kind}",
+        "wait",
+        end - seconds,
+        end,
+        OUTCOME_TIMEOUT if timed_out else OUTCOME_OK,
+        site=site,
+    )
+    with _STATS_LOCK:
+        entry = _WAIT_STATS.setdefault((site, kind), {"count": 0, "total": 0.0, "max": 0.0})
+        entry["count"] += 1
+        entry["total"] += seconds
+        entry["max"] = max(entry["max"], seconds)
+
+
+def wait_stats_summary() -> List[Dict[str, object]]:
+    """按累计耗时降序返回 [{site, kind, count, total, max}]。"""
+    with _STATS_LOCK:
+        rows = [
+            {"site": site, "kind": kind, "count": int(v["count"]), "total": v["total"], "max": v["max"]}
+            for (site, kind), v in _WAIT_STATS.items()
+        ]
+    rows.sort(key=lambda row: row["total"], reverse=True)
+    return rows
+
+
+def reset_wait_stats() -> None:
+    with _STATS_LOCK:
+        _WAIT_STATS.clear()
+
+
+def print_wait_stats() -> None:
+    rows = wait_stats_summary()
+    if not rows:
+        return
+    print("\n" + "=" * 60)
+    print("等待耗时统计（站点 / 类型 / 次数 / 累计 / 最长）")
+    print("=" * 60)
+    for row in rows:
+        print(f"  {row['site']:<8} {row['kind']:<14} {row['count']:>5} 次  {row['total']:>8.1f}s  {row['max']:>6.1f}s")
+    print(f"合计 {sum(row['total'] for row in rows):.1f}s")
+    print("=" * 60)
+
+
+def pause(seconds: float, site: str = "default", kind: str = "pause") -> None:
+    """有意为之的固定停留（如关闭浏览器前留给人看一眼），同样计入统计。"""
+    if seconds <= 0:
+        return
+    time.sleep(seconds)
+    record_wait(site, kind, seconds)
+
+
+def prompt_user(message: str = "", site: str = "default") -> str:
+    """
+    在终端提示用户并读取一行输入；所有站点共用一把锁，同一时间只有一个提示在等待输入。
+    等待时间（含排队）计入 (site, "manual") 统计。EOF 视为空输入。
+    """
+    start = time.monotonic()
+    with _PROMPT_LOCK:
+        try:
+            return input(message)
+        except EOFError:
+            return ""
+        finally:
+            record_wait(site, "manual", time.monotonic() - start)
+
+
+def polite_pause(site: str, min_delay: Optional[float] = None, max_delay: Optional[float] = None) -> float:
+    """
+    保证对 site 的任意两次访问（不论来自哪个线程）之间至少间隔随机的礼貌时长：
+    每次调用在站点的时间表上预约下一个时刻并睡到该时刻，距上次访问已经过去的时间会被扣除；
+    第一次访问从调用时刻起等待一个间隔。返回实际睡眠秒数。
+    """
+    low, high = SITE_POLITENESS.get(site, DEFAULT_POLITENESS)
+    if min_delay is not None:
+        low = min_delay
+    if max_delay is not None:
+        high = max_delay
+    target = random.uniform(low, max(low, high))
+    with _LAST_ACTION_LOCK:
+        now = time.monotonic()
+        last = _LAST_ACTION.get(site)
+        granted = now + target if last is None else max(now, last + target)
+        _LAST_ACTION[site] = granted
+    slept = max(0.0, granted - now)
+    if slept > 0:
+        time.sleep(slept)
+    record_wait(site, "politeness", slept)
+    return slept
+
+
+def wait_until(
+    driver,
+    predicate: Callable[[object], bool],
+    timeout: float = 10.0,
+    poll: float = 0.2,
+    site: str = "default",
+    kind: str = "condition",
+) -> bool:
+    """轮询 predicate(driver) 直到为真或超时；predicate 抛出的异常视为未就绪。"""
+    start = time.monotonic()
+    ok = False
+    while True:
+        try:
+            if predicate(driver):
+                ok = True
+                break
+        except Exception:
+            pass
+        if time.monotonic() - start >= timeout:
+            break
+        time.sleep(poll)
+    record_wait(site, kind if ok else f"{kind}(timeout)", time.monotonic() - start)
+    return ok
+
+
+def wait_for_document_ready(driver, timeout: float = 15.0, site: str = "default") -> bool:
+    return wait_until(
+        driver,
+        lambda d: d.execute_script("return document.readyState") == "complete",
+        timeout=timeout,
+        site=site,
+        kind="document_ready",
+    )
+
+
+def wait_for_selector(
+    driver,
+    selectors: Sequence[str],
+    timeout: float = 10.0,
+    min_count: int = 1,
+    site: str = "default",
+) -> bool:
+    """任一 CSS 选择器命中的元素数量达到 min_count 即返回 True。"""
+    script = (
+        "var sels = arguments[0], n = arguments[1];"
+        "for (var i = 0; i < sels.length; i++) {"
+        "  try { if (document.querySelectorAll(sels[i]).length >= n) return true; } catch (e) {}"
+        "}"
+        "return false;"
+    )
+    return wait_until(
+        driver,
+        lambda d: d.execute_script(script, list(selectors), min_count),
+        timeout=timeout,
+        site=site,
+        kind="selector",
+    )
+
+
+def wait_for_network_idle(
+    driver,
+    idle_time: float = 0.5,
+    timeout: float = 10.0,
+    site: str = "default",
+    poll: float = 0.1,
+) -> bool:
+    """资源请求数在 idle_time 内不再增长即视为网络空闲。"""
+    state = {"count": -1, "since": time.monotonic()}
+
+    def _idle(d) -> bool:
+        count = d.execute_script(_NETWORK_ENTRIES_JS)
+        now = time.monotonic()
+        if count != state["count"]:
+            state["count"], state["since"] = count, now
+            return False
+        return now - state["since"] >= idle_time
+
+    return wait_until(driver, _idle, timeout=timeout, poll=poll, site=site, kind="network_idle")
+
+
+def wait_for_layout_stable(
+    driver,
+    stable_time: float = 0.3,
+    timeout: float = 5.0,
+    site: str = "default",
+) -> bool:
+    """页面高度在 stable_time 内保持不变（调整窗口、滚动触发懒加载后使用）。"""
+    state = {"height": -1, "since": time.monotonic()}
+
+    def _stable(d) -> bool:
+        height = d.execute_script(_PAGE_HEIGHT_JS)
+        now = time.monotonic()
+        if height != state["height"]:
+            state["height"], state["since"] = height, now
+            return False
+        return now - state["since"] >= stable_time
+
+    return wait_until(driver, _stable, timeout=timeout, poll=0.1, site=site, kind="layout_stable")
+
+
+def wait_for_page(
+    driver,
+    site: str = "default",
+    selectors: Optional[Sequence[str]] = None,
+    timeout: float = 10.0,
+    idle_time: float = 0.5,
+) -> bool:
+    """
+    导航后的综合就绪判断：先等 document.readyState，再等任一 DOM 标记出现或网络空闲
+    （前端渲染的列表页没有结果时不会出现标记，网络空闲即可继续）。
+    """
+    start = time.monotonic()
+    wait_for_document_ready(driver, timeout=timeout, site=site)
+    remaining = max(0.5, timeout - (time.monotonic() - start))
+    if not selectors:
+        return wait_for_network_idle(driver, idle_time=idle_time, timeout=remaining, site=site)
+
+    script = (
+        "var sels = arguments[0];"
+        "for (var i = 0; i < sels.length; i++) {"
+        "  try { if (document.querySelector(sels[i])) return true; } catch (e) {}"
+        "}"
+        "return false;"
+    )
+    state = {"count": -1, "since": time.monotonic()}
+
+    def _ready(d) -> bool:
+        if d.execute_script(script, list(selectors)):
+            return True
+        count = d.execute_script(_NETWORK_ENTRIES_JS)
+        now = time.monotonic()
+        if count != state["count"]:
+            state["count"], state["since"] = count, now
+            return False
+        return now - state["since"] >= idle_time
+
+    return wait_until(driver, _ready, timeout=remaining, site=site, kind="page_ready")
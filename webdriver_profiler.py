@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+WebDriver 命令级剖析（默认关闭）：统计每条 WebDriver 命令（findElements、getElementText、
+isElementDisplayed、executeScript……）的次数与往返耗时，并归到发起它的 Python 函数与行号，
+进程退出时打印按耗时排序的热点报告，用来找出值得合并成一次 execute_script / 页面 HTML 解析的选择器循环。
+
+- 开启方式：环境变量 FOUNDERS_WEBDRIVER_PROFILE=1，或一键/批量流程的 --profile-webdriver；
+- 只对之后经 driver_pool.create_driver 创建的浏览器生效（包括各爬虫单独运行时自建的浏览器）；
+  WebElement 的 .text、is_displayed() 等同样经由 driver.execute，一并计入；
+- 归属：从调用栈向上跳过 selenium 与本模块、driver_pool 的包装层，取第一个业务代码帧。
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import sys
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ENV_VAR = "FOUNDERS_WEBDRIVER_PROFILE"
+
+_ENABLED = os.environ.get(ENV_VAR, "") == "1"
+_LOCK = threading.Lock()
+# (文件:函数, 行号, 命令) → [次数, 累计秒数, 最长秒数]
+_STATS: Dict[Tuple[str, int, str], List[float]] = {}
+_REPORT_REGISTERED = False
+
+try:
+    import selenium
+
+    _SELENIUM_DIR = str(Path(selenium.__file__).resolve().parent)
+except ImportError:
+    _SELENIUM_DIR = None
+
+_SKIP_FILES = {
+    str(Path(__file__).resolve()),
+    str(Path(__file__).resolve().with_name("driver_pool.py")),
+}
+
+
+def enable() -> None:
+    """开启剖析并在进程退出时打印报告。"""
+    global _ENABLED, _REPORT_REGISTERED
+    _ENABLED = True
+    with _LOCK:
+        if not _REPORT_REGISTERED:
+            atexit.register(print_report)
+            _REPORT_REGISTERED = True
+
+
+def is_enabled() -> bool:
+    return _ENABLED
+
+
+def reset() -> None:
+    with _LOCK:
+        _STATS.clear()
+
+
+@lru_cache(maxsize=None)
+def _is_wrapper_file(filename: str) -> bool:
+    try:
+        resolved = str(Path(filename).resolve())
+    except (OSError, ValueError):
+        resolved = filename
+    return resolved in _SKIP_FILES or bool(_SELENIUM_DIR and resolved.startswith(_SELENIUM_DIR))
+
+
+def _caller() -> Tuple[str, int]:
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not _is_wrapper_file(filename):
+            return f"{Path(filename).name}:{frame.f_code.co_name}", frame.f_lineno
+        frame = frame.f_back
+    return "<unknown>", 0
+
+
+def _record(caller: str, lineno: int, command: str, seconds: float) -> None:
+    key = (caller, lineno, command)
+    with _LOCK:
+        entry = _STATS.get(key)
+        if entry is None:
+            _STATS[key] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+
+def instrument(driver) -> None:
+    """包装 driver.execute，统计每条命令；未开启时什么也不做。"""
+    if not _ENABLED or getattr(driver, "founders_profiled", False):
+        return
+    execute = driver.execute
+
+    def _execute(driver_command, params=None):
+        caller, lineno = _caller()
+        start = time.perf_counter()
+        try:
+            return execute(driver_command, params)
+        finally:
+            _record(caller, lineno, driver_command, time.perf_counter() - start)
+
+    driver.execute = _execute
+    driver.founders_profiled = True
+
+
+def function_summary() -> List[Dict[str, object]]:
+    """按调用函数汇总，累计耗时降序：[{caller, count, total, commands: {命令: 次数}}]。"""
+    with _LOCK:
+        items = list(_STATS.items())
+    functions: Dict[str, Dict[str, object]] = {}
+    for (caller, _, command), (count, total, _max) in items:
+        row = functions.setdefault(caller, {"caller": caller, "count": 0, "total": 0.0, "commands": {}})
+        row["count"] += int(count)
+        row["total"] += total
+        row["commands"][command] = row["commands"].get(command, 0) + int(count)
+    return sorted(functions.values(), key=lambda row: row["total"], reverse=True)
+
+
+def hotspot_summary() -> List[Dict[str, object]]:
+    """按（函数, 行号, 命令）汇总，累计耗时降序：[{caller, line, command, count, total, mean, max}]。"""
+    with _LOCK:
+        items = list(_STATS.items())
+    rows = [
+        {
+            "caller": caller,
+            "line": lineno,
+            "command": command,
+            "count": int(count),
+            "total": total,
+            "mean": total / count if count else 0.0,
+            "max": longest,
+        }
+        for (caller, lineno, command), (count, total, longest) in items
+    ]
+    rows.sort(key=lambda row: row["total"], reverse=True)
+    return rows
+
+
+def print_report(limit: int = 20) -> None:
+    hotspots = hotspot_summary()
+    if not hotspots:
+        return
+    functions = function_summary()
+    total_count = sum(row["count"] for row in functions)
+    total_time = sum(row["total"] for row in functions)
+    print("\n" + "=" * 72)
+    print(f"WebDriver 命令剖析：共 {total_count} 条命令，往返累计 {total_time:.1f}s")
+    print("=" * 72)
+    print("按函数（次数 / 累计 / 主要命令）：")
+    for row in functions[:limit]:
+        top = sorted(row["commands"].items(), key=lambda item: item[1], reverse=True)[:3]
+        commands = "、".join(f"{name}×{count}" for name, count in top)
+        print(f"  {row['caller']:<40} {row['count']:>6} 次  {row['total']:>8.1f}s  {commands}")
+    print("\n热点（函数:行号 / 命令 / 次数 / 累计 / 平均）：")
+    for row in hotspots[:limit]:
+        location = f"{row['caller']}:{row['line']}"
+        print(
+            f"  {location:<44} {row['command']:<22} {row['count']:>6} 次"
+            f"  {row['total']:>8.1f}s  {row['mean'] * 1000:>7.1f}ms"
+        )
+    print("=" * 72)
+
+
+# 通过环境变量开启时同样在退出时打印报告
+if _ENABLED:
+    enable()
@@ -4,11 +4,16 @@
 中国裁判文书网登录页自动填写并截图（wenshu_new.py）
 
 - 打开登录页面：https://wenshu.court.gov.cn/website/wenshu/181010CARHS5BS3C/index.html?open=login
-- 自动填入账号与密码（不点击登录）
+- 自动填入账号与密码，人工输入验证码后登录
 - 截取全页截图，保存到桌面/文书网登录/ 目录
+- WenshuSession 登录一次后可连续搜索多个关键词，检测到登录失效时才重新登录；
+  传入同一个浏览器的 search_wenshu 调用会复用该浏览器上的会话；浏览器使用持久配置目录，
+  上次运行的登录仍有效时直接跳过登录与验证码
+- 搜索结果解析为结构化数据（命中总数，及每条文书的标题、案号、法院、裁判日期、docId），
+  按顺序翻页（默认最多 3 页，configure_results 可调），页面 HTML 交给线程池并发解析，
+  与截图一起写入记录的 data.cases
 """
 
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -23,11 +28,26 @@ import platform
 import subprocess
 import base64
 import json
+import re
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
 
-from storage_utils import load_records, upsert_record, write_records
+from bs4 import BeautifulSoup
+
+from driver_pool import create_driver, mark_broken, mark_session_stale, register_site, session_is_warm
+from screenshot_utils import save_screenshot_artifact, screenshot_extension
+from storage_utils import save_record
+from wait_utils import pause, polite_pause, prompt_user, wait_for_document_ready, wait_for_network_idle, wait_for_page, wait_until
 
 WENSHU_LOGIN_URL = "https://wenshu.court.gov.cn/website/wenshu/181010CARHS5BS3C/index.html?open=login"
+WENSHU_HOME_URL = WENSHU_LOGIN_URL.split("?", 1)[0]
+
+# 每个关键词最多解析的结果页数（0 表示只截图不解析）
+MAX_RESULT_PAGES = 3
+PARSE_WORKERS = 2
 
 # 账号与密码（按需替换）
 WENSHU_ACCOUNT = {
@@ -76,28 +96,6 @@ def _apply_stealth(driver) -> None:
         pass
 
 
-def _ensure_fullpage_screenshot(driver) -> None:
-    try:
-        total_width = driver.execute_script(
-            "return Math.max(document.body.scrollWidth, document.documentElement.scrollWidth, document.documentElement.clientWidth);"
-        )
-        total_height = driver.execute_script(
-            "return Math.max(document.body.scrollHeight, document.documentElement.scrollHeight, document.documentElement.clientHeight);"
-        )
-        viewport_width = driver.execute_script("return window.innerWidth")
-        viewport_height = driver.execute_script("return window.innerHeight")
-
-        if total_width and total_height:
-            max_w = min(int(total_width) + 100, 3840)
-            max_h = min(int(total_height) + 300, 21600)
-            if total_width > viewport_width or total_height > viewport_height:
-                driver.set_window_size(max_w, max_h)
-                time.sleep(1.0)
-        driver.execute_script("window.scrollTo(0, 0);")
-    except Exception:
-        pass
-
-
 def _wait_for_manual_verification(driver) -> None:
     """Prompt user to finish WAF verification if redirected to the human-check page."""
     try:
@@ -109,10 +107,7 @@ def _wait_for_manual_verification(driver) -> None:
     print("\n检测到人机验证页面，需要你在浏览器中手动完成验证。")
     print("请切换到浏览器完成验证码或问答，并等页面自动跳转。")
     while True:
-        try:
-            input("完成验证后回到终端按回车继续：")
-        except EOFError:
-            pass
+        prompt_user("完成验证后回到终端按回车继续：", site="wenshu")
         time.sleep(1.0)
         try:
             current_url = driver.current_url or ""
@@ -124,475 +119,813 @@ def _wait_for_manual_verification(driver) -> None:
         print("仍在人机验证页面，如果已完成请等待网站跳转后再按回车。")
 
 
-def fill_login_and_screenshot(
-    username: str,
-    password: str,
-    save_to_desktop: bool = True,
-    search_keyword: str | None = None,
-    output_directory: str | None = None,
-    record_name: str | None = None,
-) -> dict | None:
-    _clear_proxy_env_vars()
-    chrome_options = _build_chrome_options()
-    driver = None
+_LOGIN_REQUIRED_JS = """
+var frame = document.querySelector("iframe#contentIframe, iframe[src*='account.court.gov.cn']");
+if (frame && frame.offsetParent !== null) return true;
+var text = document.body ? document.body.innerText.slice(0, 5000) : "";
+return /请先登录|登录已过期|重新登录/.test(text);
+"""
 
+
+def _login_required(driver) -> bool:
+    """当前页面是否要求登录（跳回登录页、弹出登录框或提示登录过期）。"""
+    try:
+        current_url = driver.current_url or ""
+    except Exception:
+        return True
+    # 登录页地址（?open=login）登录成功后也不会变化，只看是否跳到了账号中心
+    if "account.court.gov.cn" in current_url:
+        return True
     try:
-        driver = webdriver.Chrome(options=chrome_options)
-        driver.maximize_window()
-        _apply_stealth(driver)
+        return bool(driver.execute_script(_LOGIN_REQUIRED_JS))
+    except Exception:
+        return False
+
+
+_LOGGED_IN_JS = """
+var nodes = document.querySelectorAll("a, span, li");
+for (var i = 0; i < nodes.length; i++) {
+  var text = (nodes[i].innerText || "").trim();
+  if (text === "退出" || text === "退出登录" || text === "注销") return true;
+}
+return false;
+"""
+
+
+def _wenshu_session_healthy(driver) -> bool:
+    """打开首页，页面未要求登录且出现了“退出”入口即视为已登录。"""
+    polite_pause("wenshu")
+    driver.get(WENSHU_HOME_URL)
+    wait_for_document_ready(driver, site="wenshu")
+    wait_for_network_idle(driver, idle_time=0.5, timeout=3, site="wenshu")
+    _wait_for_manual_verification(driver)
+    return not _login_required(driver) and bool(driver.execute_script(_LOGGED_IN_JS))
 
-        print(f"打开登录页面：{WENSHU_LOGIN_URL}")
-        driver.get(WENSHU_LOGIN_URL)
-        WebDriverWait(driver, 15).until(lambda d: d.execute_script("return document.readyState") == "complete")
-        time.sleep(1.0)
 
-        wait = WebDriverWait(driver, 12)
+# 持久配置目录保存登录状态，归还浏览器池时也保留 Cookie，登录可以跨关键词、跨公司、跨运行复用
+register_site(
+    "wenshu",
+    _build_chrome_options,
+    setup=_apply_stealth,
+    keep_cookies=True,
+    persistent_profile=True,
+    health_check=_wenshu_session_healthy,
+)
 
-        # 登录表单在 iframe 内部，先切换到 iframe
+
+def _login(driver, username: str, password: str, save_to_desktop: bool = True) -> str:
+    """打开登录页，填写账号密码并人工输入验证码，回到主文档并等待人机验证。返回 iframe 内的跳转地址。"""
+    print(f"打开登录页面：{WENSHU_LOGIN_URL}")
+    polite_pause("wenshu")
+    driver.get(WENSHU_LOGIN_URL)
+    WebDriverWait(driver, 15).until(lambda d: d.execute_script("return document.readyState") == "complete")
+    # 登录框在 iframe 中异步加载，等网络空闲后再定位
+    wait_for_network_idle(driver, idle_time=0.5, timeout=3, site="wenshu")
+
+    wait = WebDriverWait(driver, 12)
+
+    # 登录表单在 iframe 内部，先切换到 iframe
+    try:
+        wait.until(EC.frame_to_be_available_and_switch_to_it((By.ID, "contentIframe")))
+        print("成功切换到 iframe: contentIframe")
+    except Exception as e:
+        print(f"切换到 iframe 失败: {e}")
         try:
-            wait.until(EC.frame_to_be_available_and_switch_to_it((By.ID, "contentIframe")))
-            print("成功切换到 iframe: contentIframe")
-        except Exception as e:
-            print(f"切换到 iframe 失败: {e}")
-            try:
-                wait.until(EC.frame_to_be_available_and_switch_to_it((By.XPATH, "//iframe[contains(@src,'account.court.gov.cn')]")))
-                print("通过 XPATH 成功切换到 iframe")
-            except Exception as e2:
-                print(f"备用切换方式也失败: {e2}")
-                raise RuntimeError("无法切换到登录 iframe")
-
-        # 用户名输入框（手机号）
-        user_input = None
-        for by_, sel in [
-            (By.CSS_SELECTOR, "input[name='username']"),
-            (By.CSS_SELECTOR, "input.phone-number-inp"),
-            (By.CSS_SELECTOR, "input.phone-number-input"),
-            (By.XPATH, '//input[@type="text" and (@name="username" or contains(@placeholder,"手机号码"))]'),
-            (By.XPATH, '//input[@placeholder="手机号码"]'),
-        ]:
-            try:
-                user_input = wait.until(EC.presence_of_element_located((by_, sel)))
-                if user_input:
-                    print(f"已定位用户名输入框: {sel}")
-                    break
-            except Exception:
-                continue
-        if not user_input:
-            raise RuntimeError("未找到用户名输入框")
+            wait.until(EC.frame_to_be_available_and_switch_to_it((By.XPATH, "//iframe[contains(@src,'account.court.gov.cn')]")))
+            print("通过 XPATH 成功切换到 iframe")
+        except Exception as e2:
+            print(f"备用切换方式也失败: {e2}")
+            raise RuntimeError("无法切换到登录 iframe")
+
+    # 用户名输入框（手机号）
+    user_input = None
+    for by_, sel in [
+        (By.CSS_SELECTOR, "input[name='username']"),
+        (By.CSS_SELECTOR, "input.phone-number-inp"),
+        (By.CSS_SELECTOR, "input.phone-number-input"),
+        (By.XPATH, '//input[@type="text" and (@name="username" or contains(@placeholder,"手机号码"))]'),
+        (By.XPATH, '//input[@placeholder="手机号码"]'),
+    ]:
+        try:
+            user_input = wait.until(EC.presence_of_element_located((by_, sel)))
+            if user_input:
+                print(f"已定位用户名输入框: {sel}")
+                break
+        except Exception:
+            continue
+    if not user_input:
+        raise RuntimeError("未找到用户名输入框")
+
+    # 密码输入框
+    pwd_input = None
+    for by_, sel in [
+        (By.CSS_SELECTOR, "input[name='password']"),
+        (By.XPATH, '//input[@type="password" and (@name="password" or contains(@placeholder,"密码"))]'),
+        (By.CSS_SELECTOR, "input.password"),
+    ]:
+        try:
+            pwd_input = wait.until(EC.presence_of_element_located((by_, sel)))
+            if pwd_input:
+                print(f"已定位密码输入框: {sel}")
+                break
+        except Exception:
+            continue
+    if not pwd_input:
+        raise RuntimeError("未找到密码输入框")
 
-        # 密码输入框
-        pwd_input = None
-        for by_, sel in [
-            (By.CSS_SELECTOR, "input[name='password']"),
-            (By.XPATH, '//input[@type="password" and (@name="password" or contains(@placeholder,"密码"))]'),
-            (By.CSS_SELECTOR, "input.password"),
-        ]:
-            try:
-                pwd_input = wait.until(EC.presence_of_element_located((by_, sel)))
-                if pwd_input:
-                    print(f"已定位密码输入框: {sel}")
-                    break
-            except Exception:
-                continue
-        if not pwd_input:
-            raise RuntimeError("未找到密码输入框")
+    # 聚焦并滚动到可视区域
+    try:
+        driver.execute_script("arguments[0].scrollIntoView({behavior:'smooth', block:'center'});", user_input)
+        time.sleep(0.2)
+    except Exception:
+        pass
 
-        # 聚焦并滚动到可视区域
+    # 使用 JS 设置值并派发事件，保证前端接收到变更
+    try:
+        driver.execute_script(
+            "arguments[0].focus();"
+            "arguments[0].value = arguments[2];"
+            "arguments[0].dispatchEvent(new Event('input', {bubbles:true}));"
+            "arguments[0].dispatchEvent(new Event('change', {bubbles:true}));"
+            "arguments[1].value = arguments[3];"
+            "arguments[1].dispatchEvent(new Event('input', {bubbles:true}));"
+            "arguments[1].dispatchEvent(new Event('change', {bubbles:true}));",
+            user_input, pwd_input, username, password
+        )
+        print("已通过 JS 写入账号与密码并派发事件")
+    except Exception:
         try:
-            driver.execute_script("arguments[0].scrollIntoView({behavior:'smooth', block:'center'});", user_input)
+            user_input.clear()
+            user_input.send_keys(username)
             time.sleep(0.2)
+            pwd_input.clear()
+            pwd_input.send_keys(password)
+            print("已通过 send_keys 输入账号与密码")
         except Exception:
             pass
 
-        # 使用 JS 设置值并派发事件，保证前端接收到变更
-        try:
-            driver.execute_script(
-                "arguments[0].focus();"
-                "arguments[0].value = arguments[2];"
-                "arguments[0].dispatchEvent(new Event('input', {bubbles:true}));"
-                "arguments[0].dispatchEvent(new Event('change', {bubbles:true}));"
-                "arguments[1].value = arguments[3];"
-                "arguments[1].dispatchEvent(new Event('input', {bubbles:true}));"
-                "arguments[1].dispatchEvent(new Event('change', {bubbles:true}));",
-                user_input, pwd_input, username, password
-            )
-            print("已通过 JS 写入账号与密码并派发事件")
-        except Exception:
+    # 处理验证码：下载、展示、等待用户输入并填入
+    cap_input = None
+    cap_img = None
+    iframe_ret_url = ""
+    cap_input_selectors = [
+        (By.CSS_SELECTOR, "input[name='captcha']"),
+        (By.XPATH, '//input[@name="captcha" or contains(@placeholder,"验证码")]'),
+    ]
+    cap_img_selectors = [
+        (By.CSS_SELECTOR, "img.captcha-img"),
+        (By.XPATH, '//img[contains(@class,"captcha") or contains(@src,"data:image")]'),
+    ]
+
+    def _locate_captcha_input(log_if_found: bool = True):
+        for by_, sel in cap_input_selectors:
             try:
-                user_input.clear()
-                user_input.send_keys(username)
-                time.sleep(0.2)
-                pwd_input.clear()
-                pwd_input.send_keys(password)
-                print("已通过 send_keys 输入账号与密码")
+                elem = wait.until(EC.presence_of_element_located((by_, sel)))
+                if elem:
+                    if log_if_found:
+                        print(f"已定位验证码输入框: {sel}")
+                    return elem
             except Exception:
-                pass
+                continue
+        return None
 
-        # 处理验证码：下载、展示、等待用户输入并填入
-        cap_input = None
-        cap_img = None
-        iframe_ret_url = ""
-        cap_input_selectors = [
-            (By.CSS_SELECTOR, "input[name='captcha']"),
-            (By.XPATH, '//input[@name="captcha" or contains(@placeholder,"验证码")]'),
-        ]
-        cap_img_selectors = [
-            (By.CSS_SELECTOR, "img.captcha-img"),
-            (By.XPATH, '//img[contains(@class,"captcha") or contains(@src,"data:image")]'),
-        ]
-
-        def _locate_captcha_input(log_if_found: bool = True):
-            for by_, sel in cap_input_selectors:
-                try:
-                    elem = wait.until(EC.presence_of_element_located((by_, sel)))
-                    if elem:
-                        if log_if_found:
-                            print(f"已定位验证码输入框: {sel}")
-                        return elem
-                except Exception:
-                    continue
-            return None
+    def _locate_captcha_image(log_if_found: bool = True):
+        for by_, sel in cap_img_selectors:
+            try:
+                elem = wait.until(EC.presence_of_element_located((by_, sel)))
+                if elem:
+                    if log_if_found:
+                        print(f"已定位验证码图片: {sel}")
+                    return elem
+            except Exception:
+                continue
+        return None
 
-        def _locate_captcha_image(log_if_found: bool = True):
-            for by_, sel in cap_img_selectors:
+    def _save_captcha_image(cap_img_element, save_dir: str, attempt_index: int) -> str | None:
+        ts_cap = datetime.now().strftime("%Y%m%d_%H%M%S")
+        cap_path = os.path.join(save_dir, f"WENSHU_验证码_{ts_cap}_try{attempt_index}.png")
+        saved_ok = False
+        try:
+            src = cap_img_element.get_attribute("src") or ""
+            print(f"验证码图片 src 前缀: {src[:30]}...")
+            if src.startswith("data:image"):
                 try:
-                    elem = wait.until(EC.presence_of_element_located((by_, sel)))
-                    if elem:
-                        if log_if_found:
-                            print(f"已定位验证码图片: {sel}")
-                        return elem
-                except Exception:
-                    continue
-            return None
-
-        def _save_captcha_image(cap_img_element, save_dir: str, attempt_index: int) -> str | None:
-            ts_cap = datetime.now().strftime("%Y%m%d_%H%M%S")
-            cap_path = os.path.join(save_dir, f"WENSHU_验证码_{ts_cap}_try{attempt_index}.png")
-            saved_ok = False
-            try:
-                src = cap_img_element.get_attribute("src") or ""
-                print(f"验证码图片 src 前缀: {src[:30]}...")
-                if src.startswith("data:image"):
-                    try:
-                        b64 = src.split(",", 1)[1]
-                        with open(cap_path, "wb") as f:
-                            f.write(base64.b64decode(b64))
-                        saved_ok = os.path.exists(cap_path) and os.path.getsize(cap_path) > 0
-                        if saved_ok:
-                            print("已从 data URL 解码保存验证码图片")
-                    except Exception:
-                        saved_ok = False
-                if not saved_ok:
-                    cap_img_element.screenshot(cap_path)
+                    b64 = src.split(",", 1)[1]
+                    with open(cap_path, "wb") as f:
+                        f.write(base64.b64decode(b64))
                     saved_ok = os.path.exists(cap_path) and os.path.getsize(cap_path) > 0
                     if saved_ok:
-                        print("已通过元素截图保存验证码图片")
-            except Exception:
-                saved_ok = False
-
+                        print("已从 data URL 解码保存验证码图片")
+                except Exception:
+                    saved_ok = False
             if not saved_ok:
-                print("未能保存验证码图片，请在页面中自行查看。")
-                return None
+                cap_img_element.screenshot(cap_path)
+                saved_ok = os.path.exists(cap_path) and os.path.getsize(cap_path) > 0
+                if saved_ok:
+                    print("已通过元素截图保存验证码图片")
+        except Exception:
+            saved_ok = False
 
-            try:
-                if platform.system() == "Darwin":
-                    subprocess.Popen(["open", cap_path])
-                elif platform.system() == "Windows":
-                    os.startfile(cap_path)  # type: ignore[attr-defined]
-                else:
-                    subprocess.Popen(["xdg-open", cap_path])
-            except Exception:
-                pass
-            print(f"已保存验证码图片：{cap_path}")
-            return cap_path
+        if not saved_ok:
+            print("未能保存验证码图片，请在页面中自行查看。")
+            return None
 
         try:
-            cap_input = _locate_captcha_input()
-            cap_img = _locate_captcha_image()
-            if cap_input and cap_img:
-                desktop_path = os.path.join(os.path.expanduser("~"), "Desktop") if save_to_desktop else os.getcwd()
-                save_dir = os.path.join(desktop_path, "文书网登录")
-                os.makedirs(save_dir, exist_ok=True)
-                max_captcha_attempts = 5
-                attempt_index = 0
-
-                while attempt_index < max_captcha_attempts:
-                    attempt_index += 1
-                    print(f"开始进行验证码尝试 #{attempt_index}")
-                    # 确保元素未过期
-                    for elem_name, current_elem, locator in [
-                        ("输入框", cap_input, _locate_captcha_input),
-                        ("图片", cap_img, _locate_captcha_image),
-                    ]:
-                        refreshed = current_elem
-                        if refreshed:
-                            try:
-                                _ = refreshed.is_displayed()
-                            except StaleElementReferenceException:
-                                refreshed = None
-                            except Exception:
-                                refreshed = None
-                        if refreshed is None:
-                            refreshed = locator(log_if_found=False)
-                        if elem_name == "输入框":
-                            cap_input = refreshed
-                        else:
-                            cap_img = refreshed
-
-                    if not cap_input or not cap_img:
-                        print("无法定位验证码输入框或图片，结束验证码流程。")
-                        break
-
-                    _save_captcha_image(cap_img, save_dir, attempt_index)
-
-                    try:
-                        captcha_text = input("请输入验证码：").strip()
-                    except KeyboardInterrupt:
-                        captcha_text = ""
-                    if not captcha_text:
-                        print("未输入验证码，结束验证码流程。")
-                        break
+            if platform.system() == "Darwin":
+                subprocess.Popen(["open", cap_path])
+            elif platform.system() == "Windows":
+                os.startfile(cap_path)  # type: ignore[attr-defined]
+            else:
+                subprocess.Popen(["xdg-open", cap_path])
+        except Exception:
+            pass
+        print(f"已保存验证码图片：{cap_path}")
+        return cap_path
 
-                    try:
-                        cap_input.clear()
-                        cap_input.send_keys(captcha_text)
-                        print("验证码已输入")
-                        try:
-                            cap_input.send_keys(Keys.ENTER)
-                            print("回车尝试登录")
-                            time.sleep(4)
-                        except Exception:
-                            print("回车尝试直接登录失败")
-                    except Exception:
+    try:
+        cap_input = _locate_captcha_input()
+        cap_img = _locate_captcha_image()
+        if cap_input and cap_img:
+            desktop_path = os.path.join(os.path.expanduser("~"), "Desktop") if save_to_desktop else os.getcwd()
+            save_dir = os.path.join(desktop_path, "文书网登录")
+            os.makedirs(save_dir, exist_ok=True)
+            max_captcha_attempts = 5
+            attempt_index = 0
+
+            while attempt_index < max_captcha_attempts:
+                attempt_index += 1
+                print(f"开始进行验证码尝试 #{attempt_index}")
+                # 确保元素未过期
+                for elem_name, current_elem, locator in [
+                    ("输入框", cap_input, _locate_captcha_input),
+                    ("图片", cap_img, _locate_captcha_image),
+                ]:
+                    refreshed = current_elem
+                    if refreshed:
                         try:
-                            driver.execute_script(
-                                "arguments[0].focus();arguments[0].value=arguments[1];"
-                                "arguments[0].dispatchEvent(new Event('input',{bubbles:true}));"
-                                "arguments[0].dispatchEvent(new Event('change',{bubbles:true}));",
-                                cap_input, captcha_text
-                            )
-                            print("已通过 JS 写入验证码")
+                            _ = refreshed.is_displayed()
+                        except StaleElementReferenceException:
+                            refreshed = None
                         except Exception:
-                            pass
+                            refreshed = None
+                    if refreshed is None:
+                        refreshed = locator(log_if_found=False)
+                    if elem_name == "输入框":
+                        cap_input = refreshed
+                    else:
+                        cap_img = refreshed
+
+                if not cap_input or not cap_img:
+                    print("无法定位验证码输入框或图片，结束验证码流程。")
+                    break
 
-                    try:
-                        prev_iframe_url = driver.execute_script("return window.location.href")
-                    except Exception:
-                        prev_iframe_url = ""
-
-                    print("尝试点击登录按钮...")
-                    for by_, sel in [
-                        (By.XPATH, '//span[contains(@class,"button-primary") and @data-api="/api/login"]'),
-                        (By.CSS_SELECTOR, 'span.button.button-primary[data-api="/api/login"]'),
-                        (By.XPATH, '//span[contains(.,"登录") and contains(@class,"button-primary")]'),
-                    ]:
-                        try:
-                            login_btn = wait.until(EC.element_to_be_clickable((by_, sel)))
-                            if login_btn:
-                                driver.execute_script("arguments[0].scrollIntoView({block:'center'});", login_btn)
-                                driver.execute_script("arguments[0].click();", login_btn)
-                                print(f"已点击登录按钮: {sel}")
-                                break
-                        except Exception:
-                            continue
+                _save_captcha_image(cap_img, save_dir, attempt_index)
 
-                    print("等待登录结果（iframe URL 变化或页面跳转）...")
-                    url_changed = False
-                    try:
-                        WebDriverWait(driver, 8).until(
-                            lambda d: d.execute_script("return window.location.href") != prev_iframe_url
-                        )
-                        print("检测到 iframe URL 变化")
-                        url_changed = True
-                    except Exception:
-                        print("未检测到明显的 URL 变化，可能仍在当前页面")
+                try:
+                    captcha_text = prompt_user("请输入验证码：", site="wenshu").strip()
+                except KeyboardInterrupt:
+                    captcha_text = ""
+                if not captcha_text:
+                    print("未输入验证码，结束验证码流程。")
+                    break
 
+                try:
+                    cap_input.clear()
+                    cap_input.send_keys(captcha_text)
+                    print("验证码已输入")
                     try:
-                        iframe_ret_url = driver.execute_script("return window.location.href")
-                        print(f"iframe 返回地址：{iframe_ret_url}")
+                        cap_input.send_keys(Keys.ENTER)
+                        print("回车尝试登录")
+                        pause(4, site="wenshu", kind="login_submit")
                     except Exception:
-                        iframe_ret_url = ""
-
-                    if url_changed:
-                        break
-
-                    need_retry = False
+                        print("回车尝试直接登录失败")
+                except Exception:
                     try:
-                        hint_elements = driver.find_elements(By.XPATH, "//*[contains(text(),'验证码错误')]")
-                        for hint in hint_elements:
-                            try:
-                                if hint and hint.is_displayed() and "验证码错误" in (hint.text or ""):
-                                    need_retry = True
-                                    break
-                            except Exception:
-                                continue
+                        driver.execute_script(
+                            "arguments[0].focus();arguments[0].value=arguments[1];"
+                            "arguments[0].dispatchEvent(new Event('input',{bubbles:true}));"
+                            "arguments[0].dispatchEvent(new Event('change',{bubbles:true}));",
+                            cap_input, captcha_text
+                        )
+                        print("已通过 JS 写入验证码")
                     except Exception:
-                        need_retry = False
-
-                    if need_retry:
-                        print("验证码错误或验证码已过期，即将重新下载验证码并重试...")
-                        cap_input = _locate_captcha_input(log_if_found=False)
-                        cap_img = _locate_captcha_image(log_if_found=False)
-                        continue
-
-                    print("未检测到验证码错误的提示，结束验证码流程。")
-                    break
-        except Exception:
-            iframe_ret_url = ""
-
-        # 回到主文档后再截图（可选）
-        try:
-            driver.switch_to.default_content()
-        except Exception:
-            pass
-        _wait_for_manual_verification(driver)
+                        pass
 
-        # 在返回页面上执行一次搜索：询问用户关键词 -> 填入搜索框 -> 触发搜索 -> 等待渲染
-        try:
-            print("准备在返回页面上执行搜索...")
-            if search_keyword is None:
                 try:
-                    search_kw = input("请输入返回页面要搜索的关键词（可留空跳过）：").strip()
-                except KeyboardInterrupt:
-                    search_kw = ""
-            else:
-                search_kw = search_keyword.strip()
-                print(f"使用传入的搜索关键词：{search_kw}")
-            if search_kw:
-                # 定位搜索输入框
-                search_input = None
-                after_search_url = ""
+                    prev_iframe_url = driver.execute_script("return window.location.href")
+                except Exception:
+                    prev_iframe_url = ""
+
+                print("尝试点击登录按钮...")
                 for by_, sel in [
-                    (By.CSS_SELECTOR, "input.searchKey.search-inp"),
-                    (By.CSS_SELECTOR, "input.search-inp"),
-                    (By.XPATH, '//input[contains(@class,"searchKey") and @type="text"]'),
-                    (By.XPATH, '//input[@type="text" and contains(@placeholder,"输入案由")]'),
+                    (By.XPATH, '//span[contains(@class,"button-primary") and @data-api="/api/login"]'),
+                    (By.CSS_SELECTOR, 'span.button.button-primary[data-api="/api/login"]'),
+                    (By.XPATH, '//span[contains(.,"登录") and contains(@class,"button-primary")]'),
                 ]:
                     try:
-                        search_input = WebDriverWait(driver, 10).until(EC.presence_of_element_located((by_, sel)))
-                        if search_input:
-                            print(f"已定位返回页搜索框: {sel}")
+                        login_btn = wait.until(EC.element_to_be_clickable((by_, sel)))
+                        if login_btn:
+                            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", login_btn)
+                            driver.execute_script("arguments[0].click();", login_btn)
+                            print(f"已点击登录按钮: {sel}")
                             break
                     except Exception:
                         continue
-                if search_input:
-                    try:
-                        driver.execute_script("arguments[0].scrollIntoView({block:'center'});", search_input)
-                    except Exception:
-                        pass
-                    # 使用 JS 写值并派发事件，保证前端接收
-                    try:
-                        driver.execute_script(
-                            "arguments[0].focus();"
-                            "arguments[0].value = arguments[1];"
-                            "arguments[0].dispatchEvent(new Event('input', {bubbles:true}));"
-                            "arguments[0].dispatchEvent(new Event('change', {bubbles:true}));",
-                            search_input, search_kw
-                        )
-                        print("已在返回页搜索框写入关键词")
-                    except Exception:
-                        try:
-                            search_input.clear()
-                            search_input.send_keys(search_kw)
-                        except Exception:
-                            pass
-                    # 点击“搜索”按钮或回车
-                    clicked_search = False
-                    for by_, sel in [
-                        (By.CSS_SELECTOR, "div.search-rightBtn.search-click"),
-                        (By.XPATH, '//div[contains(@class,"search-rightBtn") and contains(@class,"search-click")]'),
-                        (By.XPATH, '//button[contains(.,"搜索") or contains(@class,"search-click")]'),
-                    ]:
+
+                print("等待登录结果（iframe URL 变化或页面跳转）...")
+                url_changed = False
+                try:
+                    WebDriverWait(driver, 8).until(
+                        lambda d: d.execute_script("return window.location.href") != prev_iframe_url
+                    )
+                    print("检测到 iframe URL 变化")
+                    url_changed = True
+                except Exception:
+                    print("未检测到明显的 URL 变化，可能仍在当前页面")
+
+                try:
+                    iframe_ret_url = driver.execute_script("return window.location.href")
+                    print(f"iframe 返回地址：{iframe_ret_url}")
+                except Exception:
+                    iframe_ret_url = ""
+
+                if url_changed:
+                    break
+
+                need_retry = False
+                try:
+                    hint_elements = driver.find_elements(By.XPATH, "//*[contains(text(),'验证码错误')]")
+                    for hint in hint_elements:
                         try:
-                            btn = WebDriverWait(driver, 8).until(EC.element_to_be_clickable((by_, sel)))
-                            if btn:
-                                driver.execute_script("arguments[0].click();", btn)
-                                clicked_search = True
-                                print(f"已触发搜索点击: {sel}")
+                            if hint and hint.is_displayed() and "验证码错误" in (hint.text or ""):
+                                need_retry = True
                                 break
                         except Exception:
                             continue
-                    if not clicked_search:
-                        try:
-                            search_input.send_keys(Keys.ENTER)
-                            print("已通过回车触发搜索")
-                        except Exception:
-                            pass
-                    # 等待出现结果标志或 URL 变化
-                    prev_url_after_login = driver.current_url
-                    try:
-                        WebDriverWait(driver, 10).until(
-                            lambda d: d.current_url != prev_url_after_login or
-                            ("search-list" in d.page_source) or
-                            ("listMain" in d.page_source)
-                        )
-                    except Exception:
-                        time.sleep(2.0)
-                    after_search_url = driver.current_url
-                    print(f"搜索后返回地址：{after_search_url}")
-                else:
-                    print("未找到返回页搜索框，跳过搜索步骤")
-        except Exception as _:
-            print("执行返回页搜索步骤时出现异常，继续截图")
-
-        # 组织输出目录（可通过参数覆盖默认行为）
-        if output_directory:
-            save_dir = os.fspath(output_directory)
-        else:
-            desktop_path = os.path.join(os.path.expanduser("~"), "Desktop") if save_to_desktop else os.getcwd()
-            folder_name = search_kw if 'search_kw' in locals() and search_kw else "文书网登录"
-            save_dir = os.path.join(desktop_path, folder_name)
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir, exist_ok=True)
+                except Exception:
+                    need_retry = False
+
+                if need_retry:
+                    print("验证码错误或验证码已过期，即将重新下载验证码并重试...")
+                    cap_input = _locate_captcha_input(log_if_found=False)
+                    cap_img = _locate_captcha_image(log_if_found=False)
+                    continue
 
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        _ensure_fullpage_screenshot(driver)
-        screenshot_label = search_kw if search_kw else "搜索"
-        screenshot_path = os.path.join(save_dir, f"WENSHU_{screenshot_label}_{ts}.png")
-        driver.save_screenshot(screenshot_path)
-        print(f"截图已保存：{screenshot_path}")
+                print("未检测到验证码错误的提示，结束验证码流程。")
+                break
+    except Exception:
+        iframe_ret_url = ""
 
-        # 打印返回地址（优先：搜索后的地址；否则 iframe 内跳转地址或当前地址）
-        ret_url = None
+    # 回到主文档后再截图（可选）
+    try:
+        driver.switch_to.default_content()
+    except Exception:
+        pass
+    _wait_for_manual_verification(driver)
+    return iframe_ret_url
+
+
+def _submit_search(driver, search_kw: str) -> str | None:
+    """在当前页面的搜索框中检索 search_kw，返回搜索后的地址；找不到搜索框时返回 None。"""
+    search_input = None
+    after_search_url = ""
+    for by_, sel in [
+        (By.CSS_SELECTOR, "input.searchKey.search-inp"),
+        (By.CSS_SELECTOR, "input.search-inp"),
+        (By.XPATH, '//input[contains(@class,"searchKey") and @type="text"]'),
+        (By.XPATH, '//input[@type="text" and contains(@placeholder,"输入案由")]'),
+    ]:
+        try:
+            search_input = WebDriverWait(driver, 10).until(EC.presence_of_element_located((by_, sel)))
+            if search_input:
+                print(f"已定位返回页搜索框: {sel}")
+                break
+        except Exception:
+            continue
+    if search_input:
         try:
-            if 'after_search_url' in locals() and after_search_url:
-                ret_url = after_search_url
+            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", search_input)
+        except Exception:
+            pass
+        # 使用 JS 写值并派发事件，保证前端接收
+        try:
+            driver.execute_script(
+                "arguments[0].focus();"
+                "arguments[0].value = arguments[1];"
+                "arguments[0].dispatchEvent(new Event('input', {bubbles:true}));"
+                "arguments[0].dispatchEvent(new Event('change', {bubbles:true}));",
+                search_input, search_kw
+            )
+            print("已在返回页搜索框写入关键词")
         except Exception:
-            ret_url = None
-        if not ret_url:
-            ret_url = iframe_ret_url or driver.current_url
-        print(f"返回地址：{ret_url}")
+            try:
+                search_input.clear()
+                search_input.send_keys(search_kw)
+            except Exception:
+                pass
+        # 点击“搜索”按钮或回车
+        clicked_search = False
+        for by_, sel in [
+            (By.CSS_SELECTOR, "div.search-rightBtn.search-click"),
+            (By.XPATH, '//div[contains(@class,"search-rightBtn") and contains(@class,"search-click")]'),
+            (By.XPATH, '//button[contains(.,"搜索") or contains(@class,"search-click")]'),
+        ]:
+            try:
+                btn = WebDriverWait(driver, 8).until(EC.element_to_be_clickable((by_, sel)))
+                if btn:
+                    driver.execute_script("arguments[0].click();", btn)
+                    clicked_search = True
+                    print(f"已触发搜索点击: {sel}")
+                    break
+            except Exception:
+                continue
+        if not clicked_search:
+            try:
+                search_input.send_keys(Keys.ENTER)
+                print("已通过回车触发搜索")
+            except Exception:
+                pass
+        # 等待出现结果标志或 URL 变化
+        prev_url_after_login = driver.current_url
+        try:
+            WebDriverWait(driver, 10).until(
+                lambda d: d.current_url != prev_url_after_login or
+                ("search-list" in d.page_source) or
+                ("listMain" in d.page_source)
+            )
+        except Exception:
+            pause(2.0, site="wenshu", kind="search_submit")
+        # 列表由前端异步渲染：等结果条目（或无结果提示）出现
+        wait_for_page(driver, site="wenshu", selectors=_RESULT_READY_SELECTORS, timeout=10)
+        after_search_url = driver.current_url
+        print(f"搜索后返回地址：{after_search_url}")
+    else:
+        print("未找到返回页搜索框，跳过搜索步骤")
+        return None
+    return after_search_url
+
+
+_RESULT_ITEM_SELECTORS = ("div.LM_list", "div.list-item", "li.search-list-item")
+_RESULT_READY_SELECTORS = _RESULT_ITEM_SELECTORS + ("div.no-result", "div.noData")
+_TOTAL_RE = re.compile(r"共\s*(?:找到\s*)?([\d,]+)\s*(?:条|篇)")
+_CASE_NUMBER_RE = re.compile(r"[（(]\d{4}[）)][^\s，,；;]{1,40}?号")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+_FIRST_ITEM_TEXT_JS = """
+var sels = arguments[0];
+for (var i = 0; i < sels.length; i++) {
+  var node = document.querySelector(sels[i]);
+  if (node) return (node.innerText || "").slice(0, 200);
+}
+return "";
+"""
 
-        # 写入 JSON（与 amac/qcc 对齐，列表累积）
+_NEXT_PAGE_JS = """
+var links = document.querySelectorAll("a, span.pageButton");
+for (var i = 0; i < links.length; i++) {
+  var link = links[i];
+  if ((link.innerText || "").replace(/\\s/g, "") !== "下一页") continue;
+  if (/disabled/.test(link.className) || link.getAttribute("aria-disabled") === "true") return false;
+  link.click();
+  return true;
+}
+return false;
+"""
+
+
+def configure_results(max_pages: int, parse_workers: Optional[int] = None) -> None:
+    """调整每个关键词解析的结果页数与解析线程数。"""
+    global MAX_RESULT_PAGES, PARSE_WORKERS
+    MAX_RESULT_PAGES = max(0, int(max_pages))
+    if parse_workers is not None:
+        PARSE_WORKERS = max(1, int(parse_workers))
+
+
+def _node_text(node, selectors) -> str:
+    for selector in selectors:
+        found = node.select_one(selector)
+        if found is not None:
+            text = found.get_text(" ", strip=True)
+            if text:
+                return text
+    return ""
+
+
+def _doc_id_from_link(link) -> str:
+    if link is None:
+        return ""
+    for attr in ("data-docid", "docid", "tid"):
+        if link.get(attr):
+            return link.get(attr)
+    query = parse_qs(urlparse(link.get("href") or "").query)
+    return (query.get("docId") or query.get("docid") or [""])[0]
+
+
+def parse_result_page(html: str) -> Dict[str, Any]:
+    """解析一页搜索结果：{"total": 命中总数或 None, "cases": [{title, case_number, court, date, doc_id}]}。"""
+    soup = BeautifulSoup(html, "lxml")
+    total = None
+    match = _TOTAL_RE.search(soup.get_text(" ", strip=True))
+    if match:
+        total = int(match.group(1).replace(",", ""))
+
+    nodes = []
+    for selector in _RESULT_ITEM_SELECTORS:
+        nodes = soup.select(selector)
+        if nodes:
+            break
+    cases = []
+    for node in nodes:
+        link = node.select_one("a.caseName") or node.select_one("h4 a") or node.find("a", href=True)
+        text = node.get_text(" ", strip=True)
+        case_number = _node_text(node, ("span.ah", ".caseNumber"))
+        if not case_number:
+            number_match = _CASE_NUMBER_RE.search(text)
+            case_number = number_match.group(0) if number_match else ""
+        date = _node_text(node, ("span.cprq", ".judgeDate"))
+        if not date:
+            date_match = _DATE_RE.search(text)
+            date = date_match.group(0) if date_match else ""
+        cases.append({
+            "title": link.get_text(" ", strip=True) if link is not None else "",
+            "case_number": case_number,
+            "court": _node_text(node, ("span.slfyName", ".courtName")),
+            "date": date,
+            "doc_id": _doc_id_from_link(link),
+        })
+    return {"total": total, "cases": cases}
+
+
+def _first_item_text(driver) -> str:
+    try:
+        return driver.execute_script(_FIRST_ITEM_TEXT_JS, list(_RESULT_ITEM_SELECTORS)) or ""
+    except Exception:
+        return ""
+
+
+def collect_search_results(driver, max_pages: Optional[int] = None) -> Dict[str, Any]:
+    """
+    从当前结果页开始顺序翻页（同一个已登录页面只能一页一页点），每页的 HTML 交给线程池解析，
+    翻页与解析重叠进行。返回 {"total", "cases", "pages_fetched"}，cases 按 docId 去重并标注页码。
+
+    翻页本身不并发：结果页没有可直接跳转的页码地址，多开 WenshuSession 分段翻页需要每个会话各自登录
+    （各输一次验证码，同一账号多处登录还会互相挤掉）；而文书网的礼貌间隔按站点在所有线程间排队，
+    多会话并发也不会缩短总的访问间隔。需要更多结果时调大 max_pages。
+    """
+    max_pages = MAX_RESULT_PAGES if max_pages is None else max_pages
+    futures = []
+    with ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="wenshu-parse") as executor:
+        for page in range(1, max_pages + 1):
+            if page > 1:
+                marker = _first_item_text(driver)
+                if not marker:
+                    break
+                polite_pause("wenshu")
+                try:
+                    clicked = driver.execute_script(_NEXT_PAGE_JS)
+                except Exception:
+                    clicked = False
+                if not clicked:
+                    break
+                if not wait_until(driver, lambda d: _first_item_text(d) not in ("", marker), timeout=10, site="wenshu", kind="next_page"):
+                    break
+            futures.append(executor.submit(parse_result_page, driver.page_source))
+        pages = [future.result() for future in futures]
+
+    total = next((page["total"] for page in pages if page["total"] is not None), None)
+    cases: List[Dict[str, Any]] = []
+    seen = set()
+    for page_number, page in enumerate(pages, start=1):
+        for case in page["cases"]:
+            key = case["doc_id"] or (case["title"], case["case_number"])
+            if key in seen:
+                continue
+            seen.add(key)
+            cases.append({**case, "page": page_number})
+    return {"total": total, "cases": cases, "pages_fetched": len(pages)}
+
+
+def _save_search_result(
+    driver,
+    username: str,
+    search_kw: str,
+    ret_url: str,
+    save_to_desktop: bool = True,
+    output_directory: str | None = None,
+    record_name: str | None = None,
+    max_pages: Optional[int] = None,
+) -> dict:
+    # 组织输出目录（可通过参数覆盖默认行为）
+    if output_directory:
+        save_dir = os.fspath(output_directory)
+    else:
+        desktop_path = os.path.join(os.path.expanduser("~"), "Desktop") if save_to_desktop else os.getcwd()
+        folder_name = search_kw if search_kw else "文书网登录"
+        save_dir = os.path.join(desktop_path, folder_name)
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir, exist_ok=True)
+
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    screenshot_label = search_kw if search_kw else "搜索"
+    screenshot_path = os.path.join(save_dir, f"WENSHU_{screenshot_label}_{ts}{screenshot_extension()}")
+    screenshot_path, screenshot_sha256 = save_screenshot_artifact(driver, screenshot_path)
+    print(f"截图已保存：{screenshot_path}")
+    print(f"返回地址：{ret_url}")
+
+    # 截图停在第一页，之后再翻页解析
+    results = {}
+    max_pages = MAX_RESULT_PAGES if max_pages is None else max_pages
+    if search_kw and max_pages > 0:
         try:
-            record_basename = record_name or (search_kw if search_kw else username)
-            json_filename = f"{record_basename}.json"
-            json_path = os.path.join(save_dir, json_filename)
-            record = {
-                "item": "WENSHU_裁判文书网搜索",
-                "url": WENSHU_LOGIN_URL,
-                "name": (search_kw if search_kw else username),
-                "ret_url": ret_url,
-                "data": {
-                    "username": username,
-                    "searched_keyword": (search_kw if search_kw else "")
-                },
-                "screenshot": screenshot_path,
-                "queried_at": ts
-            }
-            all_records = load_records(json_path)
-            updated_records = upsert_record(all_records, record)
-            write_records(json_path, updated_records)
-            print(f"查询记录已保存：{json_path}")
-        except Exception as e:
-            print(f"保存JSON文件时出错: {str(e)}")
-
-        return record
+            results = collect_search_results(driver, max_pages)
+            total = results["total"] if results["total"] is not None else "未知"
+            print(f"命中 {total} 条，已解析 {len(results['cases'])} 条（{results['pages_fetched']} 页）")
+        except Exception as exc:
+            print(f"解析搜索结果失败，仅保存截图：{exc}")
+
+    # 写入 JSON（与 amac/qcc 对齐，列表累积）
+    record_basename = record_name or (search_kw if search_kw else username)
+    json_path = os.path.join(save_dir, f"{record_basename}.json")
+    record = {
+        "item": "WENSHU_裁判文书网搜索",
+        "url": WENSHU_LOGIN_URL,
+        "name": (search_kw if search_kw else username),
+        "ret_url": ret_url,
+        "data": {
+            "username": username,
+            "searched_keyword": (search_kw if search_kw else ""),
+            "total": results.get("total"),
+            "cases": results.get("cases", []),
+            "pages_fetched": results.get("pages_fetched", 0),
+        },
+        "screenshot": screenshot_path,
+        "screenshot_sha256": screenshot_sha256,
+        "queried_at": ts
+    }
+    try:
+        save_record(json_path, record)
+        print(f"查询记录已保存：{json_path}")
+    except Exception as e:
+        print(f"保存JSON文件时出错: {str(e)}")
+    return record
+
+
+class WenshuSession:
+    """
+    一个已登录的文书网浏览器会话：登录（含人工验证码）只做一次，之后每次搜索回到首页直接检索；
+    页面跳回登录页或提示登录过期时才重新登录。
+
+    用法：
+        with WenshuSession() as session:
+            for keyword in keywords:
+                session.search(keyword, output_directory=folder)
+    """
+
+    def __init__(
+        self,
+        driver=None,
+        username: str | None = None,
+        password: str | None = None,
+        save_to_desktop: bool = True,
+    ):
+        self.driver = driver
+        self.username = (username or WENSHU_ACCOUNT.get("username", "")).strip()
+        self.password = (password or WENSHU_ACCOUNT.get("password", "")).strip()
+        if not self.username or not self.password:
+            raise RuntimeError("WENSHU_ACCOUNT 中缺少账号或密码，无法执行搜索。")
+        self.save_to_desktop = save_to_desktop
+        self.logged_in = False
+        self.login_count = 0
+        self.search_count = 0
+        self._owns_driver = driver is None
+        self._iframe_ret_url = ""
+
+    def _ensure_driver(self):
+        if self.driver is None:
+            _clear_proxy_env_vars()
+            self.driver = create_driver("wenshu")
+        return self.driver
+
+    def login(self) -> None:
+        driver = self._ensure_driver()
+        mark_session_stale(driver)
+        self._iframe_ret_url = _login(driver, self.username, self.password, self.save_to_desktop)
+        self.logged_in = True
+        self.login_count += 1
+        if self.login_count > 1:
+            print(f"文书网已重新登录（本会话第 {self.login_count} 次登录）")
+
+    def ensure_logged_in(self) -> None:
+        """已登录时回到首页并检查登录状态，失效才重新登录；首次调用先检查浏览器配置目录里的登录是否仍有效。"""
+        driver = self._ensure_driver()
+        if not self.logged_in and session_is_warm("wenshu", driver):
+            print("文书网登录状态有效（浏览器配置目录），跳过登录")
+            self.logged_in = True
+        if self.logged_in:
+            polite_pause("wenshu")
+            driver.get(WENSHU_HOME_URL)
+            wait_for_document_ready(driver, site="wenshu")
+            wait_for_network_idle(driver, idle_time=0.5, timeout=3, site="wenshu")
+            _wait_for_manual_verification(driver)
+            if not _login_required(driver):
+                return
+            print("文书网登录已失效，重新登录...")
+            self.logged_in = False
+        self.login()
+
+    def search(
+        self,
+        keyword: str,
+        output_directory: str | None = None,
+        record_name: str | None = None,
+        max_pages: Optional[int] = None,
+    ) -> dict | None:
+        """检索 keyword 并截图、解析结果列表（最多 max_pages 页）、写入记录；返回记录。"""
+        search_kw = (keyword or "").strip()
+        self.ensure_logged_in()
+        driver = self.driver
+        after_search_url = None
+        if search_kw:
+            print(f"使用传入的搜索关键词：{search_kw}")
+            after_search_url = _submit_search(driver, search_kw)
+            if after_search_url is None or _login_required(driver):
+                # 搜索框不见了或被踢回登录页：视为登录失效，重新登录后再试一次
+                print("文书网登录状态异常，重新登录后重试搜索...")
+                self.logged_in = False
+                self.login()
+                after_search_url = _submit_search(driver, search_kw)
+        self.search_count += 1
+        ret_url = after_search_url or self._iframe_ret_url or driver.current_url
+        return _save_search_result(
+            driver,
+            self.username,
+            search_kw,
+            ret_url,
+            save_to_desktop=self.save_to_desktop,
+            output_directory=output_directory,
+            record_name=record_name,
+            max_pages=max_pages,
+        )
+
+    def close(self) -> None:
+        if self._owns_driver and self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+        self.logged_in = False
+
+    def __enter__(self) -> "WenshuSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+# 浏览器 → 会话；浏览器池归还后再次借出同一个浏览器时沿用原会话，不必重新登录
+_SESSIONS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def session_for(driver, username: str | None = None, password: str | None = None, save_to_desktop: bool = True) -> WenshuSession:
+    session = _SESSIONS.get(driver)
+    if session is None or (username and session.username != username.strip()):
+        session = WenshuSession(driver, username, password, save_to_desktop)
+        _SESSIONS[driver] = session
+    session.save_to_desktop = save_to_desktop
+    return session
+
+
+def fill_login_and_screenshot(
+    username: str,
+    password: str,
+    save_to_desktop: bool = True,
+    search_keyword: str | None = None,
+    output_directory: str | None = None,
+    record_name: str | None = None,
+    driver=None,
+) -> dict | None:
+    _clear_proxy_env_vars()
+
+    try:
+        if driver is None:
+            driver = create_driver("wenshu")
+        session = session_for(driver, username, password, save_to_desktop)
+
+        # 在返回页面上执行一次搜索：询问用户关键词 -> 填入搜索框 -> 触发搜索 -> 等待渲染
+        if search_keyword is None:
+            session.ensure_logged_in()
+            try:
+                search_keyword = input("请输入返回页面要搜索的关键词（可留空跳过）：").strip()
+            except KeyboardInterrupt:
+                search_keyword = ""
+        return session.search(search_keyword, output_directory=output_directory, record_name=record_name)
 
     except Exception as e:
         print(f"发生错误：{e}")
         import traceback
         traceback.print_exc()
+        mark_broken(driver)
         return None
     finally:
         if driver:
@@ -604,6 +937,7 @@ def search_wenshu(
     save_to_desktop: bool = True,
     target_directory: str | None = None,
     record_name: str | None = None,
+    driver=None,
 ):
     username = WENSHU_ACCOUNT.get("username", "").strip()
     password = WENSHU_ACCOUNT.get("password", "").strip()
@@ -616,6 +950,7 @@ def search_wenshu(
         search_keyword=keyword,
         output_directory=target_directory,
         record_name=record_name,
+        driver=driver,
     )
 
 